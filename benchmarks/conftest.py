@@ -0,0 +1,191 @@
+"""
+Fixtures for the pipeline benchmarks.
+
+Inputs are an evenly spaced sample of data/raw_pdfs (or a synthetic corpus with
+--synthetic, or when there are no PDFs), the raw captures in the extraction logs,
+the raw Graph2Table CSVs and the scraped link CSVs. Everything the stages write
+goes to a temporary folder, never into data/.
+
+    python -m pytest benchmarks --benchmark-autosave                    # store a baseline
+    python -m pytest benchmarks --benchmark-compare --benchmark-compare-fail=mean:15%
+    python -m pytest benchmarks --stage-baseline .benchmarks/<machine>/0001_<commit>.json
+"""
+import os
+import sys
+import csv
+import glob
+import json
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import stages
+from config import get_path
+
+# Resolved before the session fixture points the output folders at a temporary directory
+RAW_PDFS_DIR = get_path('raw_pdfs')
+EXTRACTED_IMAGES_DIR = get_path('extracted_images')
+EXTRACTION_LOGS_DIR = get_path('extraction_logs')
+RAW_CSV_DIR = get_path('graph2table_raw')
+PDF_LINKS_DIR = get_path('pdf_links')
+
+# Raw captures written by the extractor (contour detection input), not its _bbox visualizations
+CAPTURE_SUFFIXES = ("_retail_price_plot.png", "_retail_price_plot_next_page.png", "_retail_price_plot_fallback.png")
+
+def pytest_addoption(parser):
+    group = parser.getgroup("lifecycle benchmarks")
+    group.addoption("--sample", type=int, default=8, help="Number of PDFs / images to benchmark on (default 8)")
+    group.addoption("--synthetic", action="store_true", help="Benchmark on generated PDFs instead of data/raw_pdfs")
+    group.addoption("--skip-rss", action="store_true", help="Don't measure peak RSS in a separate process")
+    group.addoption("--stage-baseline", default=None,
+                    help="Saved pytest-benchmark JSON to compare throughput and peak RSS against")
+
+def evenly_spaced(items, count):
+    """`count` items spread evenly over a sorted list (all of them if there are fewer)"""
+    items = sorted(items)
+    if count >= len(items):
+        return items
+    step = len(items) / count
+    return [items[int(i * step)] for i in range(count)]
+
+@pytest.fixture(scope="session")
+def sample_size(request):
+    return request.config.getoption("--sample")
+
+@pytest.fixture(scope="session")
+def measure_rss(request):
+    return not request.config.getoption("--skip-rss")
+
+@pytest.fixture(scope="session")
+def output_dir(tmp_path_factory):
+    """Temporary data folders for everything the stages write"""
+    root = tmp_path_factory.mktemp("lifecycle_bench")
+    overrides = {
+        'LIFECYCLE_EXTRACTED_IMAGES': root / "extracted_images",
+        'LIFECYCLE_EXTRACTION_LOGS': root / "extracted_images" / "logs",
+        'LIFECYCLE_GRAPH2TABLE': root / "graph2table",
+        # The stages' timing records and cached renders would otherwise go to data/
+        'LIFECYCLE_METRICS': root / "metrics",
+        'LIFECYCLE_RENDER_CACHE': root / "render_cache",
+    }
+    saved = {name: os.environ.get(name) for name in overrides}
+    for name, path in overrides.items():
+        path.mkdir(parents=True, exist_ok=True)
+        os.environ[name] = str(path)
+    yield str(root)
+    for name, value in saved.items():
+        if value is None:
+            os.environ.pop(name, None)
+        else:
+            os.environ[name] = value
+
+@pytest.fixture(scope="session")
+def sample_pdfs(request, sample_size, output_dir):
+    pdf_paths = glob.glob(os.path.join(RAW_PDFS_DIR, "*.pdf"))
+    if pdf_paths and not request.config.getoption("--synthetic"):
+        return evenly_spaced(pdf_paths, sample_size)
+
+    import generate_synthetic_pdfs
+    synthetic_dir = os.path.join(output_dir, "synthetic")
+    generate_synthetic_pdfs.generate_corpus(sample_size, synthetic_dir, workers=1)
+    return sorted(glob.glob(os.path.join(synthetic_dir, "pdfs", "*.pdf")))
+
+@pytest.fixture(scope="session")
+def indicator_captures(sample_pdfs):
+    """
+    (pdf path, page index, clip) of the region the extractor renders for each
+    sample PDF: full width, from 20pt above the first indicator to 350pt below it.
+    """
+    import fitz
+    captures = []
+    for pdf_path in sample_pdfs:
+        with fitz.open(pdf_path) as doc:
+            for page in doc:
+                matches = stages.extract_pdf_content.find_retail_price_indicators(page)
+                if matches:
+                    y0 = matches[0]['rect'][1]
+                    clip = (0, max(0, y0 - 20), page.rect.width, min(page.rect.height, y0 + 350))
+                    captures.append((pdf_path, page.number, clip))
+                    break
+    if not captures:
+        pytest.skip("No retail price indicator found in the sample PDFs")
+    return captures
+
+@pytest.fixture(scope="session")
+def raw_captures(sample_size, indicator_captures, output_dir):
+    """Raw chart captures from the extraction logs, or rendered from the sample PDFs when there are none"""
+    paths = []
+    if os.path.isdir(EXTRACTION_LOGS_DIR):
+        paths = [os.path.join(EXTRACTION_LOGS_DIR, name) for name in os.listdir(EXTRACTION_LOGS_DIR)
+                 if name.endswith(CAPTURE_SUFFIXES)]
+    if paths:
+        return evenly_spaced(paths, sample_size)
+
+    import fitz
+    capture_dir = os.path.join(output_dir, "captures")
+    os.makedirs(capture_dir, exist_ok=True)
+    for pdf_path, page_index, clip in indicator_captures:
+        with fitz.open(pdf_path) as doc:
+            pix = doc[page_index].get_pixmap(matrix=fitz.Matrix(3, 3), clip=fitz.Rect(clip))
+        pdf_name = os.path.splitext(os.path.basename(pdf_path))[0]
+        path = os.path.join(capture_dir, f"{pdf_name}_retail_price_plot.png")
+        pix.save(path)
+        paths.append(path)
+    return paths
+
+@pytest.fixture(scope="session")
+def raw_csv_dir():
+    if not glob.glob(os.path.join(RAW_CSV_DIR, "*.csv")):
+        pytest.skip(f"No raw Graph2Table CSVs in {RAW_CSV_DIR}")
+    return RAW_CSV_DIR
+
+@pytest.fixture(scope="session")
+def raw_csv_frames(raw_csv_dir):
+    """Raw CSVs as read by process_csv_file, up to the point where dates are parsed"""
+    import pandas as pd
+    frames = []
+    for csv_path in sorted(glob.glob(os.path.join(raw_csv_dir, "*.csv"))):
+        df = pd.read_csv(csv_path)
+        frames.append(df.rename(columns={df.columns[0]: "Date"}))
+    return frames
+
+@pytest.fixture(scope="session")
+def scraped_links():
+    """Every link in the scraped link CSVs"""
+    links = []
+    for csv_path in sorted(glob.glob(os.path.join(PDF_LINKS_DIR, "**", "*.csv"), recursive=True)):
+        with open(csv_path, 'r', newline='', encoding='utf-8') as f:
+            links.extend(row['link'] for row in csv.DictReader(f) if row.get('link'))
+    if not links:
+        pytest.skip(f"No scraped links in {PDF_LINKS_DIR}")
+    return links
+
+def pytest_terminal_summary(terminalreporter, config):
+    """Throughput and peak RSS per stage, with the change against --stage-baseline if given"""
+    session = getattr(config, '_benchmarksession', None)
+    if session is None or not session.benchmarks:
+        return
+
+    baseline = {}
+    baseline_path = config.getoption("--stage-baseline")
+    if baseline_path:
+        with open(baseline_path, 'r', encoding='utf-8') as f:
+            baseline = {entry['name']: entry.get('extra_info', {}) for entry in json.load(f)['benchmarks']}
+
+    def change(value, old):
+        if value is None or not old:
+            return ""
+        return f" ({(value - old) / old * 100:+.1f}%)"
+
+    terminalreporter.write_sep("-", "throughput and peak RSS per stage")
+    for bench in session.benchmarks:
+        info = bench.extra_info
+        old = baseline.get(bench.name, {})
+        throughput = info.get('throughput')
+        peak = info.get('peak_rss_mb')
+        line = f"{bench.name:45s}"
+        if throughput is not None:
+            line += f" {throughput:10.2f} {info.get('unit', 'items')}/s{change(throughput, old.get('throughput'))}"
+        if peak is not None:
+            line += f"   peak RSS {peak:.0f} MB{change(peak, old.get('peak_rss_mb'))}"
+        terminalreporter.write_line(line)
@@ -0,0 +1,178 @@
+"""
+Pipeline stages as the benchmarks time them, plus the throughput / peak RSS bookkeeping.
+
+Every stage takes plain paths and values (no open documents), so the same call
+can be repeated by pytest-benchmark and also run once in a fresh process to
+measure the peak memory of that stage alone.
+"""
+import os
+import sys
+import ast
+import re
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts")
+for folder in [SCRIPTS_DIR, os.path.join(SCRIPTS_DIR, "pdfs"), os.path.join(SCRIPTS_DIR, "graph2table AI")]:
+    if folder not in sys.path:
+        sys.path.insert(0, folder)
+
+import fitz  # PyMuPDF
+import extract_pdf_content
+import document_provider
+import combine_graph2table_output
+
+LINK_SCRAPER = os.path.join(SCRIPTS_DIR, "pdfs", "Link Scraper", "dorking_scrape_links.py")
+
+def load_function(path, name, namespace):
+    """
+    Compile a single top-level function from a script without running the rest of it.
+    The link scrapers import selenium at module level, which the date parsing doesn't need.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        tree = ast.parse(f.read(), filename=path)
+    for node in tree.body:
+        if isinstance(node, ast.FunctionDef) and node.name == name:
+            module = ast.Module(body=[node], type_ignores=[])
+            exec(compile(module, path, 'exec'), namespace)
+            return namespace[name]
+    raise LookupError(f"{name} not found in {path}")
+
+extract_date_from_link = load_function(LINK_SCRAPER, 'extract_date_from_link', {'re': re, 'datetime': datetime})
+
+# --- Stages ---
+
+def search_text(pdf_paths):
+    """Run the indicator text search over every page; returns the number of pages searched"""
+    pages = 0
+    for pdf_path in pdf_paths:
+        with fitz.open(pdf_path) as doc:
+            for page in doc:
+                extract_pdf_content.find_retail_price_indicators(page)
+                pages += 1
+    return pages
+
+def open_documents(pdf_paths, shared, steps=3):
+    """
+    Open each PDF once per step and read its first page's text, as a multi-step
+    run over the same reports does: with fitz.open every time, or through a
+    (fresh) memory-mapped document provider. Returns the number of opens.
+    """
+    provider = document_provider.DocumentProvider() if shared else None
+    for pdf_path in pdf_paths:
+        for _ in range(steps):
+            if shared:
+                with provider.document(pdf_path) as doc:
+                    doc[0].get_text()
+            else:
+                with fitz.open(pdf_path) as doc:
+                    doc[0].get_text()
+    if shared:
+        provider.close()
+    return len(pdf_paths) * steps
+
+def render_pages(captures, zoom):
+    """Render (pdf path, page index, clip or None) captures to pixmaps; returns total pixels"""
+    pixels = 0
+    matrix = fitz.Matrix(zoom, zoom)
+    for pdf_path, page_index, clip in captures:
+        with fitz.open(pdf_path) as doc:
+            pix = doc[page_index].get_pixmap(matrix=matrix, clip=fitz.Rect(clip) if clip else None)
+            pixels += pix.width * pix.height
+    return pixels
+
+def crop_images(image_paths):
+    """Contour-detect and crop each raw capture; returns how many were cropped"""
+    return sum(extract_pdf_content.crop_to_plot_bounding_box(path)[1] for path in image_paths)
+
+def detect_plots(grays, params=None):
+    """find_plot_bbox on grayscale captures already in memory; returns how many had a plot"""
+    return sum(extract_pdf_content.find_plot_bbox(gray, params) is not None for gray in grays)
+
+def write_reports(results, output_dir, pdf_paths):
+    """Write one HTML report per extraction result and the combined report"""
+    for result in results:
+        extract_pdf_content.generate_html_report(result, os.path.join(output_dir, f"{result['pdf_name']}_report.html"))
+    extract_pdf_content.generate_combined_html_report(output_dir, pdf_paths)
+    return len(results) + 1
+
+def extract_pdfs(pdf_paths, output_dir, streaming=False):
+    """The whole per-PDF extraction; returns how many PDFs yielded a chart"""
+    found = 0
+    for pdf_path in pdf_paths:
+        _, found_plot = extract_pdf_content.extract_retail_price_plots(pdf_path, output_dir=output_dir,
+                                                                       streaming=streaming)
+        found += found_plot
+    return found
+
+def parse_dates(frames):
+    """process_dates on copies of raw Graph2Table frames; returns the number of rows"""
+    return sum(len(combine_graph2table_output.process_dates(df.copy())) for df in frames)
+
+def combine_csvs(csv_dir, output_dir):
+    """Full (non-incremental) combine of a folder of raw CSVs; returns the number of rows"""
+    return len(combine_graph2table_output.combine_csv_files(csv_dir, output_dir))
+
+def parse_link_dates(links):
+    """Link-date parsing used by the dorking scraper; returns how many links had a date"""
+    return sum(extract_date_from_link(link)[0] is not None for link in links)
+
+# --- Measurement ---
+
+def max_rss_mb():
+    """Peak resident set size of this process so far, in MB (None where it can't be read)"""
+    # On Linux, ru_maxrss survives exec, so a spawned child would report its parent's peak;
+    # VmHWM belongs to the process's own address space
+    if os.path.exists("/proc/self/status"):
+        with open("/proc/self/status", 'r') as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 2 ** 10
+    try:
+        import resource
+    except ImportError:  # Windows
+        try:
+            import psutil
+        except ImportError:
+            return None
+        return psutil.Process().memory_info().peak_wset / 2 ** 20
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, kilobytes elsewhere
+    return rss / 2 ** 20 if sys.platform == 'darwin' else rss / 2 ** 10
+
+def _measure_in_child(stage, args):
+    before = max_rss_mb()
+    stage(*args)
+    return before, max_rss_mb()
+
+def stage_peak_rss(stage, *args):
+    """
+    Run the stage once in a fresh process and return (peak RSS, growth over the
+    process's baseline after imports), both in MB.
+    """
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+        before, after = pool.submit(_measure_in_child, stage, args).result()
+    if before is None or after is None:
+        return None, None
+    return round(after, 1), round(after - before, 1)
+
+def run_stage(benchmark, stage, *args, items=1, unit='items', rounds=3, measure_rss=True):
+    """
+    Time `stage(*args)` and record throughput and peak RSS in the benchmark's
+    extra_info, which is saved with the results and compared against the baseline.
+    """
+    result = benchmark.pedantic(stage, args=args, rounds=rounds, iterations=1, warmup_rounds=1)
+
+    benchmark.extra_info['items'] = items
+    benchmark.extra_info['unit'] = unit
+    stats = getattr(benchmark, 'stats', None)
+    if stats is not None and stats.stats.mean:
+        benchmark.extra_info['throughput'] = round(items / stats.stats.mean, 2)
+
+    if measure_rss:
+        peak, growth = stage_peak_rss(stage, *args)
+        benchmark.extra_info['peak_rss_mb'] = peak
+        benchmark.extra_info['rss_growth_mb'] = growth
+    return result
@@ -0,0 +1,17 @@
+"""Benchmarks of combining the Graph2Table CSVs (scripts/graph2table AI/combine_graph2table_output.py)"""
+import os
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+import stages
+
+def test_process_dates(benchmark, raw_csv_frames, measure_rss):
+    rows = sum(len(df) for df in raw_csv_frames)
+    stages.run_stage(benchmark, stages.parse_dates, raw_csv_frames, items=rows, unit='rows', measure_rss=measure_rss)
+
+def test_combine_csv_files(benchmark, raw_csv_dir, output_dir, measure_rss):
+    combined_dir = os.path.join(output_dir, "graph2table")
+    rows = stages.combine_csvs(raw_csv_dir, combined_dir)
+    stages.run_stage(benchmark, stages.combine_csvs, raw_csv_dir, combined_dir,
+                     items=rows, unit='rows', measure_rss=measure_rss)
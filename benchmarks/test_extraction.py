@@ -0,0 +1,63 @@
+"""Benchmarks of the chart extraction stages (scripts/pdfs/extract_pdf_content.py)"""
+import os
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+import stages
+
+def test_text_search(benchmark, sample_pdfs, measure_rss):
+    pages = stages.search_text(sample_pdfs)
+    stages.run_stage(benchmark, stages.search_text, sample_pdfs, items=pages, unit='pages', measure_rss=measure_rss)
+
+@pytest.mark.parametrize("shared", [False, True], ids=["fitz_open", "provider"])
+def test_open_documents(benchmark, sample_pdfs, measure_rss, shared):
+    # Three steps opening the same reports
+    stages.run_stage(benchmark, stages.open_documents, sample_pdfs, shared,
+                     items=len(sample_pdfs) * 3, unit='opens', measure_rss=measure_rss)
+
+def test_render_indicator_clip(benchmark, indicator_captures, measure_rss):
+    # The zoom 3 capture below the indicator text
+    stages.run_stage(benchmark, stages.render_pages, indicator_captures, 3.0,
+                     items=len(indicator_captures), unit='renders', measure_rss=measure_rss)
+
+def test_render_full_page(benchmark, indicator_captures, measure_rss):
+    # The zoom 2 whole-page capture of the fallback path
+    captures = [(pdf_path, page_index, None) for pdf_path, page_index, _ in indicator_captures]
+    stages.run_stage(benchmark, stages.render_pages, captures, 2.0,
+                     items=len(captures), unit='renders', measure_rss=measure_rss)
+
+def test_crop_to_plot_bounding_box(benchmark, raw_captures, output_dir, measure_rss):
+    stages.run_stage(benchmark, stages.crop_images, raw_captures,
+                     items=len(raw_captures), unit='images', measure_rss=measure_rss)
+
+@pytest.mark.parametrize("detection_scale", [1, 4], ids=["contours", "downscaled"])
+def test_find_plot_bbox(benchmark, raw_captures, measure_rss, detection_scale):
+    # Detection alone, without loading or saving images
+    import cv2
+    import numpy as np
+    from PIL import Image
+    grays = [cv2.cvtColor(np.array(Image.open(path).convert("RGB")), cv2.COLOR_RGB2GRAY) for path in raw_captures]
+    stages.run_stage(benchmark, stages.detect_plots, grays, {'detection_scale': detection_scale},
+                     items=len(grays), unit='images', measure_rss=measure_rss)
+
+def test_html_reports(benchmark, sample_pdfs, output_dir, measure_rss):
+    results = []
+    for pdf_path in sample_pdfs:
+        pdf_name = os.path.splitext(os.path.basename(pdf_path))[0]
+        results.append({
+            "pdf_name": pdf_name,
+            "total_pages": 0,
+            "plots_found": [{"page": 1, "image_path": f"{pdf_name}_retail_price_plot_cropped.png",
+                             "indicator_text": "Average Retail Selling Price"}],
+        })
+    report_dir = os.path.join(output_dir, "reports")
+    os.makedirs(report_dir, exist_ok=True)
+    stages.run_stage(benchmark, stages.write_reports, results, report_dir, sample_pdfs,
+                     items=len(results) + 1, unit='reports', measure_rss=measure_rss)
+
+@pytest.mark.parametrize("streaming", [False, True], ids=["legacy", "streaming"])
+def test_extract_pdfs(benchmark, sample_pdfs, output_dir, measure_rss, streaming):
+    # End to end: search, render, crop, image writes and the per-PDF report (debug images are opt-in)
+    stages.run_stage(benchmark, stages.extract_pdfs, sample_pdfs, os.path.join(output_dir, "extracted_images"),
+                     streaming, items=len(sample_pdfs), unit='PDFs', rounds=2, measure_rss=measure_rss)
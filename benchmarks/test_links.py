@@ -0,0 +1,12 @@
+"""Benchmarks of the link scrapers' offline parts (scripts/pdfs/Link Scraper)"""
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+import stages
+
+def test_link_date_parsing(benchmark, scraped_links, measure_rss):
+    # Repeat the scraped links so one round is long enough to time reliably
+    links = scraped_links * 50
+    stages.run_stage(benchmark, stages.parse_link_dates, links, items=len(links), unit='links',
+                     rounds=10, measure_rss=measure_rss)
@@ -0,0 +1,150 @@
+import os
+import sys
+import time
+import argparse
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import get_path
+
+from cache import file_hash, cache_path_for, remove_stale
+from vintage_tensor import load_vintage_tensor, DEFAULT_DATASET_PATH
+from consensus import build_consensus
+
+DEFAULT_DIGITIZER_PATH = get_path('final_dataset', "Webplot_Digitizer.csv")
+
+def load_digitizer_long(digitizer_path):
+    """Read Webplot_Digitizer.csv into long format (Date, Age_Group, digitizer), sorted by Date"""
+    wide = pd.read_csv(digitizer_path, parse_dates=['Date'])
+    long = wide.melt(id_vars='Date', var_name='Age_Group', value_name='digitizer').dropna(subset=['digitizer'])
+    return long.sort_values('Date', kind='stable').reset_index(drop=True)
+
+def load_ai_long(dataset_path, reference='consensus'):
+    """
+    Monthly AI series in long format (Date, Age_Group, ai).
+
+    `reference` picks which value represents a month across report vintages:
+    'consensus' (robust consensus, see consensus.py) or 'latest' (most recent print).
+    """
+    tensor = load_vintage_tensor(dataset_path)
+    if reference == 'consensus':
+        ai = build_consensus(tensor)[['Date', 'Age_Group', 'consensus']].rename(columns={'consensus': 'ai'})
+    elif reference == 'latest':
+        stats = tensor.revision_stats()
+        ai = stats[['Date', 'Age_Group', 'latest_print']].rename(columns={'latest_print': 'ai'})
+    else:
+        raise ValueError(f"Unknown AI reference: {reference}")
+    return ai.dropna(subset=['ai']).sort_values('Date', kind='stable').reset_index(drop=True)
+
+def align_series(ai, digitizer, mode='binned', tolerance_days=16):
+    """
+    Align the irregular digitizer points with the monthly AI series, per age group.
+
+    Modes:
+        'binned' - average digitizer points into calendar months, then join on the month
+        'asof'   - match each digitizer point to the nearest AI month with a sorted
+                   merge_asof, dropping points further than `tolerance_days` away
+
+    Returns:
+        pd.DataFrame: Date, Age_Group, ai, digitizer, n_points and the error columns
+            error (digitizer - ai), abs_error and pct_error
+    """
+    if mode == 'binned':
+        binned = digitizer.assign(Date=digitizer['Date'].dt.to_period('M').dt.to_timestamp())
+        binned = binned.groupby(['Date', 'Age_Group'], as_index=False).agg(
+            digitizer=('digitizer', 'mean'),
+            n_points=('digitizer', 'size'),
+        )
+        aligned = binned.merge(ai, on=['Date', 'Age_Group'], how='inner')
+    elif mode == 'asof':
+        ai_sorted = ai.rename(columns={'Date': 'ai_date'}).sort_values('ai_date', kind='stable')
+        aligned = pd.merge_asof(
+            digitizer, ai_sorted,
+            left_on='Date', right_on='ai_date', by='Age_Group',
+            direction='nearest', tolerance=pd.Timedelta(days=tolerance_days),
+        ).dropna(subset=['ai'])
+        aligned['n_points'] = 1
+    else:
+        raise ValueError(f"Unknown alignment mode: {mode}")
+
+    aligned['error'] = aligned['digitizer'] - aligned['ai']
+    aligned['abs_error'] = aligned['error'].abs()
+    aligned['pct_error'] = aligned['error'] / aligned['ai'] * 100
+    return aligned.sort_values(['Age_Group', 'Date'], kind='stable').reset_index(drop=True)
+
+def error_metrics(aligned, by=('Year',)):
+    """
+    MAE, MAPE, bias and RMSE per age group and period, in one groupby.
+
+    `by` may contain 'Year' and/or 'Quarter' (derived from Date); an empty tuple
+    gives overall figures per age group.
+    """
+    frame = aligned.assign(
+        Year=aligned['Date'].dt.year,
+        Quarter=aligned['Date'].dt.to_period('Q').astype(str),
+        abs_pct_error=aligned['pct_error'].abs(),
+        sq_error=aligned['error'] ** 2,
+    )
+    metrics = frame.groupby(['Age_Group', *by]).agg(
+        n=('error', 'size'),
+        MAE=('abs_error', 'mean'),
+        MAPE=('abs_pct_error', 'mean'),
+        bias=('error', 'mean'),
+        pct_bias=('pct_error', 'mean'),
+        MSE=('sq_error', 'mean'),
+    )
+    metrics['RMSE'] = np.sqrt(metrics.pop('MSE'))
+    return metrics.reset_index()
+
+def load_aligned(dataset_path=None, digitizer_path=None, mode='binned', tolerance_days=16,
+                 reference='consensus', use_cache=True):
+    """
+    Return the aligned AI/digitizer frame, reading it from the cache when neither
+    input file changed since it was last computed.
+    """
+    if dataset_path is None:
+        dataset_path = DEFAULT_DATASET_PATH
+    if digitizer_path is None:
+        digitizer_path = DEFAULT_DIGITIZER_PATH
+
+    name = f"aligned_{reference}_{mode}_{tolerance_days}d"
+    key = file_hash(dataset_path, 8) + file_hash(digitizer_path, 8)
+    cache_path = cache_path_for(dataset_path, name, "parquet", key)
+
+    if use_cache and os.path.exists(cache_path):
+        return pd.read_parquet(cache_path)
+
+    aligned = align_series(
+        load_ai_long(dataset_path, reference),
+        load_digitizer_long(digitizer_path),
+        mode=mode,
+        tolerance_days=tolerance_days,
+    )
+
+    if use_cache:
+        aligned.to_parquet(cache_path, index=False)
+        remove_stale(dataset_path, name, cache_path)
+    return aligned
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the AI series with the WebPlotDigitizer series")
+    parser.add_argument("--mode", choices=['binned', 'asof'], default='binned')
+    parser.add_argument("--tolerance-days", type=int, default=16, help="Maximum distance for asof matches")
+    parser.add_argument("--reference", choices=['consensus', 'latest'], default='consensus',
+                        help="Which AI value represents a month across report vintages")
+    parser.add_argument("--no-cache", action="store_true")
+    args = parser.parse_args()
+
+    start_time = time.time()
+    aligned = load_aligned(mode=args.mode, tolerance_days=args.tolerance_days,
+                           reference=args.reference, use_cache=not args.no_cache)
+
+    print(f"Aligned {len(aligned)} points ({args.mode}, AI reference: {args.reference})")
+    print("\nOverall:")
+    print(error_metrics(aligned, by=()).to_string(index=False))
+    print("\nBy year:")
+    print(error_metrics(aligned, by=('Year',)).to_string(index=False))
+    print("\nBy quarter:")
+    print(error_metrics(aligned, by=('Quarter',)).to_string(index=False))
+    print(f"\nCompleted in {time.time() - start_time:.2f} s")
@@ -0,0 +1,44 @@
+import os
+import hashlib
+
+def file_hash(file_path, length=16):
+    """
+    Return the SHA-256 hash of a file's contents, truncated to `length` hex characters.
+    Used to key cached results on the exact dataset they were computed from.
+    """
+    sha256 = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()[:length]
+
+def cache_dir_for(dataset_path):
+    """Return (and create) the cache directory that sits beside a dataset file"""
+    cache_dir = os.path.join(os.path.dirname(os.path.abspath(dataset_path)), "cache")
+    os.makedirs(cache_dir, exist_ok=True)
+    return cache_dir
+
+def cache_path_for(dataset_path, name, extension, dataset_hash=None):
+    """
+    Build the path of a cached artefact derived from `dataset_path`.
+
+    The file name embeds the dataset hash, so editing the dataset automatically
+    invalidates every result computed from the previous version.
+    """
+    if dataset_hash is None:
+        dataset_hash = file_hash(dataset_path)
+    return os.path.join(cache_dir_for(dataset_path), f"{name}_{dataset_hash}.{extension}")
+
+def remove_stale(dataset_path, name, keep_path):
+    """Delete older cached versions of `name` once a fresh one has been written"""
+    cache_dir = cache_dir_for(dataset_path)
+    keep_stem = os.path.splitext(os.path.basename(keep_path))[0]
+    for filename in os.listdir(cache_dir):
+        stem = os.path.splitext(filename)[0]
+        # Only "<name>_<hash>" matches; longer names sharing the prefix belong to other results
+        is_version = stem.startswith(f"{name}_") and '_' not in stem[len(name) + 1:]
+        if is_version and stem != keep_stem:
+            try:
+                os.remove(os.path.join(cache_dir, filename))
+            except OSError as e:
+                print(f"Could not remove stale cache file {filename}: {e}")
@@ -0,0 +1,136 @@
+import os
+import warnings
+import argparse
+import numpy as np
+import pandas as pd
+
+from vintage_tensor import load_vintage_tensor, DEFAULT_DATASET_PATH
+
+# Scale factor that turns a MAD into a consistent estimate of the standard deviation
+MAD_TO_STD = 1.4826
+
+def _nanmedian(values, axis=0):
+    # All-NaN slices are expected (months a vintage never charted); they stay NaN
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        return np.nanmedian(values, axis=axis)
+
+def _trimmed_mean(values, proportion):
+    """NaN-aware trimmed mean along axis 0, cutting `proportion` of the kept values from each end"""
+    n = np.count_nonzero(~np.isnan(values), axis=0)
+    # np.sort pushes NaN to the end, so ranks < n are the valid values in order
+    ordered = np.sort(values, axis=0)
+    cut = np.floor(n * proportion).astype(int)
+    rank = np.arange(values.shape[0]).reshape((-1,) + (1,) * (values.ndim - 1))
+    keep = (rank >= cut) & (rank < n - cut)
+    total = np.where(keep, ordered, 0.0).sum(axis=0)
+    count = keep.sum(axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(count > 0, total / count, np.nan)
+
+def build_consensus(tensor, method='median', threshold=3.5, trim=0.1, min_scale=0.01, tolerance=0.02):
+    """
+    Compute a robust consensus value per (observation month, age group) across report vintages.
+
+    For every cell the median and MAD across vintages are computed; vintages whose
+    robust z-score |x - median| / (1.4826 * MAD) exceeds `threshold` are rejected
+    and the consensus is taken over the remaining ones. Everything is evaluated on
+    the whole [vintage, month, age group] tensor at once.
+
+    Parameters:
+        tensor (VintageTensor): Output of vintage_tensor.load_vintage_tensor
+        method (str): 'median' or 'trimmed_mean' for the final aggregate of kept values
+        threshold (float): Robust z-score above which a vintage is rejected
+        trim (float): Proportion cut from each end when method is 'trimmed_mean'
+        min_scale (float): Floor on the robust scale, as a fraction of |median|, so
+            that cells where most vintages agree exactly don't reject tiny differences
+        tolerance (float): Relative robust spread at which confidence is halved
+
+    Returns:
+        pd.DataFrame: One row per (Date, Age_Group) with at least one print. Columns:
+            consensus, n_vintages, n_kept, n_rejected, robust_spread, confidence, rejected_vintages
+
+    The confidence score is in [0, 1] and is the product of the share of vintages
+    kept, a support term n_kept / (n_kept + 1), and an agreement term
+    1 / (1 + relative_spread / tolerance), where relative_spread is the robust
+    spread of the kept values divided by |consensus|.
+    """
+    if method not in ('median', 'trimmed_mean'):
+        raise ValueError(f"Unknown consensus method: {method}")
+
+    values = np.asarray(tensor.values, dtype=float)
+    present = ~np.isnan(values)
+    n = present.sum(axis=0)
+
+    median = _nanmedian(values)
+    mad = _nanmedian(np.abs(values - median))
+    scale = np.maximum(MAD_TO_STD * mad, min_scale * np.abs(median))
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        z = np.abs(values - median) / scale
+    # A zero scale only happens when the median is 0; then any deviation is an outlier
+    z = np.where(scale > 0, z, np.where(values == median, 0.0, np.inf))
+    rejected = present & (z > threshold)
+
+    kept = np.where(rejected, np.nan, values)
+    n_kept = n - rejected.sum(axis=0)
+
+    if method == 'median':
+        consensus = _nanmedian(kept)
+    else:
+        consensus = _trimmed_mean(kept, trim)
+
+    kept_spread = MAD_TO_STD * _nanmedian(np.abs(kept - consensus))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        relative_spread = kept_spread / np.abs(consensus)
+        confidence = (n_kept / n) * (n_kept / (n_kept + 1)) / (1 + relative_spread / tolerance)
+    confidence = np.where(n > 0, confidence, np.nan)
+
+    # Collect the rejected vintages per cell from the sparse set of rejections
+    n_months, n_ages = n.shape
+    v_idx, m_idx, a_idx = np.nonzero(rejected)
+    rejected_labels = pd.Series(tensor.vintages.astype(str)[v_idx]).groupby(m_idx * n_ages + a_idx).agg(';'.join)
+    rejected_column = pd.Series('', index=np.arange(n_months * n_ages))
+    rejected_column.loc[rejected_labels.index] = rejected_labels.values
+
+    result = pd.DataFrame({
+        'Date': np.repeat(tensor.months.to_timestamp(), n_ages),
+        'Age_Group': np.tile(tensor.age_groups, n_months),
+        'consensus': consensus.ravel(),
+        'n_vintages': n.ravel(),
+        'n_kept': n_kept.ravel(),
+        'n_rejected': (n - n_kept).ravel(),
+        'robust_spread': kept_spread.ravel(),
+        'confidence': confidence.ravel(),
+        'rejected_vintages': rejected_column.to_numpy(),
+    })
+    result['method'] = method
+    return result[result['n_vintages'] > 0].reset_index(drop=True)
+
+def publish_consensus(dataset_path=None, output_path=None, **kwargs):
+    """
+    Build the consensus series for the AI dataset and write it to ``consensus.parquet``
+    beside the dataset (or `output_path`). Extra keyword arguments go to build_consensus.
+    """
+    if dataset_path is None:
+        dataset_path = DEFAULT_DATASET_PATH
+    if output_path is None:
+        output_path = os.path.join(os.path.dirname(dataset_path), "consensus.parquet")
+
+    tensor = load_vintage_tensor(dataset_path)
+    consensus = build_consensus(tensor, **kwargs)
+    consensus.to_parquet(output_path, index=False)
+
+    print(f"Consensus series saved to {output_path}")
+    print(f"Cells: {len(consensus)}, with rejections: {(consensus['n_rejected'] > 0).sum()}, "
+          f"vintages rejected: {consensus['n_rejected'].sum()}")
+    return consensus
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build a robust consensus series across report vintages")
+    parser.add_argument("--method", choices=['median', 'trimmed_mean'], default='median')
+    parser.add_argument("--threshold", type=float, default=3.5, help="Robust z-score for rejecting a vintage")
+    parser.add_argument("--trim", type=float, default=0.1, help="Trim proportion for trimmed_mean")
+    args = parser.parse_args()
+
+    publish_consensus(method=args.method, threshold=args.threshold, trim=args.trim)
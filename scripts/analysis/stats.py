@@ -0,0 +1,112 @@
+import os
+import argparse
+import pandas as pd
+
+from cache import file_hash, cache_path_for, remove_stale
+from vintage_tensor import AGE_GROUPS, DEFAULT_DATASET_PATH
+
+# Period granularities understood by period_stats, with the label format the notebooks use
+GRANULARITIES = {
+    'M': 'Year-Month',
+    'Q': 'Year-Quarter',
+    'Y': 'Year',
+}
+
+def to_long(data, age_groups=None):
+    """
+    Convert a dataset in the AI.csv layout into long format (Date, Age_Group, Value),
+    cleaning thousands separators and dropping missing values once for all age groups.
+    """
+    if age_groups is None:
+        age_groups = [col for col in AGE_GROUPS if col in data.columns]
+
+    frame = data[['Date', *age_groups]].copy()
+    frame['Date'] = pd.to_datetime(frame['Date'], errors='coerce')
+    for col in age_groups:
+        if not pd.api.types.is_numeric_dtype(frame[col]):
+            frame[col] = pd.to_numeric(frame[col].astype(str).str.replace(',', ''), errors='coerce')
+
+    long = frame.melt(id_vars='Date', var_name='Age_Group', value_name='Value')
+    return long.dropna(subset=['Date', 'Value']).reset_index(drop=True)
+
+def period_stats(data, granularities=('M', 'Q'), age_groups=None):
+    """
+    Count, mean, median, std, quartiles and IQR for every age group and period.
+
+    All requested granularities are stacked into one long frame and summarised by
+    one groupby (built-in aggregations and a grouped quantile), so the periods are
+    always derived the same way (Year-Month '2019-01', Year-Quarter '2019Q1', Year '2019').
+
+    Parameters:
+        data (pd.DataFrame): Dataset in the AI.csv layout
+        granularities (tuple): Any of 'M', 'Q' and 'Y'
+        age_groups (list, optional): Columns to summarise (defaults to all known age groups present)
+
+    Returns:
+        pd.DataFrame: Granularity, Period, Age_Group, count, mean, median, std, q1, q3, IQR
+    """
+    unknown = [g for g in granularities if g not in GRANULARITIES]
+    if unknown:
+        raise ValueError(f"Unknown granularities: {unknown}")
+
+    long = to_long(data, age_groups)
+
+    stacked = pd.concat(
+        [long.assign(Granularity=GRANULARITIES[g], Period=long['Date'].dt.to_period(g).astype(str))
+         for g in granularities],
+        ignore_index=True,
+    )
+
+    grouped = stacked.groupby(['Granularity', 'Period', 'Age_Group'], sort=True)['Value']
+    stats = grouped.agg(['count', 'mean', 'median', 'std'])
+    # Quartiles through the grouped quantile rather than a per-group callable in agg()
+    quartiles = grouped.quantile([0.25, 0.75]).unstack()
+    quartiles.columns = ['q1', 'q3']
+    stats = stats.join(quartiles).reset_index()
+    stats['IQR'] = stats['q3'] - stats['q1']
+    return stats
+
+def load_period_stats(dataset_path=None, granularities=('M', 'Q'), age_groups=None, use_cache=True):
+    """
+    Return period_stats for a dataset file, memoized on disk.
+
+    Results are cached in the ``cache`` directory beside the dataset, keyed by the
+    dataset's content hash and the requested granularities/age groups, so every
+    notebook and report script reuses the same numbers until the dataset changes.
+    """
+    if dataset_path is None:
+        dataset_path = DEFAULT_DATASET_PATH
+
+    name = "period_stats_" + "".join(granularities)
+    if age_groups is not None:
+        name += "_" + "-".join(age_groups)
+    cache_path = cache_path_for(dataset_path, name, "parquet", file_hash(dataset_path))
+
+    if use_cache and os.path.exists(cache_path):
+        return pd.read_parquet(cache_path)
+
+    stats = period_stats(pd.read_csv(dataset_path), granularities, age_groups)
+
+    if use_cache:
+        stats.to_parquet(cache_path, index=False)
+        remove_stale(dataset_path, name, cache_path)
+    return stats
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compute per-period statistics for every age group")
+    parser.add_argument("--dataset", default=None, help="Dataset in the AI.csv layout (defaults to AI.csv)")
+    parser.add_argument("--granularity", action="append", choices=list(GRANULARITIES),
+                        help="Period granularity; may be repeated (default: M and Q)")
+    parser.add_argument("--output", default=None, help="Optional CSV path to write the statistics to")
+    args = parser.parse_args()
+
+    granularities = tuple(args.granularity) if args.granularity else ('M', 'Q')
+    stats = load_period_stats(args.dataset, granularities)
+
+    if args.output:
+        stats.to_csv(args.output, index=False)
+        print(f"Statistics saved to {args.output}")
+
+    for granularity, group in stats.groupby('Granularity'):
+        print(f"\n{granularity}: {group['Period'].nunique()} periods, {len(group)} rows")
+        print(group.tail(8).to_string(index=False))
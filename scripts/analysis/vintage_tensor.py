@@ -0,0 +1,217 @@
+import os
+import sys
+import re
+import json
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import get_path
+
+from cache import file_hash, cache_path_for, remove_stale
+
+# Value columns of the final AI dataset, in tensor order
+AGE_GROUPS = ['2YO', '3YO', '4YO', '5YO', '3-5YO Avg.']
+
+DEFAULT_DATASET_PATH = get_path('final_dataset', "AI.csv")
+
+def parse_vintage(source_file):
+    """
+    Convert a report file name such as '02_2018.csv' or '1_2024.csv' into the
+    monthly Period of the report it came from (None if it doesn't match).
+    """
+    match = re.search(r'(\d{1,2})_(\d{4})', str(source_file))
+    if not match:
+        return None
+    month, year = match.groups()
+    return pd.Period(year=int(year), month=int(month), freq='M')
+
+class VintageTensor:
+    """
+    Dense view of the AI dataset indexed by [report vintage, observation month, age group].
+
+    Attributes:
+        values (np.ndarray): float array of shape (n_vintages, n_months, n_age_groups), NaN for gaps
+        vintages (pd.PeriodIndex): report months, oldest first
+        months (pd.PeriodIndex): observation months, oldest first
+        age_groups (list): age group labels along the last axis
+    """
+
+    def __init__(self, values, vintages, months, age_groups):
+        self.values = values
+        self.vintages = vintages
+        self.months = months
+        self.age_groups = list(age_groups)
+
+    @property
+    def shape(self):
+        return self.values.shape
+
+    def age_index(self, age_group):
+        return self.age_groups.index(age_group)
+
+    def matrix(self, age_group):
+        """Return the (vintage x month) slice for one age group as a labelled DataFrame"""
+        return pd.DataFrame(self.values[:, :, self.age_index(age_group)],
+                            index=self.vintages, columns=self.months)
+
+    def coverage(self):
+        """Number of vintages that report each (month, age group), shape (n_months, n_age_groups)"""
+        return np.count_nonzero(~np.isnan(self.values), axis=0)
+
+    def first_print(self):
+        """Value from the earliest vintage that reported each (month, age group)"""
+        return _edge_print(self.values, latest=False)
+
+    def latest_print(self):
+        """Value from the most recent vintage that reported each (month, age group)"""
+        return _edge_print(self.values, latest=True)
+
+    def revision(self):
+        """Latest minus first print for each (month, age group)"""
+        return self.latest_print() - self.first_print()
+
+    def revision_spread(self):
+        """Max minus min across vintages for each (month, age group)"""
+        # fmax/fmin ignore NaN and return NaN for all-missing slices without warnings
+        return np.fmax.reduce(self.values, axis=0) - np.fmin.reduce(self.values, axis=0)
+
+    def revision_std(self):
+        """Sample standard deviation across vintages for each (month, age group)"""
+        n = self.coverage()
+        filled = np.where(np.isnan(self.values), 0.0, self.values)
+        total = filled.sum(axis=0)
+        sq_total = (filled ** 2).sum(axis=0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = total / n
+            var = (sq_total - n * mean ** 2) / (n - 1)
+        var = np.where(n > 1, np.maximum(var, 0.0), np.nan)
+        return np.sqrt(var)
+
+    def revision_stats(self):
+        """
+        Tidy table of revision statistics, one row per (month, age group) with at least one print.
+
+        Columns: Date, Age_Group, n_vintages, first_print, latest_print,
+        revision, revision_pct, spread, std
+        """
+        first = self.first_print()
+        latest = self.latest_print()
+        with np.errstate(invalid='ignore', divide='ignore'):
+            revision_pct = (latest - first) / first * 100
+
+        n_months, n_ages = first.shape
+        stats = pd.DataFrame({
+            'Date': np.repeat(self.months.to_timestamp(), n_ages),
+            'Age_Group': np.tile(self.age_groups, n_months),
+            'n_vintages': self.coverage().ravel(),
+            'first_print': first.ravel(),
+            'latest_print': latest.ravel(),
+            'revision': (latest - first).ravel(),
+            'revision_pct': revision_pct.ravel(),
+            'spread': self.revision_spread().ravel(),
+            'std': self.revision_std().ravel(),
+        })
+        return stats[stats['n_vintages'] > 0].reset_index(drop=True)
+
+def _edge_print(values, latest):
+    """Pick the first (or last) non-NaN value along the vintage axis"""
+    present = ~np.isnan(values)
+    if latest:
+        idx = values.shape[0] - 1 - np.argmax(present[::-1], axis=0)
+    else:
+        idx = np.argmax(present, axis=0)
+    picked = np.take_along_axis(values, idx[np.newaxis], axis=0)[0]
+    return np.where(present.any(axis=0), picked, np.nan)
+
+def build_vintage_tensor(data, age_groups=None):
+    """
+    Build a VintageTensor from a DataFrame in the AI.csv layout
+    (Date, Source_File and one column per age group).
+
+    Duplicate (vintage, month) rows within one report are averaged.
+    """
+    if age_groups is None:
+        age_groups = [col for col in AGE_GROUPS if col in data.columns]
+
+    dates = pd.to_datetime(data['Date'], errors='coerce')
+    vintage = data['Source_File'].map(parse_vintage)
+    valid = dates.notna() & vintage.notna()
+    if not valid.all():
+        print(f"Warning: skipping {int((~valid).sum())} rows with unparseable Date or Source_File")
+
+    months = pd.PeriodIndex(dates[valid], freq='M')
+    vintages = pd.PeriodIndex(vintage[valid].tolist(), freq='M')
+
+    month_axis = pd.period_range(months.min(), months.max(), freq='M')
+    vintage_axis = pd.PeriodIndex(sorted(vintages.unique()), freq='M')
+
+    # Integer coordinates of every row along the first two axes
+    m_idx = month_axis.get_indexer(months)
+    v_idx = vintage_axis.get_indexer(vintages)
+
+    shape = (len(vintage_axis), len(month_axis), len(age_groups))
+    sums = np.zeros(shape)
+    counts = np.zeros(shape)
+
+    values = data.loc[valid, age_groups].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+    rows, cols = np.nonzero(~np.isnan(values))
+    np.add.at(sums, (v_idx[rows], m_idx[rows], cols), values[rows, cols])
+    np.add.at(counts, (v_idx[rows], m_idx[rows], cols), 1)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        tensor = np.where(counts > 0, sums / counts, np.nan)
+
+    return VintageTensor(tensor, vintage_axis, month_axis, age_groups)
+
+def load_vintage_tensor(dataset_path=None, use_cache=True, mmap=True):
+    """
+    Load the vintage tensor for `dataset_path`, building and caching it on first use.
+
+    The tensor is cached as a .npy file (plus a .json file with its axes) in a
+    ``cache`` directory beside the dataset, keyed by the dataset's content hash.
+    With `mmap` the cached array is memory-mapped read-only instead of read into memory.
+    """
+    if dataset_path is None:
+        dataset_path = DEFAULT_DATASET_PATH
+
+    dataset_hash = file_hash(dataset_path)
+    npy_path = cache_path_for(dataset_path, "vintage_tensor", "npy", dataset_hash)
+    axes_path = os.path.splitext(npy_path)[0] + ".json"
+
+    if use_cache and os.path.exists(npy_path) and os.path.exists(axes_path):
+        with open(axes_path, 'r', encoding='utf-8') as f:
+            axes = json.load(f)
+        values = np.load(npy_path, mmap_mode='r' if mmap else None)
+        return VintageTensor(
+            values,
+            pd.PeriodIndex(axes['vintages'], freq='M'),
+            pd.PeriodIndex(axes['months'], freq='M'),
+            axes['age_groups'],
+        )
+
+    tensor = build_vintage_tensor(pd.read_csv(dataset_path))
+
+    if use_cache:
+        np.save(npy_path, tensor.values)
+        with open(axes_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'dataset_hash': dataset_hash,
+                'vintages': [str(p) for p in tensor.vintages],
+                'months': [str(p) for p in tensor.months],
+                'age_groups': tensor.age_groups,
+            }, f, indent=2)
+        remove_stale(dataset_path, "vintage_tensor", npy_path)
+        print(f"Cached vintage tensor {tensor.shape} to {npy_path}")
+
+    return tensor
+
+if __name__ == "__main__":
+    tensor = load_vintage_tensor()
+    print(f"Tensor shape (vintages, months, age groups): {tensor.shape}")
+    print(f"Vintages: {tensor.vintages[0]} to {tensor.vintages[-1]}")
+    print(f"Observation months: {tensor.months[0]} to {tensor.months[-1]}")
+
+    stats = tensor.revision_stats()
+    print("\nLargest absolute revisions (latest vs first print):")
+    print(stats.reindex(stats['revision'].abs().sort_values(ascending=False).index).head(10).to_string(index=False))
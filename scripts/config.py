@@ -0,0 +1,96 @@
+"""
+Central place where every script looks up its data folders.
+
+Each location has a key (e.g. 'raw_pdfs') and is resolved, in order of priority, from:
+    1. an environment variable LIFECYCLE_<KEY>, e.g. LIFECYCLE_RAW_PDFS
+    2. the [paths] section of the config file (LIFECYCLE_CONFIG, or lifecycle.ini
+       in the repository root)
+    3. the default below, relative to another location
+
+Relative values are taken relative to the repository root, so setting only
+LIFECYCLE_ROOT (or `root` in lifecycle.ini) moves all the data folders at once.
+Lookups happen on every call, so a script (or the shard runner) may change the
+environment before calling get_path.
+
+Scripts in the subfolders put scripts/ on sys.path and import get_path from here:
+
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from config import get_path
+"""
+import os
+import configparser
+
+CONFIG_FILENAME = "lifecycle.ini"
+ENV_PREFIX = "LIFECYCLE_"
+
+# The repository root is the parent of this scripts/ folder
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# key: (location it is relative to, sub path)
+DEFAULT_PATHS = {
+    'data': ('root', 'data'),
+    'pdf_links': ('data', 'pdf_links'),
+    'raw_pdfs': ('data', 'raw_pdfs'),
+    'download_logs': ('raw_pdfs', 'logs'),
+    'extracted_images': ('data', 'extracted_images'),
+    'extraction_logs': ('extracted_images', 'logs'),
+    'graph2table': ('data', os.path.join('csv_data', 'graph2table')),
+    'graph2table_raw': ('graph2table', 'Raw'),
+    'final_dataset': ('data', 'final_dataset'),
+    'shards': ('data', 'shards'),
+    'metrics': ('data', 'metrics'),
+    'render_cache': ('data', 'render_cache'),
+    # Folders outside the repository used by the manual tools
+    'downloads': ('home', 'Downloads'),
+    'sorter_source': ('home', os.path.join('Desktop', 'Lifecycle_RA', 'Images')),
+    'sorter_dest': ('home', os.path.join('Desktop', 'Lifecycle_RA', 'Sorted_Images')),
+    'cropper_images': ('home', os.path.join('Desktop', 'Lifecycle_RA', 'Data', 'Processed', 'Sorted_Images')),
+    'curator': ('home', os.path.join('Desktop', 'Scraping Task')),
+}
+
+def config_file_path():
+    return os.environ.get(ENV_PREFIX + "CONFIG", os.path.join(REPO_ROOT, CONFIG_FILENAME))
+
+def load_config_paths():
+    """The [paths] section of the config file as a dict (empty if there is no file)"""
+    parser = configparser.ConfigParser(interpolation=None)
+    parser.read(config_file_path(), encoding='utf-8')
+    if parser.has_section('paths'):
+        return dict(parser.items('paths'))
+    return {}
+
+def get_path(key, *parts):
+    """
+    Resolve a configured location, optionally joined with further path parts.
+
+    Example:
+        get_path('final_dataset', 'AI.csv')
+    """
+    return os.path.join(_resolve(key, load_config_paths()), *parts)
+
+def _resolve(key, configured):
+    value = os.environ.get(ENV_PREFIX + key.upper()) or configured.get(key)
+    if value:
+        value = os.path.expanduser(value)
+        if key == 'root' or os.path.isabs(value):
+            return os.path.abspath(value)
+        return os.path.abspath(os.path.join(_resolve('root', configured), value))
+
+    if key == 'root':
+        return REPO_ROOT
+    if key == 'home':
+        return os.path.expanduser('~')
+    if key not in DEFAULT_PATHS:
+        raise KeyError(f"Unknown path key: {key}")
+    base, sub_path = DEFAULT_PATHS[key]
+    return os.path.join(_resolve(base, configured), sub_path)
+
+def describe_paths():
+    """Every key with its resolved location, for checking a machine's setup"""
+    configured = load_config_paths()
+    return {key: _resolve(key, configured) for key in ['root', 'home', *DEFAULT_PATHS]}
+
+if __name__ == "__main__":
+    print(f"Config file: {config_file_path()}")
+    for key, path in describe_paths().items():
+        print(f"{key:18s} {path}")
@@ -1,15 +1,49 @@
 import pandas as pd
 import os
+import sys
 import glob
 import re
+import json
+import hashlib
+import argparse
 from datetime import datetime
 
-def combine_csv_files():
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import get_path
+import instrumentation
+
+# Each chart target's CSVs are combined separately (see chart_targets.py)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "pdfs"))
+import chart_targets
+
+# Name of the manifest that records which raw CSVs have been ingested
+MANIFEST_FILENAME = "combined_manifest.json"
+
+# Directory (inside the output directory) holding one processed CSV per raw file
+PARTITIONS_DIRNAME = "partitions"
+
+def combined_filename(target=chart_targets.SERIES_TARGET):
+    """Combined output of a chart target: combined_data.csv for the retail price chart, else combined_<target>.csv"""
+    return "combined_data.csv" if target == chart_targets.SERIES_TARGET else f"combined_{target}.csv"
+
+def manifest_filename(target=chart_targets.SERIES_TARGET):
+    """Ingest manifest of a chart target's incremental combine"""
+    return MANIFEST_FILENAME if target == chart_targets.SERIES_TARGET else f"combined_{target}_manifest.json"
+
+def target_csv_files(csv_dir, target=chart_targets.SERIES_TARGET):
+    """The raw CSVs in csv_dir that hold a chart target ('XX_YYYY.csv' are the retail price chart's)"""
+    return sorted(
+        csv_file for csv_file in glob.glob(os.path.join(csv_dir, "*.csv"))
+        if chart_targets.target_of_csv(csv_file) == target
+    )
+
+def combine_csv_files(csv_dir=None, output_dir=None, target=chart_targets.SERIES_TARGET):
     # Define the directory path containing the CSV files
-    csv_dir = r"C:\Users\clint\Desktop\Lifecycle Code\data\csv_data\graph2table\Raw"
+    if csv_dir is None:
+        csv_dir = get_path('graph2table_raw')
     
-    # Use glob to get all CSV files in the directory
-    csv_files = glob.glob(os.path.join(csv_dir, "*.csv"))
+    # Get the CSV files of this chart target in the directory
+    csv_files = target_csv_files(csv_dir, target)
     
     if not csv_files:
         print(f"No CSV files found in {csv_dir}")
@@ -22,11 +56,45 @@ def combine_csv_files():
     
     # Read and process each CSV file
     for csv_file in csv_files:
-        filename = os.path.basename(csv_file)
-        print(f"Reading {filename}")
-        
+        processed_dfs.append(process_csv_file(csv_file))
+    
+    # Combine all DataFrames with vertical concatenation
+    print("Combining files with vertical concatenation based on Date column")
+    with instrumentation.span('concat_and_sort'):
+        combined_df = pd.concat(processed_dfs, ignore_index=True)
+    
+        # Sort the combined DataFrame by Date for better organization
+        combined_df = combined_df.sort_values('Date')
+    
+    # Save the combined DataFrame
+    if output_dir is None:
+        output_dir = get_path('graph2table')
+    # Create the output directory if it doesn't exist
+    os.makedirs(output_dir, exist_ok=True)
+    
+    output_path = os.path.join(output_dir, combined_filename(target))
+    with instrumentation.span('write'):
+        combined_df.to_csv(output_path, index=False)
+    
+    print(f"Combined data saved to {output_path}")
+    print(f"Combined data shape: {combined_df.shape}")
+    print(f"Date range: {combined_df['Date'].min()} to {combined_df['Date'].max()}")
+    
+    return combined_df
+
+def process_csv_file(csv_file):
+    """
+    Read a single raw Graph2Table CSV and return it in the combined layout
+    (parsed "Date" first, standardized age columns, "Source_File" added).
+    """
+    filename = os.path.basename(csv_file)
+    print(f"Reading {filename}")
+    
+    # One timing record per raw CSV in the metrics JSONL
+    with instrumentation.item(filename, 'process_csv') as record:
         # Read CSV file
-        df = pd.read_csv(csv_file)
+        with instrumentation.span('read_csv'):
+            df = pd.read_csv(csv_file)
         
         # Rename the first column to "Date" regardless of its original name
         first_col_name = df.columns[0]
@@ -34,42 +102,251 @@ def combine_csv_files():
         
         # Process dates with special handling for this format
         print(f"Processing dates in {filename}")
-        df = process_dates(df)
+        with instrumentation.span('process_dates'):
+            df = process_dates(df)
         
         # Standardize column names (3YD -> 3YO, 4YD -> 4YO, 5YD -> 5YO)
         print(f"Standardizing column names in {filename}")
-        df = standardize_column_names(df)
+        with instrumentation.span('standardize_columns'):
+            df = standardize_column_names(df)
+        record['rows'] = len(df)
+    instrumentation.count('rows', len(df))
+    
+    # Add source file information
+    df['Source_File'] = filename
+    
+    # Ensure "Date" is the first column
+    cols = df.columns.tolist()
+    cols.remove("Date")
+    df = df[["Date"] + cols]
+    
+    return df
+
+def file_fingerprint(file_path):
+    """
+    Return the manifest entry for a file: its size, modification time and SHA-256 hash.
+    """
+    sha256 = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            sha256.update(chunk)
+    
+    stat = os.stat(file_path)
+    return {
+        'size': stat.st_size,
+        'mtime': stat.st_mtime,
+        'sha256': sha256.hexdigest()
+    }
+
+def load_manifest(manifest_path):
+    """Load the ingest manifest, returning an empty one if it doesn't exist yet"""
+    if not os.path.isfile(manifest_path):
+        return {'files': {}}
+    
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def save_manifest(manifest, manifest_path):
+    """Write the manifest atomically so an interrupted run never leaves it half-written"""
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+
+def write_rows(f, df, columns, ingested, name):
+    """Append a processed partition's rows to an open combined file, recording where they are"""
+    ingested[name]['offset'] = f.tell()
+    df.reindex(columns=columns).to_csv(f, header=False, index=False, lineterminator='\n')
+    ingested[name]['length'] = f.tell() - ingested[name]['offset']
+
+def write_combined(output_path, partitions_dir, ingested):
+    """
+    Write combined_data.csv from scratch: the header (every column of every
+    partition), then the rows of each partition in name order.
+
+    Returns:
+        list: The columns of the combined file
+    """
+    partition_dfs = {
+        name: pd.read_csv(os.path.join(partitions_dir, ingested[name]['partition']))
+        for name in sorted(ingested)
+    }
+    columns = []
+    for df in partition_dfs.values():
+        columns += [col for col in df.columns if col not in columns]
+    with open(output_path, 'w', encoding='utf-8', newline='') as f:
+        f.write(','.join(columns) + '\n')
+        for name, df in partition_dfs.items():
+            write_rows(f, df, columns, ingested, name)
+    return columns
+
+def drop_rows(output_path, ingested, entries):
+    """
+    Remove the rows of the given manifest entries from combined_data.csv.
+
+    Each partition's rows are one contiguous byte range of the file, so it is
+    cut at the first affected range and only the rows after it are written back.
+    """
+    start = min(entry['offset'] for entry in entries)
+    # The dropped entries are no longer in the manifest, and replacements aren't written yet
+    following = sorted((entry['offset'], name) for name, entry in ingested.items()
+                       if 'offset' in entry and entry['offset'] >= start)
+    with open(output_path, 'r+b') as f:
+        kept = []
+        for offset, name in following:
+            f.seek(offset)
+            kept.append((name, f.read(ingested[name]['length'])))
+        f.seek(start)
+        f.truncate()
+        for name, data in kept:
+            ingested[name]['offset'] = f.tell()
+            f.write(data)
+
+def combine_csv_files_incremental(csv_dir=None, output_dir=None, target=chart_targets.SERIES_TARGET):
+    """
+    Incrementally combine the raw Graph2Table CSVs.
+
+    Every raw CSV is processed into its own partition file under
+    ``<output_dir>/partitions``. A manifest records the name, size and hash of
+    each ingested file and where its rows are in ``combined_data.csv``, so only
+    new or changed raw CSVs are re-processed: the rows of a new file are
+    appended, and those of a changed or deleted file are cut out of the file
+    (rewriting only the rows stored after them) before the new rows are appended.
+
+    Rows are grouped by source file in the order they were ingested rather than
+    sorted by date; sort on "Date" after loading where the order matters. The
+    file is only written from scratch from the partitions when it doesn't exist
+    yet, an earlier run was interrupted while updating it, or a new file brings
+    a column the combined file doesn't have.
+
+    Other chart targets are combined the same way into combined_<target>.csv,
+    with their own manifest.
+
+    Parameters:
+        csv_dir (str, optional): Directory containing the raw CSV files
+        output_dir (str, optional): Directory for combined_data.csv, the manifest and partitions
+        target (str): Chart target whose CSVs are combined (defaults to the retail price chart)
+
+    Returns:
+        dict: Names of the raw CSVs that were 'added', 'changed' and 'removed'
+    """
+    if csv_dir is None:
+        csv_dir = get_path('graph2table_raw')
+    if output_dir is None:
+        output_dir = get_path('graph2table')
+    
+    partitions_dir = os.path.join(output_dir, PARTITIONS_DIRNAME)
+    os.makedirs(partitions_dir, exist_ok=True)
+    
+    manifest_path = os.path.join(output_dir, manifest_filename(target))
+    manifest = load_manifest(manifest_path)
+    ingested = manifest['files']
+    output_path = os.path.join(output_dir, combined_filename(target))
+    
+    # The combined file can only be updated in place if it is in the state the manifest describes
+    columns = manifest.get('columns')
+    rebuild = (not manifest.get('combined_complete') or columns is None or not os.path.exists(output_path)
+               or any('offset' not in entry for entry in ingested.values()))
+    
+    csv_files = target_csv_files(csv_dir, target)
+    current_names = {os.path.basename(csv_file) for csv_file in csv_files}
+    
+    # Drop partitions whose raw file has been removed since the last run
+    removed = [name for name in ingested if name not in current_names]
+    stale_entries = []
+    for name in removed:
+        partition_path = os.path.join(partitions_dir, ingested[name]['partition'])
+        if os.path.exists(partition_path):
+            os.remove(partition_path)
+        stale_entries.append(ingested.pop(name))
+        print(f"Removed partition for deleted file {name}")
+    
+    added = []
+    changed = []
+    new_rows = {}
+    for csv_file in csv_files:
+        filename = os.path.basename(csv_file)
+        entry = ingested.get(filename)
+        partition_path = os.path.join(partitions_dir, filename)
+        
+        # Only hash files whose size or modification time moved since the last run
+        stat = os.stat(csv_file)
+        if (entry is not None and os.path.exists(partition_path)
+                and entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime):
+            continue
+        
+        with instrumentation.span('fingerprint'):
+            fingerprint = file_fingerprint(csv_file)
+        if (entry is not None and os.path.exists(partition_path)
+                and entry['sha256'] == fingerprint['sha256']):
+            # Touched but identical content - just refresh the recorded mtime
+            entry.update(fingerprint)
+            continue
         
-        # Add source file information
-        df['Source_File'] = filename
+        df = process_csv_file(csv_file)
+        with instrumentation.span('write_partition'):
+            df.to_csv(partition_path, index=False)
+        new_rows[filename] = df
         
-        # Ensure "Date" is the first column
-        cols = df.columns.tolist()
-        cols.remove("Date")
-        df = df[["Date"] + cols]
+        fingerprint['partition'] = filename
+        fingerprint['rows'] = len(df)
+        fingerprint['ingested_at'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        ingested[filename] = fingerprint
         
-        processed_dfs.append(df)
+        if entry is None:
+            added.append(filename)
+        else:
+            changed.append(filename)
+            if 'offset' in entry:
+                stale_entries.append(entry)
     
-    # Combine all DataFrames with vertical concatenation
-    print("Combining files with vertical concatenation based on Date column")
-    combined_df = pd.concat(processed_dfs, ignore_index=True)
+    print(f"Incremental combine: {len(added)} new, {len(changed)} changed, "
+          f"{len(removed)} removed, {len(csv_files) - len(added) - len(changed)} unchanged")
+    summary = {'added': added, 'changed': changed, 'removed': removed}
     
-    # Sort the combined DataFrame by Date for better organization
-    combined_df = combined_df.sort_values('Date')
+    if not (added or changed or removed) and not rebuild:
+        save_manifest(manifest, manifest_path)
+        print(f"No new or changed raw CSVs. {output_path} is up to date.")
+        return summary
     
-    # Save the combined DataFrame
-    output_dir = r"C:\Users\clint\Desktop\Lifecycle Code\data\csv_data\graph2table"
-    # Create the output directory if it doesn't exist
-    os.makedirs(output_dir, exist_ok=True)
+    if not ingested:
+        manifest.pop('columns', None)
+        manifest['combined_complete'] = False
+        save_manifest(manifest, manifest_path)
+        print(f"No CSV files found in {csv_dir}")
+        return summary
+    
+    if not rebuild and any(col not in columns for df in new_rows.values() for col in df.columns):
+        print("A new raw CSV has columns the combined file doesn't have")
+        rebuild = True
+    
+    # Mark the combined file as being updated, so an interrupted run rebuilds it next time
+    manifest['combined_complete'] = False
+    save_manifest(manifest, manifest_path)
+    
+    if rebuild:
+        print(f"Writing {output_path} from the partitions")
+        with instrumentation.span('rebuild'):
+            columns = write_combined(output_path, partitions_dir, ingested)
+    else:
+        if stale_entries:
+            with instrumentation.span('drop_rows'):
+                drop_rows(output_path, ingested, stale_entries)
+        with instrumentation.span('append'):
+            with open(output_path, 'a', encoding='utf-8', newline='') as f:
+                for name in sorted(new_rows):
+                    write_rows(f, new_rows[name], columns, ingested, name)
     
-    output_path = os.path.join(output_dir, "combined_data.csv")
-    combined_df.to_csv(output_path, index=False)
+    # Only record the new state once the combined output has been written
+    manifest['columns'] = columns
+    manifest['combined_complete'] = True
+    save_manifest(manifest, manifest_path)
     
+    rows = sum(entry['rows'] for entry in ingested.values())
     print(f"Combined data saved to {output_path}")
-    print(f"Combined data shape: {combined_df.shape}")
-    print(f"Date range: {combined_df['Date'].min()} to {combined_df['Date'].max()}")
+    print(f"Combined data shape: ({rows}, {len(columns)})")
     
-    return combined_df
+    return summary
 
 def standardize_column_names(df):
     """
@@ -166,4 +443,15 @@ def process_dates(df):
 
 # Execute the function
 if __name__ == "__main__":
-    combine_csv_files()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Combine the raw Graph2Table CSVs into combined_data.csv")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only process new or changed raw CSVs, tracked in a manifest")
+    parser.add_argument("--target", choices=list(chart_targets.TARGETS), default=chart_targets.SERIES_TARGET,
+                        help="Chart target whose CSVs to combine (default: retail_price, into combined_data.csv)")
+    args = parser.parse_args()
+    
+    with instrumentation.run('combine'):
+        if args.incremental:
+            combine_csv_files_incremental(target=args.target)
+        else:
+            combine_csv_files(target=args.target)
\ No newline at end of file
@@ -5,6 +5,7 @@ from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.common.action_chains import ActionChains
 import time
 import os
+import sys
 import shutil
 import glob
 import re
@@ -12,6 +13,18 @@ from pathlib import Path
 import csv
 from datetime import datetime
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import get_path
+import image_store
+
+# Perceptual-hash duplicate detection lives with the other image utilities
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "utils"))
+from image_dedup import DuplicateChecker, digitized_csv_name, load_digitized, record_digitized
+
+# The chart types the extractor produces, to name each image's CSV after its target
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "pdfs"))
+import chart_targets
+
 def get_image_files(directory):
     """Get all image files from the specified directory"""
     image_extensions = ['.png', '.jpg', '.jpeg', '.gif', '.bmp']
@@ -24,7 +37,7 @@ def get_image_files(directory):
 
 def log_error_to_csv(image_path, error_type, error_message):
     """Log an error to the CSV file"""
-    error_log_path = r"C:\Users\clint\Desktop\Lifecycle Code\data\csv_data\graph2table\processing_errors.csv"
+    error_log_path = get_path('graph2table', "processing_errors.csv")
     
     # Check if file exists to determine if we need to write headers
     file_exists = os.path.isfile(error_log_path)
@@ -168,11 +181,11 @@ def process_downloaded_file(image_path):
     """Process the downloaded CSV file by moving and renaming it"""
     try:
         # Create target directory if it doesn't exist
-        target_dir = r"C:\Users\clint\Desktop\Lifecycle Code\data\csv_data\graph2table"
+        target_dir = get_path('graph2table')
         os.makedirs(target_dir, exist_ok=True)
         
         # Get the download directory (specific Downloads folder)
-        downloads_dir = r"C:\Users\clint\Downloads"
+        downloads_dir = get_path('downloads')
         
         # Find the most recently downloaded CSV file
         csv_files = glob.glob(os.path.join(downloads_dir, "*.csv"))
@@ -184,40 +197,94 @@ def process_downloaded_file(image_path):
         latest_file = max(csv_files, key=os.path.getmtime)
         print(f"Found downloaded CSV: {latest_file}")
         
-        # Extract the base name from the image path
-        image_name = os.path.basename(image_path)
-        
-        # Use regex to extract XX_YYYY pattern from the filename
-        match = re.search(r'(\d+_\d+)', image_name)
-        if match:
-            base_name = match.group(1)
-        else:
-            # Fallback if the pattern isn't found
-            base_name = os.path.splitext(image_name)[0]
-            print(f"Warning: Could not extract pattern from filename. Using {base_name} instead.")
-        
-        # Check if file with this name already exists and add counter if needed
-        counter = 1
-        new_filename = f"{base_name}.csv"
-        full_path = os.path.join(target_dir, new_filename)
-        
-        while os.path.exists(full_path):
-            counter += 1
-            new_filename = f"{base_name}_{counter}.csv"
-            full_path = os.path.join(target_dir, new_filename)
+        full_path = csv_path_for_image(target_dir, image_path)
         
         # Copy the file to the new location with the new name
         shutil.copy2(latest_file, full_path)
         print(f"File renamed and moved to: {full_path}")
+        
+        # Remember which CSV holds this image's data (and the image's hash when it was digitized)
+        record_digitized(image_path, full_path)
+        return full_path
     except Exception as e:
         print(f"An error occurred while processing the file: {e}")
 
-def process_all_images(image_paths=None):
-    """Process specified images or all images in the extracted_images directory (top level only)"""
+def csv_path_for_image(target_dir, image_path):
+    """
+    Path for an image's CSV in target_dir: the CSV recorded for it when it was
+    digitized before (so new data replaces the old), else XX_YYYY.csv for the
+    retail price chart and XX_YYYY_<target>.csv for the other chart targets,
+    with _2, _3, ... added if that is taken (by a file or by another image's record).
+    """
+    recorded = digitized_csv_name(image_path)
+    if recorded is not None:
+        return os.path.join(target_dir, recorded)
+    taken = {entry['csv'] for entry in load_digitized()['images'].values()}
+    
+    image_name = os.path.basename(image_path)
+    
+    # Use regex to extract XX_YYYY pattern from the filename
+    match = re.search(r'(\d+_\d+)', image_name)
+    if match:
+        target = chart_targets.target_of_image(image_name)
+        base_name = chart_targets.csv_basename(match.group(1), target.name if target else chart_targets.SERIES_TARGET)
+    else:
+        # Fallback if the pattern isn't found
+        base_name = os.path.splitext(image_name)[0]
+        print(f"Warning: Could not extract pattern from filename. Using {base_name} instead.")
+    
+    # Check if file with this name already exists and add counter if needed
+    counter = 1
+    new_filename = f"{base_name}.csv"
+    full_path = os.path.join(target_dir, new_filename)
+    
+    while os.path.exists(full_path) or new_filename in taken:
+        counter += 1
+        new_filename = f"{base_name}_{counter}.csv"
+        full_path = os.path.join(target_dir, new_filename)
+    return full_path
+
+def skip_digitized_duplicate(image_path, checker, target_dir):
+    """
+    Skip an image that was already digitized as it is now, or that is identical
+    (same hash) to a digitized chart of the same variant from another report,
+    whose CSV is then reused under this image's name. A near-duplicate is still
+    digitized, since the newer chart can differ by its latest month.
+    Returns True when the image can be skipped.
+    """
+    image_name = os.path.basename(image_path)
+    duplicate = checker.find_digitized_duplicate(image_path)
+    if duplicate is None:
+        return False
+    
+    duplicate_name, duplicate_csv, distance = duplicate
+    if distance > 0:
+        print(f"{image_name} is close to {duplicate_name} ({distance} bits apart); digitizing it anyway")
+        return False
+    if duplicate_name == image_name:
+        print(f"Skipping {image_name}: already digitized ({duplicate_csv})")
+        return True
+    
+    os.makedirs(target_dir, exist_ok=True)
+    target_path = csv_path_for_image(target_dir, image_path)
+    shutil.copy2(duplicate_csv, target_path)
+    record_digitized(image_path, target_path)
+    print(f"Skipping {image_name}: identical to {duplicate_name}, reused {duplicate_csv} as {target_path}")
+    return True
+
+def process_all_images(image_paths=None, skip_duplicates=True, extra_csv_dirs=()):
+    """
+    Process specified images or all images in the extracted_images directory (top level only).
+    With skip_duplicates, images already digitized as they are, or identical to a digitized chart of
+    the same variant, are not uploaded. Recorded CSVs are looked up in the Raw and graph2table folders
+    and in extra_csv_dirs (e.g. the main graph2table folder when digitizing a shard).
+    Returns the paths of the images that were processed or skipped (i.e. need no further work).
+    """
+    image_directory = get_path('extracted_images')
     if image_paths is None:
+        # Charts only in the packed store (extracted with --no-loose-images) are uploaded from loose files
+        image_store.export_missing(image_directory)
         # Get only top level files from extracted_images directory, not from subdirectories
-        image_directory = r"C:\Users\clint\Desktop\Lifecycle Code\data\extracted_images"
-        
         # Get all files with image extensions directly in the top folder (not recursive)
         image_files = []
         for item in os.listdir(image_directory):
@@ -231,21 +298,35 @@ def process_all_images(image_paths=None):
 
     if not images:
         print("No image files found to process.")
-        return
+        return []
 
     print(f"Found {len(images)} images to process")
 
     # Keep track of success and failure
     success_count = 0
     failure_count = 0
+    skipped_count = 0
+    completed = []
+
+    checker = None
+    if skip_duplicates:
+        target_dir = get_path('graph2table')
+        raw_dir = get_path('graph2table_raw')
+        checker = DuplicateChecker(image_directory, [raw_dir, target_dir, *extra_csv_dirs])
 
     # Process each image
     for image_path in images:
         try:
+            if checker is not None and skip_digitized_duplicate(image_path, checker, target_dir):
+                skipped_count += 1
+                completed.append(image_path)
+                continue
+            
             result = automate_graph2table_upload(image_path)
             if result:
                 print(f"Successfully processed: {os.path.basename(image_path)}")
                 success_count += 1
+                completed.append(image_path)
             else:
                 print(f"Failed to fully process: {os.path.basename(image_path)}")
                 failure_count += 1
@@ -260,10 +341,13 @@ def process_all_images(image_paths=None):
     print("\n=== Processing Complete ===")
     print(f"Total images: {len(images)}")
     print(f"Successfully processed: {success_count}")
+    print(f"Skipped (already digitized): {skipped_count}")
     print(f"Failed to process: {failure_count}")
 
     if failure_count > 0:
-        print(f"Check the error log at: C:\\Users\\clint\\Desktop\\Lifecycle Code\\data\\csv_data\\graph2table\\processing_errors.csv")
+        print(f"Check the error log at: {get_path('graph2table', 'processing_errors.csv')}")
+
+    return completed
 
 if __name__ == "__main__":
     # Process all images in the top-level extracted_images directory
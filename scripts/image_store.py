@@ -0,0 +1,448 @@
+"""
+Packed store for the extracted chart images.
+
+Every crop is appended to one file, data/extracted_images/charts.pack, so tools
+can fetch a chart by (report, variant) from a memory map instead of listing the
+folder and opening thousands of small PNGs:
+
+    from image_store import ImageStore
+
+    with ImageStore() as store:
+        for report, variant in store.keys():
+            image = store.open_image(report, variant)          # PIL image
+        png = store.get_bytes('01_2019', 'retail_price_plot')  # encoded PNG
+
+The report is the PDF name (e.g. '01_2019') and the variant the capture the chart
+was cropped from (e.g. 'retail_price_plot_next_page'); the matching loose file is
+'<report>_<variant>_cropped.png'.
+
+Each record is a small header, the key and the encoded image. The offset index
+(charts.pack.index.json) is only a cache: it is checked against the record headers
+and extended from them when the pack has grown, so several processes can append to
+the same pack (under a lock file) and a crash loses at most the record being
+written. A later record for the same key replaces the earlier one (a chart stored
+again with the same bytes is not appended); `compact` drops the replaced records.
+
+Usage:
+    python scripts/image_store.py import       # pack the loose crops in data/extracted_images
+    python scripts/image_store.py export       # write a loose PNG for every packed chart
+    python scripts/image_store.py list
+    python scripts/image_store.py compact
+"""
+import os
+import io
+import re
+import sys
+import json
+import mmap
+import time
+import struct
+import argparse
+import threading
+from contextlib import contextmanager
+from PIL import Image
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from config import get_path
+
+PACK_FILENAME = "charts.pack"
+INDEX_SUFFIX = ".index.json"
+LOCK_SUFFIX = ".lock"
+INDEX_VERSION = 1
+
+# Record header: magic, key length, image length
+RECORD_MAGIC = b"LCP1"
+RECORD_HEADER = struct.Struct("<4sHQ")
+
+# Loose crop names: '<report>_<variant>_cropped.png'; the variant is the chart target's
+# name part ('retail_price_plot', 'auction_price_plot', ...) and the capture suffix
+CROP_NAME_PATTERN = re.compile(r'^(?P<report>.+?)_(?P<variant>[a-z]+(?:_[a-z]+)*_plot(?:_[A-Za-z0-9_]+?)?)_cropped\.png$')
+
+def crop_filename(report, variant):
+    """Loose file name of a packed chart"""
+    return f"{report}_{variant}_cropped.png"
+
+def parse_crop_filename(filename):
+    """(report, variant) of a loose crop name, or None for other files"""
+    match = CROP_NAME_PATTERN.match(os.path.basename(filename))
+    if not match:
+        return None
+    return match.group('report'), match.group('variant')
+
+def default_pack_path():
+    return get_path('extracted_images', PACK_FILENAME)
+
+@contextmanager
+def file_lock(lock_path):
+    """Exclusive lock shared by every process appending to the same pack"""
+    with open(lock_path, 'a+b') as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+def scan_records(f, start, end):
+    """
+    Read the record headers of an open pack from `start` up to `end`.
+
+    Returns:
+        list: (report, variant, data offset, data length) of every complete record
+        int: Offset just after the last complete record (where a torn tail starts)
+    """
+    records = []
+    position = start
+    while position + RECORD_HEADER.size <= end:
+        f.seek(position)
+        magic, key_length, data_length = RECORD_HEADER.unpack(f.read(RECORD_HEADER.size))
+        data_offset = position + RECORD_HEADER.size + key_length
+        if magic != RECORD_MAGIC or data_offset + data_length > end:
+            break
+        report, _, variant = f.read(key_length).decode('utf-8').partition("/")
+        records.append((report, variant, data_offset, data_length))
+        position = data_offset + data_length
+    return records, position
+
+class ImageStore:
+    """
+    Append-only pack of encoded chart images with an in-memory offset index.
+
+    Parameters:
+        path (str, optional): Pack file (defaults to charts.pack in the extracted_images folder)
+    """
+
+    def __init__(self, path=None):
+        self.path = path or default_pack_path()
+        self.index_path = self.path + INDEX_SUFFIX
+        self.lock_path = self.path + LOCK_SUFFIX
+        self.entries = {}  # (report, variant) -> (data offset, data length), in the order first added
+        self.scanned = 0   # bytes of the pack covered by `entries`
+        self.index_dirty = False
+        self.lock = threading.Lock()
+        self._file = None
+        self._map = None
+        self._load_index()
+        self.refresh()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        self.refresh()
+        return len(self.entries)
+
+    def __contains__(self, key):
+        if key in self.entries:
+            return True
+        self.refresh()
+        return key in self.entries
+
+    def _pack_size(self):
+        try:
+            return os.path.getsize(self.path)
+        except OSError:
+            return 0
+
+    def _load_index(self):
+        """Start from the saved index if it still matches the record headers of the pack"""
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+            if index.get('version') != INDEX_VERSION or index['pack_size'] > self._pack_size():
+                return
+            entries = {(report, variant): (offset, length) for report, variant, offset, length in index['entries']}
+
+            # A compacted or replaced pack has other records at these offsets
+            with open(self.path, 'rb') as f:
+                for (report, variant), (offset, length) in entries.items():
+                    key = f"{report}/{variant}".encode('utf-8')
+                    header_offset = offset - len(key) - RECORD_HEADER.size
+                    if header_offset < 0:
+                        return
+                    f.seek(header_offset)
+                    if f.read(RECORD_HEADER.size + len(key)) != RECORD_HEADER.pack(RECORD_MAGIC, len(key), length) + key:
+                        return
+        except (OSError, ValueError, KeyError, TypeError):
+            return
+        self.entries = entries
+        self.scanned = index['pack_size']
+
+    def refresh(self):
+        """Pick up records appended since the store was opened, by this or another process"""
+        size = self._pack_size()
+        if size == self.scanned:
+            return
+        with self.lock:
+            if size < self.scanned:
+                # The pack was compacted or replaced
+                self.entries = {}
+                self.scanned = 0
+            with open(self.path, 'rb') as f:
+                records, end = scan_records(f, self.scanned, size)
+            for report, variant, offset, length in records:
+                self.entries[(report, variant)] = (offset, length)
+            if records:
+                self.index_dirty = True
+            self.scanned = end
+
+    def keys(self):
+        """(report, variant) of every chart, in the order they were first added"""
+        self.refresh()
+        return list(self.entries)
+
+    def filenames(self):
+        """Loose file names of every chart"""
+        return [crop_filename(report, variant) for report, variant in self.keys()]
+
+    def find(self, filename):
+        """(report, variant) of a loose crop name if that chart is packed, else None"""
+        key = parse_crop_filename(filename)
+        return key if key is not None and key in self else None
+
+    def record_id(self, report, variant):
+        """Identifies the stored bytes of a chart (changes when it is replaced), e.g. for thumbnail caches"""
+        offset, length = self._entry(report, variant)
+        return f"{os.path.abspath(self.path)}@{offset}+{length}"
+
+    def _entry(self, report, variant):
+        entry = self.entries.get((report, variant))
+        if entry is None:
+            self.refresh()
+            entry = self.entries.get((report, variant))
+        if entry is None:
+            raise KeyError(f"No chart {report}/{variant} in {self.path}")
+        return entry
+
+    def get_bytes(self, report, variant):
+        """Encoded image of a chart, read from the memory-mapped pack"""
+        offset, length = self._entry(report, variant)
+        with self.lock:
+            if self._map is None or offset + length > len(self._map):
+                self._remap()
+            return self._map[offset:offset + length]
+
+    def open_image(self, report, variant):
+        """A chart as a PIL image"""
+        return Image.open(io.BytesIO(self.get_bytes(report, variant)))
+
+    def _remap(self):
+        self._unmap()
+        self._file = open(self.path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _unmap(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def append(self, report, variant, data):
+        """
+        Add (or replace) a chart; `data` is the encoded image. Nothing is written
+        when the chart is already stored with the same bytes (e.g. when a PDF is
+        extracted again). Returns whether a record was appended.
+        """
+        key = f"{report}/{variant}".encode('utf-8')
+        record = RECORD_HEADER.pack(RECORD_MAGIC, len(key), len(data)) + key + bytes(data)
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with self.lock, file_lock(self.lock_path):
+            with open(self.path, 'a+b') as f:
+                size = f.seek(0, os.SEEK_END)
+                if size < self.scanned:
+                    self.entries = {}
+                    self.scanned = 0
+                # Records other processes appended since we last looked
+                records, end = scan_records(f, self.scanned, size)
+                for record_report, record_variant, offset, length in records:
+                    self.entries[(record_report, record_variant)] = (offset, length)
+                current = self.entries.get((report, variant))
+                if current is not None and current[1] == len(data):
+                    f.seek(current[0])
+                    if f.read(current[1]) == data:
+                        return False
+                if end < size:
+                    # A writer was interrupted mid-record; drop the torn tail before appending
+                    f.truncate(end)
+                f.seek(end)
+                f.write(record)
+                f.flush()
+            self.entries[(report, variant)] = (end + RECORD_HEADER.size + len(key), len(data))
+            self.scanned = end + len(record)
+            self.index_dirty = True
+        return True
+
+    def save_index(self):
+        """Write the offset index next to the pack (atomically) if it has changed"""
+        self.refresh()
+        with self.lock:
+            if not self.index_dirty:
+                return
+            index = {
+                'version': INDEX_VERSION,
+                'pack_size': self.scanned,
+                'saved': time.strftime("%Y-%m-%d %H:%M:%S"),
+                'entries': [[report, variant, offset, length]
+                            for (report, variant), (offset, length) in self.entries.items()],
+            }
+            tmp_path = f"{self.index_path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(index, f)
+            os.replace(tmp_path, self.index_path)
+            self.index_dirty = False
+
+    def export(self, folder=None, keys=None):
+        """
+        Write loose PNGs for packed charts (all of them by default) into `folder`,
+        skipping files that already hold the same bytes. Returns how many were written.
+        """
+        folder = folder or os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(folder, exist_ok=True)
+        written = 0
+        for report, variant in (keys if keys is not None else self.keys()):
+            data = self.get_bytes(report, variant)
+            path = os.path.join(folder, crop_filename(report, variant))
+            if os.path.exists(path) and os.path.getsize(path) == len(data):
+                with open(path, 'rb') as f:
+                    if f.read() == data:
+                        continue
+            save_bytes(path, data)
+            written += 1
+        return written
+
+    def import_folder(self, folder=None):
+        """Pack the loose crops of a folder that aren't packed with the same bytes yet; returns how many"""
+        folder = folder or os.path.dirname(os.path.abspath(self.path))
+        added = 0
+        for name in sorted(os.listdir(folder)):
+            key = parse_crop_filename(name)
+            if key is None:
+                continue
+            with open(os.path.join(folder, name), 'rb') as f:
+                data = f.read()
+            added += self.append(*key, data)
+        return added
+
+    def merge(self, other_path):
+        """Append the charts of another pack (e.g. a shard's) that differ from ours; returns how many"""
+        added = 0
+        with ImageStore(other_path) as other:
+            for key in other.keys():
+                added += self.append(*key, other.get_bytes(*key))
+        return added
+
+    def compact(self):
+        """Rewrite the pack without replaced records; returns the bytes saved"""
+        with self.lock, file_lock(self.lock_path):
+            with open(self.path, 'rb') as f:
+                size = f.seek(0, os.SEEK_END)
+                records, end = scan_records(f, 0, size)
+                latest = {}
+                for report, variant, offset, length in records:
+                    latest[(report, variant)] = (offset, length)
+                tmp_path = f"{self.path}.{os.getpid()}.tmp"
+                entries = {}
+                with open(tmp_path, 'wb') as out:
+                    for (report, variant), (offset, length) in latest.items():
+                        f.seek(offset)
+                        data = f.read(length)
+                        key = f"{report}/{variant}".encode('utf-8')
+                        out.write(RECORD_HEADER.pack(RECORD_MAGIC, len(key), length) + key)
+                        entries[(report, variant)] = (out.tell(), length)
+                        out.write(data)
+                    new_size = out.tell()
+            self._unmap()
+            os.replace(tmp_path, self.path)
+            self.entries = entries
+            self.scanned = new_size
+            self.index_dirty = True
+        self.save_index()
+        return size - new_size
+
+    def close(self):
+        if self.index_dirty:
+            try:
+                self.save_index()
+            except OSError as e:
+                print(f"Could not save the image index {self.index_path}: {e}")
+        with self.lock:
+            self._unmap()
+
+def save_bytes(path, data):
+    """Write an encoded image atomically: into a temporary file next to `path`, then rename it"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    # The temporary name doesn't end in an image extension, so folder scans never pick it up
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def export_missing(folder=None):
+    """
+    Write a loose PNG for every chart packed in `folder`'s charts.pack that has
+    no loose file there yet, for the tools that need files (img_sorter,
+    Graph2Table) after an extraction with --no-loose-images. Returns how many were written.
+    """
+    folder = folder or get_path('extracted_images')
+    pack_path = os.path.join(folder, PACK_FILENAME)
+    if not os.path.exists(pack_path):
+        return 0
+    with ImageStore(pack_path) as store:
+        keys = [key for key in store.keys() if not os.path.exists(os.path.join(folder, crop_filename(*key)))]
+        return store.export(folder, keys) if keys else 0
+
+# One store per pack and process, shared by the extraction's writer threads
+_open_stores = {}
+_open_stores_lock = threading.Lock()
+
+def shared_store(path=None):
+    """The ImageStore of a pack for this process (opened on first use)"""
+    path = os.path.abspath(path or default_pack_path())
+    with _open_stores_lock:
+        store = _open_stores.get(path)
+        if store is None:
+            store = _open_stores[path] = ImageStore(path)
+        return store
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage the packed chart images (data/extracted_images/charts.pack)")
+    parser.add_argument("command", choices=['import', 'export', 'list', 'compact'])
+    parser.add_argument("--pack", default=None, help="Pack file (default: charts.pack in the extracted_images folder)")
+    parser.add_argument("--folder", default=None, help="Folder of loose PNGs to import from / export to")
+    args = parser.parse_args()
+
+    with ImageStore(args.pack) as store:
+        if args.command == 'import':
+            print(f"Packed {store.import_folder(args.folder)} images into {store.path} ({len(store)} charts)")
+        elif args.command == 'export':
+            print(f"Wrote {store.export(args.folder)} loose PNGs for {len(store)} charts")
+        elif args.command == 'list':
+            for report, variant in store.keys():
+                offset, length = store.entries[(report, variant)]
+                print(f"{report:20s} {variant:45s} {length:10d} bytes at {offset}")
+            print(f"{len(store)} charts in {store.path}")
+        else:
+            print(f"Compacted {store.path}, saved {store.compact()} bytes")
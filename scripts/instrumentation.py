@@ -0,0 +1,304 @@
+"""
+Timing and profiling for the pipeline scripts.
+
+    import instrumentation
+
+    with instrumentation.run('extract'):               # summary table (p50/p95 per span) at the end
+        for pdf_path in pdf_paths:
+            with instrumentation.item(pdf_name):        # one record per PDF in the metrics JSONL
+                with instrumentation.span('get_text'):  # spans nest: 'extract_pdf/get_text'
+                    ...
+                instrumentation.count('pages')
+
+Item records are appended to data/metrics/metrics.jsonl (key 'metrics' in
+scripts/config.py) as soon as the item finishes, so worker processes write
+their own records; they share the run id of the process that started the run.
+
+Profiling is switched on with an environment variable:
+
+    LIFECYCLE_PROFILE=cprofile               profile every run
+    LIFECYCLE_PROFILE=pyinstrument:extract   profile only the 'extract' run (needs pyinstrument)
+
+Profiles are saved next to the metrics (.prof for cProfile, .html for pyinstrument).
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import threading
+from contextlib import contextmanager
+from collections import defaultdict, Counter
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from config import get_path
+
+PROFILE_ENV = "LIFECYCLE_PROFILE"
+RUN_ID_ENV = "LIFECYCLE_RUN_ID"
+METRICS_FILENAME = "metrics.jsonl"
+
+def percentile(values, q):
+    """q-th percentile (0-100) of a list of numbers, interpolating between the closest ranks"""
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    position = (len(ordered) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+class Recorder:
+    """
+    Collects span durations and counters for one process. Spans are nested per
+    thread; the durations of every finished span are kept for the summary.
+    """
+
+    def __init__(self):
+        self.run_name = None
+        self.durations = defaultdict(list)
+        self.started = {}  # span path -> order in which it first started
+        self.counters = Counter()
+        self.local = threading.local()
+        self.lock = threading.Lock()
+
+    def _stack(self):
+        if not hasattr(self.local, 'stack'):
+            self.local.stack = []
+        return self.local.stack
+
+    def _item(self):
+        return getattr(self.local, 'item', None)
+
+    @contextmanager
+    def span(self, name):
+        stack = self._stack()
+        stack.append(name)
+        path = "/".join(stack)
+        with self.lock:
+            self.started.setdefault(path, len(self.started))
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            stack.pop()
+            with self.lock:
+                self.durations[path].append(elapsed)
+            item = self._item()
+            if item is not None and len(stack) >= self.local.item_depth:
+                # Item records use paths relative to the item's own span
+                relative = "/".join(stack[self.local.item_depth:] + [name])
+                item['spans'][relative] = item['spans'].get(relative, 0) + elapsed
+
+    def count(self, name, amount=1):
+        with self.lock:
+            self.counters[name] += amount
+        item = self._item()
+        if item is not None:
+            item['counters'][name] = item['counters'].get(name, 0) + amount
+
+    @contextmanager
+    def item(self, name, span_name=None, **fields):
+        """
+        Time one unit of work (e.g. one PDF) as a span and append its record
+        (total seconds, seconds per nested span, counters and `fields`) to the metrics JSONL.
+        """
+        record = {'item': name, 'spans': {}, 'counters': {}, **fields}
+        outer = (self._item(), getattr(self.local, 'item_depth', 0))
+        self.local.item = record
+        # Spans below this depth are inside the item's span
+        self.local.item_depth = len(self._stack()) + 1
+        start = time.perf_counter()
+        status = 'ok'
+        try:
+            with self.span(span_name or 'item'):
+                yield record
+        except BaseException:
+            status = 'error'
+            raise
+        finally:
+            self.local.item, self.local.item_depth = outer
+            record['seconds'] = round(time.perf_counter() - start, 6)
+            # The caller may mark an item that finished without an exception as failed
+            record['status'] = status if status == 'error' else record.get('status', status)
+            record['spans'] = {path: round(seconds, 6) for path, seconds in record['spans'].items()}
+            write_record(record, self.run_name)
+
+    def reset(self, run_name=None):
+        with self.lock:
+            self.run_name = run_name
+            self.durations.clear()
+            self.started.clear()
+            self.counters.clear()
+
+    def summary(self):
+        """Rows of (span, count, total, p50, p95, max); parents before children, siblings in the order they first ran"""
+        rows = []
+        with self.lock:
+            for path in sorted(self.durations, key=lambda path: self.started.get(path, 0)):
+                values = self.durations[path]
+                rows.append((path, len(values), sum(values), percentile(values, 50), percentile(values, 95), max(values)))
+        return rows
+
+    def print_summary(self, title):
+        rows = self.summary()
+        if not rows and not self.counters:
+            return
+        print(f"\n{title}")
+        print(f"{'span':50s} {'count':>7s} {'total s':>10s} {'p50 ms':>10s} {'p95 ms':>10s} {'max ms':>10s}")
+        for path, count, total, p50, p95, longest in rows:
+            depth = path.count("/")
+            label = "  " * depth + path.rsplit("/", 1)[-1]
+            print(f"{label:50s} {count:7d} {total:10.2f} {p50 * 1000:10.1f} {p95 * 1000:10.1f} {longest * 1000:10.1f}")
+        if self.counters:
+            print("counters: " + ", ".join(f"{name}={value}" for name, value in sorted(self.counters.items())))
+
+# One recorder per process
+_recorder = Recorder()
+
+def span(name):
+    return _recorder.span(name)
+
+def count(name, amount=1):
+    _recorder.count(name, amount)
+
+def item(name, span_name=None, **fields):
+    return _recorder.item(name, span_name, **fields)
+
+def metrics_path():
+    return get_path('metrics', METRICS_FILENAME)
+
+def write_record(record, run_name=None):
+    """Append one record to the metrics JSONL (a single write per line, so processes can share the file)"""
+    record = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'run': run_name,
+        'run_id': os.environ.get(RUN_ID_ENV),
+        'pid': os.getpid(),
+        **record,
+    }
+    path = metrics_path()
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record) + "\n")
+    except OSError as e:
+        print(f"Could not write metrics to {path}: {e}")
+
+def _proc_status_mb(field):
+    """A memory field of /proc/self/status (e.g. VmRSS) in MB, or None off Linux"""
+    try:
+        with open("/proc/self/status", 'r') as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1]) / 2 ** 10
+    except OSError:
+        pass
+    return None
+
+def current_rss_mb():
+    rss = _proc_status_mb("VmRSS")
+    if rss is None:
+        try:
+            import psutil
+            rss = psutil.Process().memory_info().rss / 2 ** 20
+        except ImportError:
+            pass
+    return rss
+
+def peak_rss_mb():
+    """Peak RSS since the process started, or since the last successful reset_peak_rss()"""
+    peak = _proc_status_mb("VmHWM")
+    if peak is None:
+        try:
+            import resource
+            rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            # Bytes on macOS, kilobytes elsewhere
+            peak = rss / 2 ** 20 if sys.platform == 'darwin' else rss / 2 ** 10
+        except ImportError:
+            pass
+    return peak
+
+def reset_peak_rss():
+    """Reset the peak RSS counter (Linux only); returns False if peaks stay process-wide"""
+    try:
+        with open("/proc/self/clear_refs", 'w') as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+def profiler_for(run_name):
+    """The profiler requested by LIFECYCLE_PROFILE for this run ('cprofile', 'pyinstrument' or None)"""
+    setting = os.environ.get(PROFILE_ENV, "").strip().lower()
+    if not setting:
+        return None
+    kind, _, runs = setting.partition(":")
+    if runs and run_name not in [name.strip() for name in runs.split(",")]:
+        return None
+    if kind not in ('cprofile', 'pyinstrument'):
+        print(f"Unknown profiler {kind!r} in {PROFILE_ENV}, expected cprofile or pyinstrument")
+        return None
+    return kind
+
+@contextmanager
+def profile(run_name):
+    """Profile the enclosed code if LIFECYCLE_PROFILE selects this run"""
+    kind = profiler_for(run_name)
+    if kind == 'pyinstrument':
+        try:
+            import pyinstrument
+        except ImportError:
+            print("pyinstrument is not installed, using cProfile instead")
+            kind = 'cprofile'
+    if kind is None:
+        yield
+        return
+
+    output_dir = get_path('metrics')
+    os.makedirs(output_dir, exist_ok=True)
+    stem = os.path.join(output_dir, f"{run_name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
+
+    if kind == 'pyinstrument':
+        profiler = pyinstrument.Profiler()
+        profiler.start()
+        try:
+            yield
+        finally:
+            profiler.stop()
+            with open(stem + ".html", 'w', encoding='utf-8') as f:
+                f.write(profiler.output_html())
+            print(f"\nProfile saved to {stem}.html")
+        return
+
+    import cProfile
+    import pstats
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(stem + ".prof")
+        print(f"\nProfile saved to {stem}.prof (top functions by cumulative time):")
+        pstats.Stats(profiler).sort_stats('cumulative').print_stats(20)
+
+@contextmanager
+def run(name):
+    """
+    One run of an entry point: starts a fresh recorder and run id (inherited by
+    worker processes), profiles it if requested and prints the summary table at the end.
+    """
+    previous_run_id = os.environ.get(RUN_ID_ENV)
+    os.environ[RUN_ID_ENV] = f"{name}-{datetime.now().strftime('%Y%m%d_%H%M%S')}-{uuid.uuid4().hex[:6]}"
+    _recorder.reset(name)
+    try:
+        with profile(name), span(name):
+            yield _recorder
+    finally:
+        _recorder.print_summary(f"Timing summary for {name} (run {os.environ[RUN_ID_ENV]}, metrics in {metrics_path()})")
+        if previous_run_id is None:
+            os.environ.pop(RUN_ID_ENV, None)
+        else:
+            os.environ[RUN_ID_ENV] = previous_run_id
@@ -1,6 +1,7 @@
 import time
 import csv
 import os
+import sys
 import re
 from datetime import datetime
 from selenium import webdriver
@@ -12,6 +13,9 @@ from webdriver_manager.chrome import ChromeDriverManager
 from bs4 import BeautifulSoup
 import urllib.parse
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from config import get_path
+
 def setup_driver():
     """Set up and return a Chrome webdriver."""
     chrome_options = Options()
@@ -62,7 +66,7 @@ def google_search(driver, query):
 
 def get_output_directory():
     """Return the output directory for all files."""
-    output_dir = r"C:\Users\clint\Desktop\Lifecycle Code\data\pdf_links\individual"
+    output_dir = get_path('pdf_links', "individual")
     # Create the directory if it doesn't exist
     os.makedirs(output_dir, exist_ok=True)
     return output_dir
@@ -4,6 +4,10 @@ import re
 import csv
 from datetime import datetime
 import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from config import get_path
 
 def scrape_jdpower_guidelines():
     base_url = "https://www.jdpowervalues.com"
@@ -130,7 +134,7 @@ def scrape_jdpower_guidelines():
 
 def save_to_csv(data, filename="jdpower_commercial_truck_guidelines.csv"):
     # Set the output directory path
-    output_dir = r"C:\Users\clint\Desktop\Lifecycle Code\data\pdf_links\individual"
+    output_dir = get_path('pdf_links', "individual")
     
     # Create the directory if it doesn't exist
     os.makedirs(output_dir, exist_ok=True)
@@ -11,6 +11,10 @@ from datetime import datetime
 import time
 import traceback
 import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from config import get_path
 
 # Set up Chrome options
 chrome_options = Options()
@@ -22,7 +26,7 @@ chrome_options.add_argument("--disable-dev-shm-usage")
 driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=chrome_options)
 
 # Define the output directory and filename
-output_dir = r"C:\Users\clint\Desktop\Lifecycle Code\data\pdf_links\individual"
+output_dir = get_path('pdf_links', "individual")
 output_file = "official_website_links.csv"
 progress_file = "official_website_links_progress.csv"
 
@@ -0,0 +1,167 @@
+"""
+Registry of the charts the extractor pulls out of the Guidelines reports.
+
+A target names the phrases that mark its chart, how much of the page around the
+phrase to capture, the contour settings used to crop it and how its images are
+named. extract_pdf_content.extract_charts opens each PDF once, indexes its text
+once and extracts every selected target in the same pass, so adding a chart type
+only adds the rendering and cropping of that chart:
+
+    from chart_targets import ChartTarget, register
+
+    register(ChartTarget('days_to_turn', "days to turn", ["Average Days to Turn"]))
+
+Targets are selected with --targets on the command line or LIFECYCLE_CHART_TARGETS
+(comma-separated names, or 'all'); the default is the retail price chart only.
+
+The crops of every target share the extracted_images folder, so the later steps
+tell them apart by name: a target's digitized CSVs are named
+'<XX_YYYY>_<target>.csv' (plain '<XX_YYYY>.csv' for the retail price chart, the
+series combined_data.csv is built from) and combined per target.
+"""
+import os
+import re
+
+# Spans that refer to a chart in the running text rather than title it
+# ('See the "Average Auction Hammer Price..." graph')
+REFERENCE_MARKERS = ["see ", "“", "”", "graph"]
+
+class ChartTarget:
+    """
+    One chart type.
+
+    Parameters:
+        name (str): Identifier used on the command line and in report names
+        label (str): Lowercase description used in messages, e.g. "retail price"
+        indicators (list): Phrases (matched case-insensitively inside a text span) that mark the chart
+        ignore (list, optional): Spans containing any of these (lowercase) are not indicators
+        capture_above (float): Points captured above the indicator
+        capture_below (float): Points captured below the top of the indicator
+        zoom (float): Render zoom of the capture
+        fallback (bool): If no indicator span leads to a chart, capture whole pages whose text mentions an indicator
+        fallback_zoom (float): Render zoom of fallback captures
+        crop_params (dict, optional): Overrides of CROP_PARAMS for this chart
+        variant (str, optional): Image name part, '<pdf>_<variant>_cropped.png' (defaults to '<name>_plot')
+    """
+
+    def __init__(self, name, label, indicators, ignore=None, capture_above=20, capture_below=350, zoom=3.0,
+                 fallback=False, fallback_zoom=2.0, crop_params=None, variant=None):
+        self.name = name
+        self.label = label
+        self.indicators = list(indicators)
+        self.ignore = list(ignore or [])
+        self.capture_above = capture_above
+        self.capture_below = capture_below
+        self.zoom = zoom
+        self.fallback = fallback
+        self.fallback_zoom = fallback_zoom
+        self.crop_params = crop_params
+        self.variant = variant or f"{name}_plot"
+        self._lowered = [indicator.lower() for indicator in self.indicators]
+
+    def __repr__(self):
+        return f"ChartTarget({self.name!r})"
+
+    def matches(self, text):
+        """Whether a text span marks this chart"""
+        lowered = text.lower()
+        if not any(indicator in lowered for indicator in self._lowered):
+            return False
+        return not any(marker in lowered for marker in self.ignore)
+
+    def mentioned_in(self, lowered_page_text):
+        """Whether a page's (lowercased) text mentions an indicator anywhere (fallback check)"""
+        return any(indicator in lowered_page_text for indicator in self._lowered)
+
+    def capture_filename(self, pdf_name, suffix=""):
+        """Raw capture name, e.g. '01_2019_retail_price_plot_next_page.png' for suffix '_next_page'"""
+        return f"{pdf_name}_{self.variant}{suffix}.png"
+
+    def report_filename(self, pdf_name):
+        return f"{pdf_name}_{self.name}_report.html"
+
+# name -> ChartTarget, in the order they were registered (and are extracted)
+TARGETS = {}
+
+def register(target):
+    """Add (or replace) a chart type"""
+    TARGETS[target.name] = target
+    return target
+
+def select_targets(names=None):
+    """
+    Targets from a list or comma-separated string of names ('all' for every
+    registered target); defaults to LIFECYCLE_CHART_TARGETS, then the retail price chart.
+    """
+    if names is None:
+        names = os.environ.get("LIFECYCLE_CHART_TARGETS", "") or DEFAULT_TARGETS
+    if isinstance(names, str):
+        names = [name.strip() for name in names.split(",") if name.strip()]
+    if "all" in names:
+        return list(TARGETS.values())
+    unknown = [name for name in names if name not in TARGETS]
+    if unknown:
+        raise ValueError(f"Unknown chart targets: {', '.join(unknown)} (registered: {', '.join(TARGETS)})")
+    return [TARGETS[name] for name in names]
+
+# The chart the pipeline was built around. Every span containing the phrase counts,
+# and whole pages mentioning it are captured as a last resort.
+register(ChartTarget(
+    'retail_price', "retail price",
+    indicators=["Average Retail Selling Price", "Avg. Retail Selling Price"],
+    fallback=True,
+))
+
+# Other charts in the same reports, identified by their titles
+register(ChartTarget(
+    'auction_price', "auction price",
+    indicators=["Average Auction Hammer Price"],
+    ignore=REFERENCE_MARKERS,
+))
+register(ChartTarget(
+    'auction_volume', "auction volume",
+    indicators=["Volume of the Three Most Common Sleeper Tractors"],
+    ignore=REFERENCE_MARKERS,
+))
+register(ChartTarget(
+    'wholesale_price', "wholesale price",
+    indicators=["Average Wholesale Selling Price"],
+    ignore=REFERENCE_MARKERS,
+))
+register(ChartTarget(
+    'dealer_volume', "trucks retailed per dealership",
+    indicators=["Number of Trucks Retailed per Dealership Rooftop"],
+    ignore=REFERENCE_MARKERS,
+))
+register(ChartTarget(
+    'retail_forecast', "retail value forecast",
+    indicators=["Retail Value Forecast", "Retail Price History/Forecast"],
+    ignore=REFERENCE_MARKERS + ["our retail value forecast", "we"],
+))
+
+DEFAULT_TARGETS = "retail_price"
+
+# The chart combined_data.csv is built from; its CSVs keep the plain XX_YYYY.csv names
+SERIES_TARGET = 'retail_price'
+
+def target_of_image(image_name):
+    """The ChartTarget an extracted image ('04_2020_wholesale_price_plot_cropped.png') belongs to, or None"""
+    match = re.match(r'^\d+_\d+_(.+)$', os.path.splitext(os.path.basename(image_name))[0])
+    if match is None:
+        return None
+    # Longest variant first, in case one target's variant starts with another's
+    for target in sorted(TARGETS.values(), key=lambda target: len(target.variant), reverse=True):
+        if match.group(1).startswith(target.variant):
+            return target
+    return None
+
+def csv_basename(report, target_name):
+    """Name (without extension) of a report's digitized CSV of a target: '04_2020' or '04_2020_wholesale_price'"""
+    return report if target_name == SERIES_TARGET else f"{report}_{target_name}"
+
+def target_of_csv(csv_name):
+    """Name of the target a digitized CSV holds: '<XX_YYYY>_<target>[_N].csv', else SERIES_TARGET"""
+    match = re.match(r'^\d+_\d+_(.+?)(?:_\d+)?$', os.path.splitext(os.path.basename(csv_name))[0])
+    if match is not None and match.group(1) in TARGETS:
+        return match.group(1)
+    return SERIES_TARGET
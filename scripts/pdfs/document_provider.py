@@ -0,0 +1,170 @@
+"""
+Shared, memory-mapped PDF documents.
+
+fitz.open(path) reads a PDF through normal file I/O and parses its cross-reference
+table every time it is called. The provider maps the file instead (mmap, opened
+with fitz.open(stream=...)), so processes reading the same PDF share its pages in
+the OS page cache, and keeps the last few documents open in each process, so steps
+that use the same PDF (the extraction, the render cache's content hash, repeated
+extractions in one session) open and parse it once.
+
+    from document_provider import shared_provider
+
+    with shared_provider().document(pdf_path) as doc:
+        text = doc[0].get_text()
+
+Documents are shared, so don't close them yourself. Once more than
+LIFECYCLE_OPEN_DOCUMENTS (default 4) are open, the least recently used ones not
+in use are closed and their files unmapped. A document whose file has changed
+since it was opened is opened again.
+
+Stream-opened documents have an empty doc.name: pass the path along where it is needed.
+"""
+import os
+import mmap
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+import fitz  # PyMuPDF
+
+OPEN_DOCUMENTS = int(os.environ.get("LIFECYCLE_OPEN_DOCUMENTS", "4") or 4)
+
+class MappedDocument:
+    """An open document and the memory map it reads from"""
+
+    def __init__(self, path):
+        stat = os.stat(path)
+        self.path = path
+        self.version = (stat.st_size, stat.st_mtime_ns)
+        self.users = 0
+        self.stale = False
+        try:
+            with open(path, 'rb') as f:
+                self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            # Empty files and file systems without mmap: let MuPDF read the file
+            self.map = self.buffer = None
+            self.doc = fitz.open(path)
+            return
+        self.buffer = memoryview(self.map)
+        try:
+            self.doc = fitz.open(stream=self.buffer, filetype="pdf")
+        except Exception:
+            self.buffer.release()
+            self.map.close()
+            raise
+
+    def contents(self):
+        """The file's bytes (a view of the memory map)"""
+        if self.buffer is None:
+            with open(self.path, 'rb') as f:
+                return f.read()
+        return self.buffer
+
+    def close(self):
+        self.doc.close()
+        if self.map is not None:
+            # The document keeps a reference to the view, so release it before unmapping
+            self.buffer.release()
+            self.map.close()
+
+class DocumentProvider:
+    """
+    Per-process LRU of open, memory-mapped documents.
+
+    Parameters:
+        max_open (int, optional): Documents kept open when not in use (defaults to OPEN_DOCUMENTS)
+    """
+
+    def __init__(self, max_open=None):
+        self.max_open = max_open or OPEN_DOCUMENTS
+        self.documents = OrderedDict()  # absolute path -> MappedDocument
+        self.lock = threading.RLock()
+        self.opened = 0
+        self.reused = 0
+
+    def acquire(self, path, keep=True):
+        """
+        The open document of `path`, marked as in use until release() (prefer
+        document()). With keep=False it is closed once no one uses it.
+        """
+        key = os.path.abspath(path)
+        stat = os.stat(path)
+        with self.lock:
+            entry = self.documents.get(key)
+            if entry is not None and entry.version != (stat.st_size, stat.st_mtime_ns):
+                # The file changed since it was opened
+                del self.documents[key]
+                self._retire(entry)
+                entry = None
+            if entry is None:
+                entry = MappedDocument(path)
+                self.documents[key] = entry
+                self.opened += 1
+            else:
+                self.documents.move_to_end(key)
+                self.reused += 1
+            entry.users += 1
+            if not keep:
+                entry.stale = True
+            self._evict()
+        return entry
+
+    def release(self, entry):
+        with self.lock:
+            entry.users -= 1
+            if entry.stale and not entry.users:
+                if self.documents.get(os.path.abspath(entry.path)) is entry:
+                    del self.documents[os.path.abspath(entry.path)]
+                entry.close()
+            self._evict()
+
+    @contextmanager
+    def document(self, path, keep=True):
+        """Use the open document of `path` (see acquire)"""
+        entry = self.acquire(path, keep)
+        try:
+            yield entry.doc
+        finally:
+            self.release(entry)
+
+    @contextmanager
+    def contents(self, path):
+        """Use the bytes of `path` from its memory map (e.g. to hash them)"""
+        entry = self.acquire(path)
+        try:
+            yield entry.contents()
+        finally:
+            self.release(entry)
+
+    def _retire(self, entry):
+        """Close a document now, or when its last user releases it"""
+        if entry.users:
+            entry.stale = True
+        else:
+            entry.close()
+
+    def _evict(self):
+        """Close the least recently used documents not in use beyond max_open"""
+        for key, entry in list(self.documents.items()):
+            if len(self.documents) <= self.max_open:
+                break
+            if not entry.users:
+                del self.documents[key]
+                entry.close()
+
+    def close(self):
+        """Close every document (those in use once they are released)"""
+        with self.lock:
+            for entry in self.documents.values():
+                self._retire(entry)
+            self.documents.clear()
+
+_shared_provider = None
+
+def shared_provider():
+    """The document provider of this process"""
+    global _shared_provider
+    if _shared_provider is None:
+        _shared_provider = DocumentProvider()
+    return _shared_provider
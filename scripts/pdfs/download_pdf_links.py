@@ -2,6 +2,7 @@
 # Script to download PDF links from csv
 
 import os
+import sys
 import requests
 import pandas as pd
 from urllib.parse import urlparse
@@ -10,9 +11,13 @@ import time
 import csv
 from datetime import datetime
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import get_path
+import instrumentation
+
 def main():
     # Load your data - you need to specify your data source
-    file_path = r"C:\Users\clint\Desktop\Lifecycle Code\data\pdf_links\combined\combined_pdf_links.csv"
+    file_path = get_path('pdf_links', "combined", "combined_pdf_links.csv")
     try:
         data = pd.read_csv(file_path)
     except Exception as e:
@@ -20,9 +25,9 @@ def main():
         return
 
     # Define the output directory
-    output_dir = r"C:\Users\clint\Desktop\Lifecycle Code\data\raw_pdfs"
+    output_dir = get_path('raw_pdfs')
     # Create logs directory
-    logs_dir = r"C:\Users\clint\Desktop\Lifecycle Code\data\raw_pdfs\logs"
+    logs_dir = get_path('download_logs')
 
     # Create the directories if they don't exist
     os.makedirs(output_dir, exist_ok=True)
@@ -99,8 +104,10 @@ def main():
                 output_path = os.path.join(output_dir, filename)
                 counter += 1
             
-            # Download the PDF
-            success = download_pdf(url, output_path, non_pdf_log, error_log)
+            # Download the PDF (one timing record per link in the metrics JSONL)
+            with instrumentation.item(filename, 'download', url=url) as record:
+                success = download_pdf(url, output_path, non_pdf_log, error_log)
+                record['success'] = success
             if success:
                 downloaded_urls.add(url)
                 successful_downloads += 1
@@ -134,13 +141,15 @@ def main():
 def download_pdf(url, output_path, non_pdf_log, error_log, timeout=30):
     try:
         # Send a GET request to the URL with timeout
-        response = requests.get(url, stream=True, timeout=timeout, allow_redirects=True)
+        with instrumentation.span('request'):
+            response = requests.get(url, stream=True, timeout=timeout, allow_redirects=True)
         response.raise_for_status()  # Raise an exception for HTTP errors
         
         # Check if the content is a PDF
         content_type = response.headers.get('Content-Type', '')
         if 'application/pdf' not in content_type and not url.lower().endswith('.pdf'):
             print(f"Link is not a PDF: {url} (Content-Type: {content_type})")
+            instrumentation.count('non_pdf_links')
             # Log non-PDF link
             with open(non_pdf_log, 'a', newline='', encoding='utf-8') as f:
                 writer = csv.writer(f)
@@ -148,14 +157,17 @@ def download_pdf(url, output_path, non_pdf_log, error_log, timeout=30):
             return False
         
         # Write the content to a file
-        with open(output_path, 'wb') as f:
+        with instrumentation.span('stream_to_disk'), open(output_path, 'wb') as f:
             for chunk in response.iter_content(chunk_size=8192):
                 if chunk:
                     f.write(chunk)
+                    instrumentation.count('bytes_downloaded', len(chunk))
+        instrumentation.count('pdfs_downloaded')
         return True
     except requests.Timeout:
         error_msg = f"Timeout: Request took longer than {timeout} seconds"
         print(f"Timeout downloading {url}: {error_msg}")
+        instrumentation.count('errors')
         # Log error
         with open(error_log, 'a', newline='', encoding='utf-8') as f:
             writer = csv.writer(f)
@@ -163,6 +175,7 @@ def download_pdf(url, output_path, non_pdf_log, error_log, timeout=30):
         return False
     except Exception as e:
         print(f"Error downloading {url}: {e}")
+        instrumentation.count('errors')
         # Log error
         with open(error_log, 'a', newline='', encoding='utf-8') as f:
             writer = csv.writer(f)
@@ -170,4 +183,5 @@ def download_pdf(url, output_path, non_pdf_log, error_log, timeout=30):
         return False
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    with instrumentation.run('download'):
+        main()
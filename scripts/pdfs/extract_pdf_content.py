@@ -1,5 +1,6 @@
 import fitz  # PyMuPDF
 import os
+import sys
 import json
 import matplotlib.pyplot as plt
 import numpy as np
@@ -8,139 +9,732 @@ import cv2
 import shutil
 import re
 import csv
+import gc
+import base64
+import argparse
 from datetime import datetime
 
-def crop_to_plot_bounding_box(image_path, error_log_path=None):
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import get_path
+import instrumentation
+import image_store
+import image_writer
+from image_writer import ImageWriter, save_image, save_crop, draw_box
+import render_cache
+import tiled_render
+import document_provider
+import chart_targets
+
+# Captures are cropped in memory as soon as they are rendered and the images are
+# encoded and saved by background writer threads (see image_writer.py).
+# Streaming mode also keeps only one capture alive at a time and frees MuPDF's cache.
+# These settings can also be set per call or on the command line.
+STREAMING = os.environ.get("LIFECYCLE_STREAMING", "") == "1"
+# Keep every render in the render cache (see render_cache.py) and reuse cached renders
+RENDER_CACHE = render_cache.RENDER_CACHE
+# Also save the raw captures and the bounding box visualizations in the logs folder
+DEBUG_IMAGES = os.environ.get("LIFECYCLE_DEBUG_IMAGES", "") == "1"
+# Crops go into the packed image store (data/extracted_images/charts.pack); they are
+# also saved as loose PNGs unless this is off, in which case the HTML reports embed
+# the packed crops and Graph2Table and img_sorter export them first (image_store.export_missing)
+LOOSE_IMAGES = os.environ.get("LIFECYCLE_LOOSE_IMAGES", "1") != "0"
+# Per-process memory budget in MB for streaming mode (0 = no budget)
+MEMORY_BUDGET_MB = int(os.environ.get("LIFECYCLE_MEMORY_BUDGET_MB", "0") or 0)
+
+# Bytes held per captured pixel while a capture is cropped in memory:
+# RGB samples, grayscale copy and threshold mask, with some headroom
+BYTES_PER_CAPTURE_PIXEL = 6
+
+# Text that marks the Average Retail Selling Price chart (the other charts are in chart_targets.py)
+RETAIL_PRICE_INDICATORS = chart_targets.TARGETS['retail_price'].indicators
+
+def page_text_spans(page):
     """
-    Crop the image to the exact bounding box of the plot area using contour detection.
-    Additionally, save an image with the bounding box drawn for visualization.
+    The text spans of a page as (text, bbox) pairs in reading order, from a
+    single get_text("dict") call.
+    """
+    spans = []
+    # Leave images out of the dict: only text blocks are searched, and with images
+    # every embedded picture's bytes would be copied into it
+    flags = fitz.TEXTFLAGS_DICT & ~fitz.TEXT_PRESERVE_IMAGES
+    for block in page.get_text("dict", flags=flags)["blocks"]:
+        if block["type"] != 0:  # Not a text block
+            continue
+        for line in block.get("lines", []):
+            for span in line.get("spans", []):
+                spans.append((span.get("text", "").strip(), span["bbox"]))
+    return spans
 
-    Parameters:
-        image_path (str): Path to the image to be cropped.
-        error_log_path (str, optional): Path to save error logs
+def indicator_matches(spans, matches):
+    """
+    Spans accepted by `matches(text)` as dicts with 'text', 'rect' (span bbox)
+    and 'confidence', in reading order
+    """
+    return [
+        {'text': text, 'rect': rect, 'confidence': 10}  # High confidence for exact matches
+        for text, rect in spans if matches(text)
+    ]
+
+def find_retail_price_indicators(page, indicators=RETAIL_PRICE_INDICATORS):
+    """
+    Find the text spans on a page that contain one of the indicator phrases.
 
     Returns:
-        str: Path to the cropped image.
-        bool: Whether cropping was successful
+        list: dicts with 'text', 'rect' (span bbox) and 'confidence', in reading order
     """
-    # Open the image
-    image = Image.open(image_path)
-    img_cv = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
+    lowered = [indicator.lower() for indicator in indicators]
+    return indicator_matches(page_text_spans(page), lambda text: any(indicator in text.lower() for indicator in lowered))
+
+class DocumentText:
+    """
+    Text index of an open document, shared by every chart target extracted from
+    it: each page's text spans and plain text are extracted at most once.
+    """
+
+    def __init__(self, doc):
+        self.doc = doc
+        self.page_spans = {}
+        self.page_texts = {}
+
+    def spans(self, page_num):
+        if page_num not in self.page_spans:
+            with instrumentation.span('get_text'):
+                self.page_spans[page_num] = page_text_spans(self.doc[page_num])
+            instrumentation.count('pages_searched')
+        return self.page_spans[page_num]
 
-    # Convert to grayscale for processing
-    gray = cv2.cvtColor(img_cv, cv2.COLOR_BGR2GRAY)
+    def lowered_text(self, page_num):
+        """Plain text of a page in lowercase (used by the fallback search)"""
+        if page_num not in self.page_texts:
+            with instrumentation.span('get_text'):
+                self.page_texts[page_num] = self.doc[page_num].get_text().lower()
+        return self.page_texts[page_num]
+
+    def find(self, page_num, target):
+        """Indicator spans of `target` on a page, as find_retail_price_indicators returns them"""
+        return indicator_matches(self.spans(page_num), target.matches)
+
+# Contour detection settings; render_cache.py sweep evaluates alternatives over cached renders
+CROP_PARAMS = {
+    'threshold': 240,    # gray levels above this are background
+    'min_area': 0.02,    # contour area as a fraction of the capture
+    'max_area': 0.95,
+    'min_aspect': 0.1,   # width / height of the contour's bounding box
+    'max_aspect': 8,
+    # Above 1, detect on the binary image downscaled by this factor (find_plot_bbox_downscaled);
+    # faster on large captures, but shapes closer than a few pixels merge, so boxes can differ
+    'detection_scale': int(os.environ.get("LIFECYCLE_DETECTION_SCALE", "1") or 1),
+    'close_kernel': 3,   # closing applied to the downscaled image, in downscaled pixels (0 = none)
+}
+
+def find_plot_bbox(gray, params=None):
+    """
+    Find the plot in a grayscale capture: the largest external contour of the
+    non-white pixels that covers 2-95% of the image with an aspect ratio of 0.1-8
+    (or the limits in `params`, which override CROP_PARAMS).
+
+    Returns:
+        tuple: (x, y, w, h) of the plot, or None if no contour qualifies
+    """
+    params = CROP_PARAMS if params is None else {**CROP_PARAMS, **params}
+    if params['detection_scale'] > 1:
+        return find_plot_bbox_downscaled(gray, params)
 
     # Apply threshold to separate foreground from background
-    _, binary = cv2.threshold(gray, 240, 255, cv2.THRESH_BINARY_INV)
+    _, binary = cv2.threshold(gray, params['threshold'], 255, cv2.THRESH_BINARY_INV)
 
     # Find contours
     contours, _ = cv2.findContours(binary, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    del binary
 
-    # Sort contours by area (largest first)
-    contours = sorted(contours, key=cv2.contourArea, reverse=True)
+    # Filter every contour at once: area first, then the aspect ratio of the
+    # bounding boxes of the (few) contours left
+    total_area = gray.shape[0] * gray.shape[1]
+    areas = np.array([cv2.contourArea(contour) for contour in contours], dtype=np.float64)
+    candidates = np.flatnonzero((areas >= total_area * params['min_area']) & (areas <= total_area * params['max_area']))
+    if not len(candidates):
+        return None
+    boxes = np.array([cv2.boundingRect(contours[i]) for i in candidates])
+    aspect_ratios = boxes[:, 2] / boxes[:, 3]
+    keep = (aspect_ratios >= params['min_aspect']) & (aspect_ratios <= params['max_aspect'])
+    if not keep.any():
+        return None
 
-    # Get the filename from the path for error logging
+    # Largest qualifying contour (the first one found among equal areas)
+    best = np.flatnonzero(keep)[np.argmax(areas[candidates[keep]])]
+    return tuple(int(value) for value in boxes[best])
+
+def find_plot_bbox_downscaled(gray, params=None):
+    """
+    find_plot_bbox on a binary image downscaled by params['detection_scale']:
+    a downscaled pixel is foreground if any pixel of its block is, small gaps
+    are closed, and the connected components (with their holes filled, so a
+    component's area matches its outer contour's) are filtered in one batch with
+    cv2.connectedComponentsWithStats. The winning box is scaled back and
+    tightened to the foreground pixels of the full-resolution image.
+
+    Returns:
+        tuple: (x, y, w, h) of the plot, or None if no component qualifies
+    """
+    params = CROP_PARAMS if params is None else {**CROP_PARAMS, **params}
+    scale = params['detection_scale']
+    height, width = gray.shape
+
+    _, binary = cv2.threshold(gray, params['threshold'], 255, cv2.THRESH_BINARY_INV)
+    box = select_component(tiled_render.max_pool(binary, scale), height, width, scale, params)
+    if box is None:
+        return None
+    left, top, right, bottom = box
+    x, y, w, h = cv2.boundingRect(binary[top:bottom, left:right])
+    return int(left + x), int(top + y), w, h
+
+def select_component(small, height, width, scale, params):
+    """
+    The plot in a binary mask of a height x width capture downscaled by `scale`
+    (see find_plot_bbox_downscaled).
+
+    Returns:
+        tuple: (left, top, right, bottom) of the plot's blocks in the capture's
+            pixels, or None if no component qualifies
+    """
+    if params['close_kernel']:
+        kernel = np.ones((params['close_kernel'], params['close_kernel']), np.uint8)
+        small = cv2.morphologyEx(small, cv2.MORPH_CLOSE, kernel)
+
+    # Fill holes: everything the background reached from the border stays background
+    flooded = cv2.copyMakeBorder(small, 1, 1, 1, 1, cv2.BORDER_CONSTANT, value=0)
+    cv2.floodFill(flooded, None, (0, 0), 128)
+    filled = (flooded[1:-1, 1:-1] != 128).view(np.uint8)
+    del flooded
+
+    _, _, stats, _ = cv2.connectedComponentsWithStats(filled, connectivity=8)
+    stats = stats[1:]  # Label 0 is the background
+    areas = stats[:, cv2.CC_STAT_AREA] * float(scale * scale)
+    aspect_ratios = stats[:, cv2.CC_STAT_WIDTH] / stats[:, cv2.CC_STAT_HEIGHT]
+    total_area = height * width
+    keep = ((areas >= total_area * params['min_area']) & (areas <= total_area * params['max_area'])
+            & (aspect_ratios >= params['min_aspect']) & (aspect_ratios <= params['max_aspect']))
+    if not keep.any():
+        return None
+
+    left, top, w, h = (int(value) * scale for value in stats[np.flatnonzero(keep)[np.argmax(areas[keep])], :4])
+    return left, top, min(width, left + w), min(height, top + h)
+
+def log_crop_failure(image_path, error_log_path):
+    """Record in the error log that a capture was made but no plot contour was found in it"""
     filename = os.path.basename(image_path)
-    pdf_name = filename.replace("_retail_price_plot.png", "").replace("_retail_price_plot_fallback.png", "")
+    # Strip the '_<variant>.png' or '_<variant>_fallback.png' ending of the capture name
+    pdf_name = filename
+    for target in chart_targets.TARGETS.values():
+        pdf_name = pdf_name.replace(target.capture_filename("", ""), "").replace(target.capture_filename("", "_fallback"), "")
+    try:
+        with open(error_log_path, 'a', newline='') as csvfile:
+            writer = csv.DictWriter(csvfile, fieldnames=['pdf_name', 'pdf_path', 'timestamp', 'error', 'pages_checked', 'detected_keywords'])
+            writer.writerow({
+                'pdf_name': pdf_name,
+                'pdf_path': image_path,
+                'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                'error': 'Image identified but cropping failed - No suitable plot contour detected',
+                'pages_checked': 1,
+                'detected_keywords': 'Cropping failure'
+            })
+    except Exception as e:
+        print(f"Failed to log cropping error: {str(e)}")
 
-    # Process the largest contour that might be the chart
-    for contour in contours:
-        # Get the contour area
-        area = cv2.contourArea(contour)
+def crop_to_plot_bounding_box(image_path, error_log_path=None, debug_images=None):
+    """
+    Crop the image to the exact bounding box of the plot area using contour detection.
+    With debug images on, also save an image with the bounding box drawn for visualization.
 
-        # Skip if the area is too small or too large
-        total_area = img_cv.shape[0] * img_cv.shape[1]
-        if area < (total_area * 0.02) or area > (total_area * 0.95):
-            continue
+    Parameters:
+        image_path (str): Path to the image to be cropped.
+        error_log_path (str, optional): Path to save error logs
+        debug_images (bool, optional): Save the bounding box visualization (defaults to DEBUG_IMAGES)
 
-        # Get bounding rectangle
-        x, y, w, h = cv2.boundingRect(contour)
+    Returns:
+        str: Path to the cropped image.
+        bool: Whether cropping was successful
+    """
+    if debug_images is None:
+        debug_images = DEBUG_IMAGES
 
-        # Skip if aspect ratio is extreme
-        aspect_ratio = float(w) / h
-        if aspect_ratio < 0.1 or aspect_ratio > 8:
-            continue
+    # Open the image
+    with instrumentation.span('load_image'):
+        image = Image.open(image_path)
+        img_cv = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
+
+    with instrumentation.span('opencv'):
+        # Convert to grayscale for processing
+        gray = cv2.cvtColor(img_cv, cv2.COLOR_BGR2GRAY)
+
+        # Largest contour that might be the chart
+        bbox = find_plot_bbox(gray)
+
+    filename = os.path.basename(image_path)
+
+    if bbox is not None:
+        x, y, w, h = bbox
 
         # Crop the image to the bounding box
         cropped_image = image.crop((x, y, x + w, y + h))
 
         # Define the extracted images directory
-        extracted_images_dir = r"C:\Users\clint\Desktop\Lifecycle Code\data\extracted_images"
+        extracted_images_dir = get_path('extracted_images')
         os.makedirs(extracted_images_dir, exist_ok=True)
         
         # Save the cropped image to the extracted_images directory
-        cropped_image_path = os.path.join(extracted_images_dir, filename.replace(".png", "_cropped.png"))
-        cropped_image.save(cropped_image_path)
+        cropped_image_path = os.path.join(extracted_images_dir, crop_filename(filename))
+        with instrumentation.span('save_crop'):
+            save_crop(cropped_image_path, cropped_image, image_store.shared_store(),
+                      image_store.parse_crop_filename(cropped_image_path), LOOSE_IMAGES)
         print(f"Cropped image saved to {cropped_image_path}")
 
-        # Draw the bounding box on the original image for visualization
-        draw_image = image.copy()
-        draw = ImageDraw.Draw(draw_image)
-        draw.rectangle([x, y, x + w, y + h], outline="red", width=3)
+        if debug_images:
+            # Define the logs directory
+            logs_dir = get_path('extraction_logs')
+            os.makedirs(logs_dir, exist_ok=True)
 
-        # Define the logs directory
-        logs_dir = r"C:\Users\clint\Desktop\Lifecycle Code\data\extracted_images\logs"
-        os.makedirs(logs_dir, exist_ok=True)
-        
-        # Save the image with the bounding box to the logs directory
-        bbox_image_path = os.path.join(logs_dir, filename.replace(".png", "_bbox.png"))
-        draw_image.save(bbox_image_path)
-        print(f"Bounding box visualization saved to {bbox_image_path}")
+            with instrumentation.span('save_bbox'):
+                # Draw the bounding box on the original image for visualization
+                draw_image = image.copy()
+                draw = ImageDraw.Draw(draw_image)
+                draw.rectangle([x, y, x + w, y + h], outline="red", width=3)
+
+                # Save the image with the bounding box to the logs directory
+                bbox_image_path = image_writer.with_format(
+                    os.path.join(logs_dir, bbox_filename(filename)), image_writer.IMAGE_FORMAT)
+                save_image(bbox_image_path, draw_image, image_writer.IMAGE_FORMAT)
+            print(f"Bounding box visualization saved to {bbox_image_path}")
 
         return cropped_image_path, True
 
     print(f"No suitable plot detected in {image_path}. Skipping cropping.")
+    instrumentation.count('crop_failures')
     
     # Log the cropping failure if error_log_path is provided
     if error_log_path:
-        try:
-            with open(error_log_path, 'a', newline='') as csvfile:
-                writer = csv.DictWriter(csvfile, fieldnames=['pdf_name', 'pdf_path', 'timestamp', 'error', 'pages_checked', 'detected_keywords'])
-                writer.writerow({
-                    'pdf_name': pdf_name,
-                    'pdf_path': image_path,
-                    'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                    'error': 'Image identified but cropping failed - No suitable plot contour detected',
-                    'pages_checked': 1,
-                    'detected_keywords': 'Cropping failure'
-                })
-        except Exception as e:
-            print(f"Failed to log cropping error: {str(e)}")
+        log_crop_failure(image_path, error_log_path)
     
     return image_path, False
 
-def extract_retail_price_plots(pdf_path, output_dir=None, relaxed_detection=True, error_log_path=None):
+def crop_filename(capture_filename):
+    """File name of the crop made from a capture ('..._retail_price_plot.png' -> '..._retail_price_plot_cropped.png')"""
+    return os.path.splitext(capture_filename)[0] + "_cropped.png"
+
+def bbox_filename(capture_filename):
+    """File name of the bounding box visualization of a capture"""
+    stem, extension = os.path.splitext(capture_filename)
+    return stem + "_bbox" + extension
+
+def pixmap_array(pix):
+    """A height x width x 3 view of an RGB pixmap's samples; only valid while `pix` is referenced"""
+    return np.frombuffer(pix.samples_mv, dtype=np.uint8).reshape(pix.height, pix.width, pix.n)
+
+def crop_capture(rgb, image_path, writer, error_log_path=None, debug_images=False, owner=None, crop_params=None,
+                 bbox=None):
+    """
+    In-memory counterpart of crop_to_plot_bounding_box: find the plot in a
+    rendered capture without copying it and let `writer` save the crop in the
+    background. With debug images on, the writer also saves the raw capture and
+    the bounding box visualization (drawn into the capture once it has been
+    saved). File names and results are the same.
+
+    Parameters:
+        rgb (numpy.ndarray): RGB capture (a writable view, e.g. of a pixmap)
+        image_path (str): Where the raw capture is saved (in the logs directory)
+        writer (ImageWriter): Background writer for the images
+        error_log_path (str, optional): Path to save error logs
+        debug_images (bool): Save the raw capture and the bounding box visualization
+        owner (optional): Object owning the memory of `rgb` (the pixmap), kept alive
+            until the images are saved
+        crop_params (dict, optional): Overrides of CROP_PARAMS (the chart target's)
+        bbox (tuple, optional): The plot's (x, y, w, h) in `rgb` if already known (skips the detection)
+
+    Returns:
+        str: Path to the cropped image.
+        bool: Whether cropping was successful
+    """
+    filename = os.path.basename(image_path)
+    capture_path = writer.debug_path(image_path)
+
+    if bbox is None:
+        with instrumentation.span('opencv'):
+            gray = cv2.cvtColor(rgb, cv2.COLOR_RGB2GRAY)
+            bbox = find_plot_bbox(gray, crop_params)
+            del gray
+
+    if bbox is None:
+        if debug_images:
+            # The task holds on to the owner so the view stays valid until it is saved
+            def save_capture(owner=owner):
+                with instrumentation.span('save_capture'):
+                    writer.write(capture_path, rgb, debug=True)
+            writer.submit(save_capture, rgb.nbytes, capture_path)
+        print(f"No suitable plot detected in {image_path}. Skipping cropping.")
+        instrumentation.count('crop_failures')
+        if error_log_path:
+            log_crop_failure(image_path, error_log_path)
+        return image_path, False
+
+    x, y, w, h = bbox
+    extracted_images_dir = get_path('extracted_images')
+    os.makedirs(extracted_images_dir, exist_ok=True)
+    cropped_image_path = os.path.join(extracted_images_dir, crop_filename(filename))
+    # Key of the crop in the packed image store
+    key = image_store.parse_crop_filename(cropped_image_path)
+
+    if not debug_images:
+        # Only the crop is needed, so copy it out and let the pixmap go straight away
+        crop = rgb[y:y + h, x:x + w].copy()
+
+        def save_crop():
+            with instrumentation.span('save_crop'):
+                writer.write_crop(cropped_image_path, crop, key)
+        writer.submit(save_crop, crop.nbytes, cropped_image_path)
+        print(f"Cropped image queued for {cropped_image_path}")
+        return cropped_image_path, True
+
+    bbox_image_path = writer.debug_path(os.path.join(get_path('extraction_logs'), bbox_filename(filename)))
+
+    def save_images(owner=owner):
+        with instrumentation.span('save_crop'):
+            writer.write_crop(cropped_image_path, rgb[y:y + h, x:x + w], key)
+        with instrumentation.span('save_capture'):
+            writer.write(capture_path, rgb, debug=True)
+        with instrumentation.span('save_bbox'):
+            draw_box(rgb, bbox)
+            writer.write(bbox_image_path, rgb, debug=True)
+
+    # Described by the crop's path, so a failure is traced back to the plot (see drop_unsaved_plots)
+    writer.submit(save_images, rgb.nbytes, cropped_image_path)
+    print(f"Cropped image queued for {cropped_image_path}")
+    return cropped_image_path, True
+
+def fit_zoom(rect, zoom, memory_budget_mb):
+    """The largest zoom (at most `zoom`) whose capture of `rect` fits in half the memory budget"""
+    if not memory_budget_mb:
+        return zoom
+    limit = memory_budget_mb * 2 ** 20 / 2
+    needed = rect.width * rect.height * zoom ** 2 * BYTES_PER_CAPTURE_PIXEL
+    if needed <= limit:
+        return zoom
+    reduced = zoom * (limit / needed) ** 0.5
+    print(f"Capture at zoom {zoom} would exceed the {memory_budget_mb} MB budget, rendering at zoom {reduced:.2f}")
+    instrumentation.count('zoom_reduced')
+    return reduced
+
+def enforce_memory_budget(memory_budget_mb):
+    """Between captures: if the process is over its budget, empty MuPDF's cache and collect garbage"""
+    if not memory_budget_mb:
+        return
+    rss = instrumentation.current_rss_mb()
+    if rss is not None and rss > memory_budget_mb:
+        fitz.TOOLS.store_shrink(100)
+        gc.collect()
+        instrumentation.count('budget_shrinks')
+        print(f"RSS {rss:.0f} MB is over the {memory_budget_mb} MB budget, released cached resources "
+              f"(now {instrumentation.current_rss_mb():.0f} MB)")
+
+def capture_and_crop(page, zoom, clip, plot_img_path, writer, error_log_path=None, streaming=False,
+                     memory_budget_mb=0, debug_images=False, renders=None, crop_params=None):
+    """
+    Render `clip` of `page` (the whole page if None) at `zoom`, crop the capture
+    to the plot in memory and queue the images on `writer`. The raw capture is
+    saved as `plot_img_path` only with debug images on.
+
+    In streaming mode the zoom is lowered to fit the memory budget and MuPDF's
+    cache is emptied after every render. With `renders` (the render cache of the
+    PDF), a cached render is used instead of rendering, and new renders are cached.
+    `crop_params` are passed on to find_plot_bbox. Captures too large to render
+    at once (or to fit the memory budget) are rendered in tiles by capture_tiled,
+    without the render cache.
+
+    Returns:
+        str: Path to the cropped image.
+        bool: Whether cropping was successful
+    """
+    if streaming:
+        enforce_memory_budget(memory_budget_mb)
+    irect = tiled_render.capture_irect(page, zoom, clip)
+    if tiled_render.needs_tiling(irect, BYTES_PER_CAPTURE_PIXEL, memory_budget_mb if streaming else 0):
+        return capture_tiled(page, zoom, clip, plot_img_path, writer, error_log_path, debug_images, crop_params)
+    if streaming:
+        zoom = fit_zoom(clip if clip is not None else page.rect, zoom, memory_budget_mb)
+    rgb = None
+    if renders is not None:
+        with instrumentation.span('render_cache_get'):
+            rgb = renders.get(page.number, zoom, clip)
+        instrumentation.count('render_cache_hits' if rgb is not None else 'render_cache_misses')
+    if rgb is not None:
+        with instrumentation.span('crop'):
+            return crop_capture(rgb, plot_img_path, writer, error_log_path, debug_images, owner=rgb, crop_params=crop_params)
+
+    with instrumentation.span('get_pixmap'):
+        pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), clip=clip)
+        if streaming:
+            # Pages are rendered once, so don't keep their decoded images in MuPDF's cache
+            fitz.TOOLS.store_shrink(100)
+    rgb = pixmap_array(pix)
+    if renders is not None:
+        with instrumentation.span('render_cache_put'):
+            renders.put(page.number, zoom, clip, rgb, capture=os.path.basename(plot_img_path))
+    with instrumentation.span('crop'):
+        return crop_capture(rgb, plot_img_path, writer, error_log_path, debug_images, owner=pix, crop_params=crop_params)
+
+def capture_tiled(page, zoom, clip, plot_img_path, writer, error_log_path=None, debug_images=False,
+                  crop_params=None):
+    """
+    capture_and_crop for captures too large to render in one piece (see
+    tiled_render.py): the plot is detected on a downscaled mask built tile by
+    tile, as find_plot_bbox_downscaled would on the whole capture, and only the
+    plot's region is rendered at full resolution and cropped. With debug images
+    on, that region is saved in place of the raw capture.
+
+    Returns:
+        str: Path to the cropped image.
+        bool: Whether cropping was successful
+    """
+    params = CROP_PARAMS if crop_params is None else {**CROP_PARAMS, **crop_params}
+    irect = tiled_render.capture_irect(page, zoom, clip)
+    scale = tiled_render.mask_scale(irect.width, irect.height, params['detection_scale'])
+    print(f"Rendering {irect.width}x{irect.height} capture in tiles (mask downscaled {scale}x)")
+    instrumentation.count('tiled_captures')
+
+    with instrumentation.span('render_tiles'):
+        mask = tiled_render.pooled_mask(page, zoom, irect, clip, params['threshold'], scale)
+    with instrumentation.span('opencv'):
+        box = select_component(mask, irect.height, irect.width, scale, params)
+        del mask
+
+    if box is None:
+        print(f"No suitable plot detected in {plot_img_path}. Skipping cropping.")
+        instrumentation.count('crop_failures')
+        if error_log_path:
+            log_crop_failure(plot_img_path, error_log_path)
+        return plot_img_path, False
+
+    with instrumentation.span('get_pixmap'):
+        pix, rgb = tiled_render.render_region(page, zoom, irect, box, clip)
+    with instrumentation.span('opencv'):
+        # Tighten the box to the foreground pixels of the region
+        _, binary = cv2.threshold(cv2.cvtColor(rgb, cv2.COLOR_RGB2GRAY), params['threshold'], 255,
+                                  cv2.THRESH_BINARY_INV)
+        bbox = cv2.boundingRect(binary)
+        del binary
+    with instrumentation.span('crop'):
+        return crop_capture(rgb, plot_img_path, writer, error_log_path, debug_images, owner=pix, bbox=bbox)
+
+def extract_charts(pdf_path, targets=None, output_dir=None, error_log_path=None, streaming=None,
+                   memory_budget_mb=None, debug_images=None, loose_images=None, use_render_cache=None):
+    """
+    Extract every chart target from a PDF in one pass: the PDF is opened and
+    its text indexed once, then each target is searched and captured.
+
+    Parameters:
+        pdf_path (str): Path to the PDF file
+        targets (list, optional): ChartTargets or their names (defaults to chart_targets.select_targets())
+        output_dir (str, optional): Output directory for extracted plots
+        error_log_path (str, optional): Path to save error logs
+        streaming (bool, optional): Keep one capture alive at a time and free MuPDF's
+            cache after every render (defaults to STREAMING)
+        memory_budget_mb (int, optional): Memory budget of this process in streaming
+            mode, 0 for none (defaults to MEMORY_BUDGET_MB)
+        debug_images (bool, optional): Also save the raw captures and bounding box
+            visualizations in the logs folder (defaults to DEBUG_IMAGES)
+        loose_images (bool, optional): Save the crops as loose PNGs as well as into
+            the packed image store (defaults to LOOSE_IMAGES)
+        use_render_cache (bool, optional): Reuse and fill the render cache (defaults to RENDER_CACHE)
+
+    Returns:
+        dict: target name -> (results, found_plot), in the order of the targets.
+            Plots whose image couldn't be saved are left out (see drop_unsaved_plots).
+    """
+    if targets is None or all(isinstance(target, str) for target in targets):
+        targets = chart_targets.select_targets(targets)
+    if streaming is None:
+        streaming = STREAMING
+    if memory_budget_mb is None:
+        memory_budget_mb = MEMORY_BUDGET_MB if streaming else 0
+    if debug_images is None:
+        debug_images = DEBUG_IMAGES
+    if loose_images is None:
+        loose_images = LOOSE_IMAGES
+    if use_render_cache is None:
+        use_render_cache = RENDER_CACHE
+
+    store = image_store.shared_store()
+    if streaming and memory_budget_mb:
+        # Images waiting to be saved may take a quarter of the budget
+        writer = ImageWriter(memory_budget_mb * 2 ** 20 // 4, store=store, loose_crops=loose_images)
+    else:
+        writer = ImageWriter(store=store, loose_crops=loose_images)
+
+    # One timing record per PDF in the metrics JSONL, with the peak RSS while it was processed
+    pdf_name = os.path.basename(pdf_path).replace(".pdf", "")
+    instrumentation.reset_peak_rss()
+    with instrumentation.item(pdf_name, 'extract_pdf', pdf_path=pdf_path, streaming=streaming,
+                              targets=[target.name for target in targets]) as record:
+        try:
+            charts = _extract_charts(
+                pdf_path, targets, output_dir, error_log_path, writer, streaming, memory_budget_mb, debug_images,
+                render_cache.shared_cache().for_pdf(pdf_path) if use_render_cache else None)
+        finally:
+            with instrumentation.span('flush_images'):
+                writer.close()
+                store.save_index()
+        # Plots whose crop couldn't be saved are not found, as when saving was synchronous
+        unsaved = drop_unsaved_plots(charts, targets, writer.errors, pdf_path, error_log_path)
+        with instrumentation.span('html_report'):
+            write_reports(charts, targets)
+        if unsaved:
+            record['status'] = 'error'
+            record['unsaved_images'] = len(unsaved)
+        record['pages'] = next(iter(charts.values()))[0]['total_pages'] if charts else None
+        record['found_plot'] = any(found_plot for _, found_plot in charts.values())
+        record['charts'] = {name: len(results['plots_found']) for name, (results, _) in charts.items()}
+        record['peak_rss_mb'] = instrumentation.peak_rss_mb()
+    instrumentation.count('pdfs')
+    if streaming and record['peak_rss_mb'] is not None:
+        print(f"Peak RSS while processing {pdf_name}: {record['peak_rss_mb']:.0f} MB")
+    return charts
+
+def log_save_failure(pdf_path, image_path, message, error_log_path):
+    """Record in the error log that a plot was found but its cropped image could not be saved"""
+    try:
+        with open(error_log_path, 'a', newline='') as csvfile:
+            writer = csv.DictWriter(csvfile, fieldnames=['pdf_name', 'pdf_path', 'timestamp', 'error', 'pages_checked', 'detected_keywords'])
+            writer.writerow({
+                'pdf_name': os.path.basename(pdf_path).replace(".pdf", ""),
+                'pdf_path': pdf_path,
+                'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                'error': f'Plot found but saving {os.path.basename(image_path)} failed: {message}',
+                'pages_checked': 1,
+                'detected_keywords': 'Saving failure'
+            })
+    except Exception as e:
+        print(f"Error logging save failure: {str(e)}")
+
+def drop_unsaved_plots(charts, targets, errors, pdf_path, error_log_path=None):
+    """
+    Remove the plots whose cropped image the writer failed to save from the
+    results of extract_charts and log them. A target left without plots is not found. The removed plots are listed in
+    the target's results under "save_errors".
+
+    Parameters:
+        charts (dict): target name -> (results, found_plot), updated in place
+        targets (list): The extracted ChartTargets
+        errors (list): The writer's (description, message) of failed tasks
+        pdf_path (str): Path to the PDF file
+        error_log_path (str, optional): Path to save error logs
+
+    Returns:
+        list: (cropped image path, message) of every removed plot
+    """
+    failed = dict(errors)
+    unsaved = []
+    for target in targets:
+        if target.name not in charts:
+            continue
+        results, _ = charts[target.name]
+        lost = [plot for plot in results['plots_found'] if plot['image_path'] in failed]
+        if not lost:
+            continue
+        results['plots_found'] = [plot for plot in results['plots_found'] if plot['image_path'] not in failed]
+        results['save_errors'] = [(plot['image_path'], failed[plot['image_path']]) for plot in lost]
+        charts[target.name] = (results, bool(results['plots_found']))
+        unsaved += results['save_errors']
+        print(f"WARNING: {len(lost)} {target.label} plots of {results['pdf_name']} could not be saved")
+        if error_log_path:
+            for image_path, message in results['save_errors']:
+                log_save_failure(pdf_path, image_path, message, error_log_path)
+    return unsaved
+
+def write_reports(charts, targets):
+    """
+    Write the HTML report of every target with plots, once their crops are saved
+    (crops that are only in the packed image store are embedded in the report).
+    A target whose plots all failed to save loses the report of an earlier run.
+    """
+    logs_dir = get_path('extraction_logs')
+    for target in targets:
+        if target.name not in charts:
+            continue
+        results, _ = charts[target.name]
+        html_path = os.path.join(logs_dir, target.report_filename(results['pdf_name']))
+        if results['plots_found']:
+            generate_html_report(results, html_path, f"{target.label.title()} Chart")
+            print(f"HTML report saved to {html_path}")
+        elif results.get('save_errors') and os.path.exists(html_path):
+            os.remove(html_path)
+
+def extract_retail_price_plots(pdf_path, output_dir=None, relaxed_detection=True, error_log_path=None,
+                               streaming=None, memory_budget_mb=None, debug_images=None, loose_images=None,
+                               use_render_cache=None):
     """
     Extract retail price charts from a PDF specifically focusing on 
-    Average Retail Selling Price plots.
+    Average Retail Selling Price plots (extract_charts with the retail price target only).
 
     Parameters:
         pdf_path (str): Path to the PDF file
         output_dir (str, optional): Output directory for extracted plots
         relaxed_detection (bool): If True, use relaxed criteria for finding charts
         error_log_path (str, optional): Path to save error logs
+        streaming, memory_budget_mb, debug_images, loose_images, use_render_cache: see extract_charts
+
+    Returns:
+        dict: Extraction results
+        bool: Whether a chart was found
     """
+    charts = extract_charts(pdf_path, [chart_targets.TARGETS['retail_price']], output_dir, error_log_path,
+                            streaming, memory_budget_mb, debug_images, loose_images, use_render_cache)
+    return charts['retail_price']
+
+def _extract_charts(pdf_path, targets, output_dir, error_log_path, writer, streaming=False, memory_budget_mb=0,
+                    debug_images=False, renders=None):
     if output_dir is None:
-        output_dir = r"C:\Users\clint\Desktop\Lifecycle Code\data\extracted_images"
+        output_dir = get_path('extracted_images')
 
     os.makedirs(output_dir, exist_ok=True)
     print(f"Creating output directory: {output_dir}")
 
-    doc = fitz.open(pdf_path)
+    # The document is memory-mapped and shared with other users of the PDF in this
+    # process (see document_provider.py); streaming mode doesn't keep it open afterwards
+    provider = document_provider.shared_provider()
+    with instrumentation.span('open'):
+        document = provider.acquire(pdf_path, keep=not streaming)
+    doc = document.doc
     pdf_name = os.path.basename(pdf_path).replace(".pdf", "")
+    text = DocumentText(doc)
+
+    # Define logs directory
+    logs_dir = get_path('extraction_logs')
+    os.makedirs(logs_dir, exist_ok=True)
+
+    charts = {}
+    try:
+        for target in targets:
+            def capture(page, zoom, clip, plot_img_path):
+                return capture_and_crop(page, zoom, clip, plot_img_path, writer, error_log_path, streaming,
+                                        memory_budget_mb, debug_images, renders, target.crop_params)
+
+            charts[target.name] = _extract_target(doc, text, target, pdf_path, pdf_name, output_dir, logs_dir,
+                                                  error_log_path, capture, memory_budget_mb, debug_images, writer)
+    finally:
+        provider.release(document)
+    return charts
+
+def _extract_target(doc, text, target, pdf_path, pdf_name, output_dir, logs_dir, error_log_path, capture,
+                    memory_budget_mb=0, debug_images=False, writer=None):
+    """Find and capture one chart target in an open document; returns (results, found_plot)"""
+    label = target.label
 
     # Dictionary to store results
     retail_price_results = {
         "pdf_name": pdf_name,
         "total_pages": doc.page_count,
-        "plots_found": []
+        "plots_found": [],
+        "target": target.name
     }
-    
-    # Focus specifically on retail price indicators
-    retail_price_indicators = [
-        "Average Retail Selling Price",
-        "Avg. Retail Selling Price", 
-    ]
 
     # Track if we've found a plot in this PDF
     found_plot = False
@@ -148,52 +742,33 @@ def extract_retail_price_plots(pdf_path, output_dir=None, relaxed_detection=True
         "pdf_name": pdf_name,
         "pdf_path": pdf_path,
         "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-        "error": "No retail price chart found",
+        "error": f"No {label} chart found",
         "pages_checked": doc.page_count,
         "detected_keywords": []
     }
 
-    # Define logs directory
-    logs_dir = r"C:\Users\clint\Desktop\Lifecycle Code\data\extracted_images\logs"
-    os.makedirs(logs_dir, exist_ok=True)
-
     page_num = 0
     while page_num < doc.page_count and not found_plot:
         page = doc[page_num]
         page_index = page_num + 1
-        print(f"\nAnalyzing page {page_index} for Retail Selling Price charts...")
-        
-        # Look for retail price indicators in text blocks
-        text_dict = page.get_text("dict")
-        text_blocks = text_dict["blocks"]
-        price_related_text = []
+        print(f"\nAnalyzing page {page_index} for {label} charts...")
+        enforce_memory_budget(memory_budget_mb)
         
-        # First pass - find retail price text indicators
-        for block in text_blocks:
-            if block["type"] == 0:  # Text block
-                for line in block.get("lines", []):
-                    for span in line.get("spans", []):
-                        text = span.get("text", "").strip()
-                        
-                        # Check if the text matches any of our retail price indicators
-                        if any(indicator.lower() in text.lower() for indicator in retail_price_indicators):
-                            price_related_text.append({
-                                'text': text,
-                                'rect': span["bbox"],
-                                'confidence': 10  # High confidence for exact matches
-                            })
-                            print(f"Found indicator: '{text}' on page {page_index}")
-                            
-                            # Add to error details in case we can't find a full chart
-                            if text not in error_details["detected_keywords"]:
-                                error_details["detected_keywords"].append(text)
+        # First pass - find the target's text indicators in the text spans
+        price_related_text = text.find(page_num, target)
+        for indicator in price_related_text:
+            indicator_text = indicator['text']
+            print(f"Found indicator: '{indicator_text}' on page {page_index}")
 
-        # If we found retail price indicators, extract the chart
+            # Add to error details in case we can't find a full chart
+            if indicator_text not in error_details["detected_keywords"]:
+                error_details["detected_keywords"].append(indicator_text)
+
+        # If we found indicators, extract the chart
         if price_related_text:
             try:
                 # Convert plot area to pixels
-                zoom = 3.0  # High resolution
-                mat = fitz.Matrix(zoom, zoom)
+                zoom = target.zoom
                 
                 # Find the most relevant text indicator
                 main_indicator = price_related_text[0]
@@ -208,21 +783,17 @@ def extract_retail_price_plots(pdf_path, output_dir=None, relaxed_detection=True
                 # Create a capture rectangle extending below the text to capture the chart
                 capture_rect = fitz.Rect(
                     0,  # Start from left edge of page
-                    max(0, text_rect.y0 - 20),  # Extend slightly above the text
+                    max(0, text_rect.y0 - target.capture_above),  # Extend slightly above the text
                     page.rect.width,  # Full page width
-                    min(page.rect.height, text_rect.y0 + 350)  # Extend below the text
+                    min(page.rect.height, text_rect.y0 + target.capture_below)  # Extend below the text
                 )
                 
-                # Extract that specific area
-                pix = page.get_pixmap(matrix=mat, clip=capture_rect)
-
-                # Save the image to the logs directory
-                plot_img_path = os.path.join(logs_dir, f"{pdf_name}_retail_price_plot.png")
-                pix.save(plot_img_path)
-                print(f"Saved Retail Selling Price chart to {plot_img_path}")
-
-                # Crop the image to the plot bounding box
-                cropped_img_path, success = crop_to_plot_bounding_box(plot_img_path, error_log_path)
+                # Extract that specific area, save it to the logs directory
+                # and crop the image to the plot bounding box
+                plot_img_path = os.path.join(logs_dir, target.capture_filename(pdf_name))
+                cropped_img_path, success = capture(page, zoom, capture_rect, plot_img_path)
+                if debug_images:
+                    print(f"Saved {label} chart to {writer.debug_path(plot_img_path)}")
 
                 if success:
                     # Record results
@@ -246,24 +817,20 @@ def extract_retail_price_plots(pdf_path, output_dir=None, relaxed_detection=True
                         next_page_index = page_num + 1
                         print(f"Checking page {next_page_index} for charts...")
                         
-                        # Capture the entire next page
-                        next_pix = next_page.get_pixmap(matrix=mat)
-                        next_plot_img_path = os.path.join(logs_dir, f"{pdf_name}_retail_price_plot_next_page.png")
-                        next_pix.save(next_plot_img_path)
-                        
-                        # Try to crop this next page
-                        next_cropped_img_path, next_success = crop_to_plot_bounding_box(next_plot_img_path, error_log_path)
+                        # Capture the entire next page and try to crop it
+                        next_plot_img_path = os.path.join(logs_dir, target.capture_filename(pdf_name, "_next_page"))
+                        next_cropped_img_path, next_success = capture(next_page, zoom, None, next_plot_img_path)
                         
                         if next_success:
                             retail_price_results["plots_found"].append({
                                 "page": next_page_index,
                                 "image_path": next_cropped_img_path,
-                                "indicator_text": "Next page after retail price title"
+                                "indicator_text": f"Next page after {label} title"
                             })
                             found_plot = True
-                            print(f"Found retail price chart on next page (page {next_page_index})!")
+                            print(f"Found {label} chart on next page (page {next_page_index})!")
                         else:
-                            print(f"No retail price chart found on next page either.")
+                            print(f"No {label} chart found on next page either.")
                 
             except Exception as e:
                 error_msg = f"Error extracting plot: {str(e)}"
@@ -273,32 +840,28 @@ def extract_retail_price_plots(pdf_path, output_dir=None, relaxed_detection=True
         # Move to the next page if we haven't found a plot yet
         if not found_plot:
             page_num += 1
-            print(f"Page {page_index}: No Retail Selling Price chart detected")
+            print(f"Page {page_index}: No {label} chart detected")
 
-    # If we couldn't find any retail price plot, try harder with fallback method
-    if not found_plot:
-        # Try a fallback method - get any page with text mentions of price
+    # If we couldn't find the plot, try harder with fallback method
+    if not found_plot and target.fallback:
+        # Try a fallback method - get any page with text mentions of the indicators
         for page_num, page in enumerate(doc):
             page_index = page_num + 1
             
-            # Look for price-related text in the page
-            text = page.get_text().lower()
-            if any(indicator.lower() in text for indicator in retail_price_indicators):
+            # Look for the indicators in the page text
+            if target.mentioned_in(text.lowered_text(page_num)):
                 try:
-                    print(f"Fallback: Found price-related text on page {page_index}, capturing entire page")
+                    print(f"Fallback: Found {label} text on page {page_index}, capturing entire page")
+                    instrumentation.count('fallback_captures')
                     
                     # Capture the entire page as a last resort
-                    zoom = 2.0  # Still decent resolution
-                    mat = fitz.Matrix(zoom, zoom)
-                    pix = page.get_pixmap(matrix=mat)
-                    
-                    # Save the image to the logs directory
-                    plot_img_path = os.path.join(logs_dir, f"{pdf_name}_retail_price_plot_fallback.png")
-                    pix.save(plot_img_path)
-                    print(f"Saved fallback capture to {plot_img_path}")
+                    zoom = target.fallback_zoom
                     
-                    # Run the bounding box detection on this image too
-                    cropped_img_path, success = crop_to_plot_bounding_box(plot_img_path, error_log_path)
+                    # Save the image to the logs directory and run the bounding box detection on it too
+                    plot_img_path = os.path.join(logs_dir, target.capture_filename(pdf_name, "_fallback"))
+                    cropped_img_path, success = capture(page, zoom, None, plot_img_path)
+                    if debug_images:
+                        print(f"Saved fallback capture to {writer.debug_path(plot_img_path)}")
                     
                     if success:
                         # Record results
@@ -322,23 +885,20 @@ def extract_retail_price_plots(pdf_path, output_dir=None, relaxed_detection=True
                             next_page_index = page_num + 2
                             print(f"Checking page {next_page_index} for charts...")
                             
-                            # Capture the entire next page
-                            next_pix = next_page.get_pixmap(matrix=mat)
-                            next_plot_img_path = os.path.join(logs_dir, f"{pdf_name}_retail_price_plot_fallback_next_page.png")
-                            next_pix.save(next_plot_img_path)
-                            
-                            # Try to crop this next page
-                            next_cropped_img_path, next_success = crop_to_plot_bounding_box(next_plot_img_path, error_log_path)
+                            # Capture the entire next page and try to crop it
+                            next_plot_img_path = os.path.join(
+                                logs_dir, target.capture_filename(pdf_name, "_fallback_next_page"))
+                            next_cropped_img_path, next_success = capture(next_page, zoom, None, next_plot_img_path)
                             
                             if next_success:
                                 retail_price_results["plots_found"].append({
                                     "page": next_page_index,
                                     "image_path": next_cropped_img_path,
-                                    "indicator_text": "Next page after fallback retail price mention",
+                                    "indicator_text": f"Next page after fallback {label} mention",
                                     "is_fallback": True
                                 })
                                 found_plot = True
-                                print(f"Found retail price chart on next page after fallback (page {next_page_index})!")
+                                print(f"Found {label} chart on next page after fallback (page {next_page_index})!")
                                 break
                 except Exception as e:
                     error_msg = f"Error in fallback capture: {str(e)}"
@@ -367,25 +927,40 @@ def extract_retail_price_plots(pdf_path, output_dir=None, relaxed_detection=True
         print(f"Error details logged to {error_log_path}")
 
     if not retail_price_results["plots_found"]:
-        print(f"\nWARNING: No Retail Selling Price charts found in {pdf_name}.")
+        print(f"\nWARNING: No {label} charts found in {pdf_name}.")
     else:
-        # Generate HTML report and save to logs directory
-        html_path = os.path.join(logs_dir, f"{pdf_name}_retail_price_report.html")
-        generate_html_report(retail_price_results, html_path)
-        print(f"\nAnalysis complete! Found {len(retail_price_results['plots_found'])} retail price plots.")
+        # The HTML report is written by extract_charts once the crops are saved
+        instrumentation.count('charts_found', len(retail_price_results["plots_found"]))
+        print(f"\nAnalysis complete! Found {len(retail_price_results['plots_found'])} {label} plots.")
         print(f"Results saved to {output_dir}")
-        print(f"HTML report saved to {html_path}")
 
-    doc.close()
     return retail_price_results, found_plot
 
-def generate_html_report(results, html_path):
-    """Generate an HTML report for the retail price plots"""
+def crop_available(image_path):
+    """Whether a crop exists as a loose file or in the packed image store"""
+    if os.path.exists(image_path):
+        return True
+    return image_store.shared_store().find(os.path.basename(image_path)) is not None
+
+def image_src(image_path, html_dir):
+    """
+    <img> source for a crop in a report saved in html_dir: the loose file's relative
+    path, or the packed image as a data: URI when there is no loose file.
+    """
+    if not os.path.exists(image_path):
+        key = image_store.shared_store().find(os.path.basename(image_path))
+        if key is not None:
+            data = base64.b64encode(image_store.shared_store().get_bytes(*key)).decode('ascii')
+            return f"data:image/png;base64,{data}"
+    return os.path.relpath(image_path, html_dir).replace(os.sep, '/')
+
+def generate_html_report(results, html_path, title="Retail Price Chart"):
+    """Generate an HTML report for the plots of one chart target (the retail price plots by default)"""
     html = f"""
     <!DOCTYPE html>
     <html>
     <head>
-        <title>Retail Price Chart Extraction Report</title>
+        <title>{title} Extraction Report</title>
         <style>
             body {{ font-family: Arial, sans-serif; margin: 20px; }}
             h1, h2, h3 {{ color: #333; }}
@@ -395,7 +970,7 @@ def generate_html_report(results, html_path):
         </style>
     </head>
     <body>
-        <h1>Retail Price Chart Extraction Report</h1>
+        <h1>{title} Extraction Report</h1>
         <h2>PDF: {results["pdf_name"]}</h2>
         <p>Plots found: {len(results["plots_found"])}</p>
         
@@ -404,15 +979,15 @@ def generate_html_report(results, html_path):
     
     # Add each plot to the report
     for i, plot in enumerate(results["plots_found"]):
-        img_filename = os.path.basename(plot["image_path"])
+        img_src = image_src(plot["image_path"], os.path.dirname(os.path.abspath(html_path)))
         
         html += f"""
         <div class="plot-section">
-            <h3>Retail Price Chart - Page {plot["page"]}</h3>
+            <h3>{title} - Page {plot["page"]}</h3>
             <p>Indicator text: <strong>{plot.get("indicator_text", "Unknown")}</strong></p>
             
             <div class="plot-image">
-                <img src="{img_filename}" alt="Retail Price Chart">
+                <img src="{img_src}" alt="{title}">
             </div>
         </div>
         """
@@ -430,12 +1005,15 @@ def generate_combined_html_report(output_dir, pdf_paths):
     """Generate a combined HTML report showing all successfully extracted charts"""
     
     # Define logs directory for reports
-    logs_dir = r"C:\Users\clint\Desktop\Lifecycle Code\data\extracted_images\logs"
+    logs_dir = get_path('extraction_logs')
     os.makedirs(logs_dir, exist_ok=True)
     
     # Define extracted images directory
-    extracted_dir = r"C:\Users\clint\Desktop\Lifecycle Code\data\extracted_images"
+    extracted_dir = get_path('extracted_images')
     
+    # Crops of the other chart targets don't belong in this report
+    other_charts = [f"_{target.variant}" for target in chart_targets.TARGETS.values() if target.name != 'retail_price']
+
     # Collect all the extracted charts
     chart_images = []
     for pdf_path in pdf_paths:
@@ -445,7 +1023,7 @@ def generate_combined_html_report(output_dir, pdf_paths):
         regular_pattern = f"{pdf_name}_retail_price_plot_cropped.png"
         cropped_img = os.path.join(extracted_dir, regular_pattern)
         
-        if os.path.exists(cropped_img):
+        if crop_available(cropped_img):
             chart_images.append({
                 'pdf_name': pdf_name,
                 'image_path': cropped_img,
@@ -456,7 +1034,7 @@ def generate_combined_html_report(output_dir, pdf_paths):
             fallback_pattern = f"{pdf_name}_retail_price_plot_fallback_cropped.png"
             fallback_img = os.path.join(extracted_dir, fallback_pattern)
             
-            if os.path.exists(fallback_img):
+            if crop_available(fallback_img):
                 chart_images.append({
                     'pdf_name': pdf_name,
                     'image_path': fallback_img,
@@ -465,8 +1043,10 @@ def generate_combined_html_report(output_dir, pdf_paths):
             else:
                 # If no match found, search directory for any images containing the PDF name
                 found = False
-                for filename in os.listdir(extracted_dir):
-                    if filename.startswith(pdf_name) and filename.endswith("_cropped.png"):
+                packed = image_store.shared_store().filenames()
+                for filename in [*os.listdir(extracted_dir), *packed]:
+                    if filename.startswith(pdf_name) and filename.endswith("_cropped.png") \
+                            and not any(variant in filename for variant in other_charts):
                         img_path = os.path.join(extracted_dir, filename)
                         is_fallback = "fallback" in filename.lower()
                         chart_images.append({
@@ -517,10 +1097,8 @@ def generate_combined_html_report(output_dir, pdf_paths):
             card_class = "chart-card fallback" if chart['is_fallback'] else "chart-card"
             tag = " (Fallback)" if chart['is_fallback'] else ""
             
-            # Use proper relative path from logs directory to the images
-            img_basename = os.path.basename(chart['image_path'])
-            # Use ../ to go up one level from logs to the extracted_images directory
-            img_relative_path = f"../{img_basename}"
+            # Relative path from the logs directory to the image (or the packed image itself)
+            img_relative_path = image_src(chart['image_path'], logs_dir)
             
             f.write(f"""
             <div class="{card_class}">
@@ -538,15 +1116,20 @@ def generate_combined_html_report(output_dir, pdf_paths):
         </html>
         """)
 
-def process_all_pdfs_for_retail_price_charts(pdf_folder, output_dir=None, error_log_path=None):
-    """Process all PDFs in a folder to extract retail price charts"""
+def process_all_pdfs_for_retail_price_charts(pdf_folder, output_dir=None, error_log_path=None,
+                                             streaming=None, memory_budget_mb=None, debug_images=None,
+                                             loose_images=None, use_render_cache=None, targets=None):
+    """
+    Process all PDFs in a folder to extract retail price charts, or the given
+    chart targets (see extract_charts). A PDF counts as successful if its first target was found.
+    """
     if output_dir is None:
-        output_dir = r"C:\Users\clint\Desktop\Lifecycle Code\data\extracted_images"
+        output_dir = get_path('extracted_images')
     
     os.makedirs(output_dir, exist_ok=True)
     
     # Define logs directory
-    logs_dir = r"C:\Users\clint\Desktop\Lifecycle Code\data\extracted_images\logs"
+    logs_dir = get_path('extraction_logs')
     os.makedirs(logs_dir, exist_ok=True)
     
     pdf_files = [f for f in os.listdir(pdf_folder) if f.lower().endswith('.pdf')]
@@ -555,22 +1138,29 @@ def process_all_pdfs_for_retail_price_charts(pdf_folder, output_dir=None, error_
     successful = 0
     failed = []
     
-    for pdf_file in pdf_files:
-        pdf_path = os.path.join(pdf_folder, pdf_file)
-        pdf_name = os.path.splitext(pdf_file)[0]
-        
-        print(f"\n\nProcessing {pdf_file}...")
-        results, found_plot = extract_retail_price_plots(
-            pdf_path, 
-            output_dir=output_dir, 
-            relaxed_detection=True, 
-            error_log_path=error_log_path
-        )
-        
-        if found_plot:
-            successful += 1
-        else:
-            failed.append(pdf_name)
+    with instrumentation.run('extract'):
+        for pdf_file in pdf_files:
+            pdf_path = os.path.join(pdf_folder, pdf_file)
+            pdf_name = os.path.splitext(pdf_file)[0]
+            
+            print(f"\n\nProcessing {pdf_file}...")
+            charts = extract_charts(
+                pdf_path,
+                targets,
+                output_dir=output_dir,
+                error_log_path=error_log_path,
+                streaming=streaming,
+                memory_budget_mb=memory_budget_mb,
+                debug_images=debug_images,
+                loose_images=loose_images,
+                use_render_cache=use_render_cache
+            )
+            results, found_plot = next(iter(charts.values()))
+            
+            if found_plot:
+                successful += 1
+            else:
+                failed.append(pdf_name)
     
     # Create summary report in the logs directory
     summary_path = os.path.join(logs_dir, "extraction_summary.txt")
@@ -598,15 +1188,43 @@ def process_all_pdfs_for_retail_price_charts(pdf_folder, output_dir=None, error_
 
 # If run directly, process one PDF or all PDFs in the folder
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Extract the Average Retail Selling Price charts from data/raw_pdfs")
+    parser.add_argument("--streaming", action="store_true", default=STREAMING,
+                        help="Crop captures in memory one at a time and save images in the background")
+    parser.add_argument("--memory-budget", type=int, default=MEMORY_BUDGET_MB, metavar="MB",
+                        help="Memory budget of the process in streaming mode (0 = none)")
+    parser.add_argument("--debug-images", action="store_true", default=DEBUG_IMAGES,
+                        help="Also save the raw captures and bounding box visualizations in the logs folder")
+    parser.add_argument("--no-loose-images", dest="loose_images", action="store_false", default=LOOSE_IMAGES,
+                        help="Only write the crops into the packed image store, not as loose PNGs")
+    parser.add_argument("--render-cache", action="store_true", default=RENDER_CACHE,
+                        help="Reuse cached renders and cache new ones in data/render_cache (for crop-parameter sweeps)")
+    parser.add_argument("--targets", default=None,
+                        help="Comma-separated chart targets to extract in the same pass, or 'all' "
+                             f"(registered: {', '.join(chart_targets.TARGETS)}; default: retail_price)")
+    parser.add_argument("--image-format", choices=sorted(image_writer.IMAGE_FORMATS), default=image_writer.IMAGE_FORMAT,
+                        help="Format of the debug images: png or webp (lossless)")
+    parser.add_argument("--png-compress-level", type=int, default=image_writer.PNG_COMPRESS_LEVEL, metavar="0-9",
+                        help="zlib level for PNGs (default 6; 1 encodes faster into slightly larger files)")
+    parser.add_argument("--writer-threads", type=int, default=image_writer.WRITER_THREADS,
+                        help="Threads encoding and saving images in the background")
+    args = parser.parse_args()
+    image_writer.configure(args.image_format, args.png_compress_level, args.writer_threads)
+    # The first target decides whether a PDF counts as successful
+    try:
+        targets = chart_targets.select_targets(args.targets)
+    except ValueError as e:
+        parser.error(str(e))
+
     # Process all PDFs in the raw_pdfs directory
-    pdf_folder = r"C:\Users\clint\Desktop\Lifecycle Code\data\raw_pdfs"
+    pdf_folder = get_path('raw_pdfs')
     
     # Define main output directory for images
-    output_dir = r"C:\Users\clint\Desktop\Lifecycle Code\data\extracted_images"
+    output_dir = get_path('extracted_images')
     os.makedirs(output_dir, exist_ok=True)
     
     # Define logs directory
-    logs_dir = r"C:\Users\clint\Desktop\Lifecycle Code\data\extracted_images\logs"
+    logs_dir = get_path('extraction_logs')
     os.makedirs(logs_dir, exist_ok=True)
     
     # Create error log CSV file
@@ -625,85 +1243,102 @@ if __name__ == "__main__":
     pdf_files = [os.path.join(pdf_folder, f) for f in os.listdir(pdf_folder) if f.lower().endswith('.pdf')]
     print(f"Found {len(pdf_files)} PDF files to process")
     
-    successful = 0
-    failed = []
+    with instrumentation.run('extract'):
+        successful = 0
+        failed = []
+        charts_found = {target.name: 0 for target in targets}
     
-    for pdf_path in pdf_files:
-        pdf_name = os.path.basename(pdf_path).replace('.pdf', '')
-        print(f"\nProcessing {pdf_name}...")
+        for pdf_path in pdf_files:
+            pdf_name = os.path.basename(pdf_path).replace('.pdf', '')
+            print(f"\nProcessing {pdf_name}...")
         
-        # Check if the file exists before attempting to process it
-        if not os.path.exists(pdf_path):
-            print(f"ERROR: File {pdf_path} does not exist")
+            # Check if the file exists before attempting to process it
+            if not os.path.exists(pdf_path):
+                print(f"ERROR: File {pdf_path} does not exist")
             
-            # Log the error
-            with open(error_log_path, 'a', newline='') as csvfile:
-                writer = csv.DictWriter(csvfile, fieldnames=['pdf_name', 'pdf_path', 'timestamp', 'error', 'pages_checked', 'detected_keywords'])
-                writer.writerow({
-                    'pdf_name': pdf_name,
-                    'pdf_path': pdf_path,
-                    'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                    'error': 'File does not exist',
-                    'pages_checked': 0,
-                    'detected_keywords': ''
-                })
+                # Log the error
+                with open(error_log_path, 'a', newline='') as csvfile:
+                    writer = csv.DictWriter(csvfile, fieldnames=['pdf_name', 'pdf_path', 'timestamp', 'error', 'pages_checked', 'detected_keywords'])
+                    writer.writerow({
+                        'pdf_name': pdf_name,
+                        'pdf_path': pdf_path,
+                        'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                        'error': 'File does not exist',
+                        'pages_checked': 0,
+                        'detected_keywords': ''
+                    })
             
-            failed.append(pdf_name)
-            continue
+                failed.append(pdf_name)
+                continue
         
-        try:
-            # Pass the error log path
-            results, found_plot = extract_retail_price_plots(
-                pdf_path, 
-                output_dir=output_dir,
-                error_log_path=error_log_path
-            )
+            try:
+                # Pass the error log path
+                charts = extract_charts(
+                    pdf_path,
+                    targets,
+                    output_dir=output_dir,
+                    error_log_path=error_log_path,
+                    streaming=args.streaming,
+                    memory_budget_mb=args.memory_budget,
+                    debug_images=args.debug_images,
+                    loose_images=args.loose_images,
+                    use_render_cache=args.render_cache
+                )
+                for name, (results, found_plot) in charts.items():
+                    charts_found[name] += found_plot
+                results, found_plot = next(iter(charts.values()))
             
-            if found_plot:
-                successful += 1
-            else:
-                failed.append(pdf_name)
+                if found_plot:
+                    successful += 1
+                else:
+                    failed.append(pdf_name)
                 
-        except Exception as e:
-            print(f"ERROR: Failed to process {pdf_name}: {str(e)}")
+            except Exception as e:
+                print(f"ERROR: Failed to process {pdf_name}: {str(e)}")
             
-            # Log the error
-            with open(error_log_path, 'a', newline='') as csvfile:
-                writer = csv.DictWriter(csvfile, fieldnames=['pdf_name', 'pdf_path', 'timestamp', 'error', 'pages_checked', 'detected_keywords'])
-                writer.writerow({
-                    'pdf_name': pdf_name,
-                    'pdf_path': pdf_path,
-                    'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                    'error': f'Exception: {str(e)}',
-                    'pages_checked': 0,
-                    'detected_keywords': ''
-                })
+                # Log the error
+                with open(error_log_path, 'a', newline='') as csvfile:
+                    writer = csv.DictWriter(csvfile, fieldnames=['pdf_name', 'pdf_path', 'timestamp', 'error', 'pages_checked', 'detected_keywords'])
+                    writer.writerow({
+                        'pdf_name': pdf_name,
+                        'pdf_path': pdf_path,
+                        'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                        'error': f'Exception: {str(e)}',
+                        'pages_checked': 0,
+                        'detected_keywords': ''
+                    })
             
-            failed.append(pdf_name)
+                failed.append(pdf_name)
     
-    # Create summary report
-    summary_path = os.path.join(logs_dir, "full_extraction_summary.txt")
-    with open(summary_path, "w") as f:
-        f.write(f"Retail Price Chart Extraction Summary\n")
-        f.write(f"=====================================\n\n")
-        f.write(f"Total PDFs processed: {len(pdf_files)}\n")
-        f.write(f"Successfully extracted charts: {successful}\n")
-        f.write(f"Failed extractions: {len(failed)}\n\n")
+        # Create summary report
+        summary_path = os.path.join(logs_dir, "full_extraction_summary.txt")
+        with open(summary_path, "w") as f:
+            f.write(f"Retail Price Chart Extraction Summary\n")
+            f.write(f"=====================================\n\n")
+            f.write(f"Total PDFs processed: {len(pdf_files)}\n")
+            f.write(f"Successfully extracted charts: {successful}\n")
+            f.write(f"Failed extractions: {len(failed)}\n\n")
+            if len(targets) > 1:
+                f.write("Charts found per target:\n")
+                for name, count in charts_found.items():
+                    f.write(f"- {name}: {count}\n")
+                f.write("\n")
         
-        if failed:
-            f.write("Failed PDFs:\n")
-            for pdf in failed:
-                f.write(f"- {pdf}\n")
+            if failed:
+                f.write("Failed PDFs:\n")
+                for pdf in failed:
+                    f.write(f"- {pdf}\n")
     
-    print(f"\nAll PDFs processed.")
-    print(f"Successfully extracted retail price charts from {successful} out of {len(pdf_files)} PDFs.")
+        print(f"\nAll PDFs processed.")
+        print(f"Successfully extracted retail price charts from {successful} out of {len(pdf_files)} PDFs.")
     
-    if failed:
-        print(f"Failed to extract charts from {len(failed)} PDFs.")
-        print(f"See {error_log_path} for detailed error information.")
+        if failed:
+            print(f"Failed to extract charts from {len(failed)} PDFs.")
+            print(f"See {error_log_path} for detailed error information.")
     
-    print(f"Summary report created at {summary_path}")
+        print(f"Summary report created at {summary_path}")
     
-    # Generate a combined HTML report showing all charts
-    generate_combined_html_report(output_dir, pdf_files)
-    print(f"Combined HTML report created at {os.path.join(logs_dir, 'all_charts_report.html')}")
\ No newline at end of file
+        # Generate a combined HTML report showing all charts
+        with instrumentation.span('combined_report'):
+            generate_combined_html_report(output_dir, pdf_files)
+        print(f"Combined HTML report created at {os.path.join(logs_dir, 'all_charts_report.html')}")
\ No newline at end of file
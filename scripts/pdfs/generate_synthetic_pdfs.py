@@ -0,0 +1,316 @@
+"""
+Generate a synthetic corpus of Guidelines-style PDFs with known chart values.
+
+Every document has a few pages of body text, decoy phrases and decoy charts, and
+one "Average Retail Selling Price" line chart (4YO, 5YO and 3-5YO Avg. series)
+whose monthly values are written to a ground-truth CSV. Layouts vary the way
+the real reports do:
+
+    inline    - the chart sits right below the text that mentions it
+    next_page - the mention is at the bottom of a page and the chart is on the next one
+
+and the chart is either drawn as vector graphics (with its title as PDF text) or
+embedded as a raster image (title only in the pixels), as in most real reports.
+
+Output (default data/synthetic/):
+    pdfs/synthetic_<n>_<MM>_<YYYY>.pdf
+    ground_truth/synthetic_<n>_<MM>_<YYYY>.csv   (Date, 4YO, 5YO, 3-5YO Avg.)
+    manifest.csv                                 (one row per document: layout, chart page, bbox, ...)
+
+Documents are generated in parallel processes; each one is seeded from
+(seed, document number), so a given corpus is reproducible regardless of workers.
+"""
+import os
+import sys
+import csv
+import time
+import argparse
+import numpy as np
+import pandas as pd
+import fitz  # PyMuPDF
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import get_path
+
+PAGE_WIDTH, PAGE_HEIGHT = 612, 792  # US Letter, like the real reports
+MARGIN = 54
+
+SERIES = [
+    # name, colour, dashed
+    ('4YO', (0.75, 0.31, 0.30), False),
+    ('5YO', (0.61, 0.73, 0.35), False),
+    ('3-5YO Avg.', (0.12, 0.22, 0.40), True),
+]
+
+CHART_TITLES = [
+    "Average Retail Selling Price: 3-5 Year-Old Sleeper Tractors",
+    "Average Retail Selling Price: 3-5 Year-Old Sleepers",
+    "Avg. Retail Selling Price: 3-5 Year-Old Sleeper Tractors",
+]
+
+# Phrases close to the real indicators that the extractor must not latch onto
+DECOY_PHRASES = [
+    "Average Wholesale Selling Price",
+    "Average Auction Selling Price",
+    "retail sales volume",
+    "Average Retail Price per Mile",
+    "average selling prices at auction",
+]
+
+DECOY_CHART_TITLES = [
+    "Average Auction Selling Price: Day Cabs",
+    "Retail Sales Volume by Make",
+    "Average Mileage: 3-5 Year-Old Sleepers",
+]
+
+WORDS = ("truck tractor sleeper auction retail wholesale mileage pricing month volume model year "
+         "market buyers sellers inventory dealers freight rates demand supply equipment values "
+         "depreciation cab engine emissions used segment fleet trade").split()
+
+LAYOUTS = ['inline', 'next_page']
+CHART_STYLES = ['vector', 'raster']
+
+MANIFEST_FIELDS = ['pdf_name', 'report_month', 'pages', 'chart_page', 'layout', 'chart_style',
+                   'title', 'months', 'chart_x0', 'chart_y0', 'chart_x1', 'chart_y1']
+
+def sentence(rng, min_words=8, max_words=18):
+    words = rng.choice(WORDS, size=rng.integers(min_words, max_words + 1))
+    text = " ".join(words)
+    return text[0].upper() + text[1:] + "."
+
+def paragraph(rng, sentences=None, decoy_probability=0.3):
+    count = sentences if sentences is not None else int(rng.integers(3, 7))
+    parts = [sentence(rng) for _ in range(count)]
+    if rng.random() < decoy_probability:
+        phrase = DECOY_PHRASES[rng.integers(len(DECOY_PHRASES))]
+        parts.insert(int(rng.integers(len(parts) + 1)), f"The {phrase} moved {rng.integers(1, 9)}% this month.")
+    return " ".join(parts)
+
+def generate_series(rng, report_month, n_years):
+    """
+    Monthly ground-truth values for every series, rounded to $1,000 like the
+    values read off real charts. The chart covers n_years calendar years ending
+    with the year before the report.
+    """
+    start = pd.Period(year=report_month.year - n_years, month=1, freq='M')
+    months = pd.period_range(start, periods=12 * n_years, freq='M')
+
+    level_5 = rng.uniform(35000, 70000)
+    level_4 = level_5 * rng.uniform(1.1, 1.4)
+    # Random walks with a mild trend, then a 4YO premium over 5YO
+    steps_5 = rng.normal(rng.uniform(-400, 200), 1800, len(months)).cumsum()
+    steps_4 = rng.normal(0, 1500, len(months)).cumsum()
+    five = np.clip(level_5 + steps_5, 15000, None)
+    four = np.clip(level_4 + steps_5 + steps_4 * 0.5, five + 2000, None)
+    avg = (four + five) / 2 + rng.normal(0, 800, len(months))
+
+    truth = pd.DataFrame({
+        'Date': months.to_timestamp().strftime('%Y-%m-%d'),
+        '4YO': np.round(four, -3).astype(int),
+        '5YO': np.round(five, -3).astype(int),
+        '3-5YO Avg.': np.round(avg, -3).astype(int),
+    })
+    return truth
+
+def draw_chart(page, rect, truth, title, with_title=True, decoy=False):
+    """Draw a framed line chart of `truth` into `rect` of `page` using vector graphics"""
+    # One Shape for the whole chart: a commit per element would rewrite the page contents each time
+    shape = page.new_shape()
+
+    # Light grey frame, like the rounded box around the real charts
+    shape.draw_rect(rect)
+    shape.finish(color=(0.6, 0.6, 0.6), width=1)
+
+    top = rect.y0 + 10
+    if with_title:
+        shape.insert_text((rect.x0 + 12, rect.y0 + 22), title, fontsize=11, fontname="hebo")
+        top = rect.y0 + 32
+
+    plot = fitz.Rect(rect.x0 + 62, top + 10, rect.x1 - 14, rect.y1 - 54)
+    values = truth[[name for name, _, _ in SERIES]].to_numpy(dtype=float)
+    y_max = np.ceil(values.max() * 1.1 / 10000) * 10000
+
+    def y_of(value):
+        return plot.y1 - value / y_max * plot.height
+
+    # Horizontal grid lines and y labels
+    for tick in np.arange(0, y_max + 1, 10000):
+        y = y_of(tick)
+        shape.draw_line((plot.x0, y), (plot.x1, y))
+        shape.finish(color=(0.85, 0.85, 0.85), width=0.5)
+        shape.insert_text((rect.x0 + 8, y + 3), f"${tick:,.0f}", fontsize=7)
+
+    n = len(truth)
+    xs = plot.x0 + (np.arange(n) + 0.5) / n * plot.width
+    dates = pd.to_datetime(truth['Date'])
+    for i, date in enumerate(dates):
+        if date.month == 1:
+            if i > 0:
+                x = (xs[i - 1] + xs[i]) / 2
+                shape.draw_line((x, plot.y0), (x, plot.y1))
+                shape.finish(color=(0.12, 0.22, 0.40), width=0.7)
+            shape.insert_text((xs[i] - 8, plot.y1 + 12), date.strftime('%b-%y'), fontsize=6)
+        elif date.month % 3 == 1:
+            shape.insert_text((xs[i] - 6, plot.y1 + 12), date.strftime('%b'), fontsize=6)
+
+    series = SERIES[:1] if decoy else SERIES
+    for column, (name, colour, dashed) in enumerate(series):
+        points = [fitz.Point(x, y_of(v)) for x, v in zip(xs, values[:, column])]
+        shape.draw_polyline(points)
+        shape.finish(color=colour, width=1.6, dashes="[4 2] 0" if dashed else None, closePath=False)
+
+    # Legend and source line
+    legend_y = rect.y1 - 14
+    shape.insert_text((rect.x0 + 12, legend_y), "Source: J.D. Power Valuation Services", fontsize=6, fontname="heit")
+    x = rect.x0 + 200
+    for name, colour, dashed in series:
+        shape.draw_line((x, legend_y - 3), (x + 22, legend_y - 3))
+        shape.finish(color=colour, width=1.6, dashes="[4 2] 0" if dashed else None)
+        shape.insert_text((x + 26, legend_y), name, fontsize=7)
+        x += 80
+    shape.commit()
+
+def insert_raster_chart(page, rect, truth, title, zoom=2.0):
+    """Render the chart on a scratch page and embed it as an image, title included in the pixels"""
+    scratch = fitz.open()
+    scratch_page = scratch.new_page(width=rect.width + 2, height=rect.height + 2)
+    draw_chart(scratch_page, fitz.Rect(1, 1, rect.width + 1, rect.height + 1), truth, title)
+    pix = scratch_page.get_pixmap(matrix=fitz.Matrix(zoom, zoom))
+    page.insert_image(rect, stream=pix.tobytes("png"))
+    scratch.close()
+
+def write_text(page, rect, rng, paragraphs):
+    shape = page.new_shape()
+    y = rect.y0
+    for _ in range(paragraphs):
+        box = fitz.Rect(rect.x0, y, rect.x1, rect.y1)
+        # insert_textbox returns the unused height (negative if the text didn't fit)
+        remaining = shape.insert_textbox(box, paragraph(rng), fontsize=10, fontname="helv")
+        if remaining < 0:
+            break
+        y = rect.y1 - remaining + 8
+        if y > rect.y1 - 30:
+            break
+    shape.commit()
+    return y
+
+def generate_document(number, output_dir, seed=0):
+    """Write one synthetic PDF and its ground-truth CSV; returns its manifest row"""
+    rng = np.random.default_rng([seed, number])
+
+    report_month = pd.Period(year=int(rng.integers(2018, 2026)), month=int(rng.integers(1, 13)), freq='M')
+    pdf_name = f"synthetic_{number:05d}_{report_month.month:02d}_{report_month.year}"
+    truth = generate_series(rng, report_month, n_years=int(rng.integers(2, 5)))
+
+    layout = LAYOUTS[rng.integers(len(LAYOUTS))]
+    chart_style = CHART_STYLES[rng.integers(len(CHART_STYLES))]
+    title = CHART_TITLES[rng.integers(len(CHART_TITLES))]
+    page_count = int(rng.integers(4, 17))
+    # Mention page; with next_page the chart is on the following page
+    mention_page = int(rng.integers(1, page_count - 1))
+    chart_page = mention_page + 1 if layout == 'next_page' else mention_page
+
+    doc = fitz.open()
+    text_rect = fitz.Rect(MARGIN, MARGIN, PAGE_WIDTH - MARGIN, PAGE_HEIGHT - MARGIN)
+    chart_rect = None
+    mention = f"See the “{title}” graph for the monthly trend by model year."
+
+    for page_number in range(page_count):
+        page = doc.new_page(width=PAGE_WIDTH, height=PAGE_HEIGHT)
+        page.insert_text((MARGIN, 36), f"Commercial Truck Guidelines - {report_month.strftime('%B %Y')}",
+                         fontsize=8, fontname="heit")
+
+        if page_number == mention_page and layout == 'inline':
+            y = write_text(page, fitz.Rect(MARGIN, MARGIN, PAGE_WIDTH - MARGIN, 260), rng, 2)
+            page.insert_text((MARGIN, y + 12), mention, fontsize=10)
+            chart_rect = fitz.Rect(MARGIN - 18, y + 26, PAGE_WIDTH - MARGIN + 18, y + 26 + 310)
+            if chart_style == 'vector':
+                draw_chart(page, chart_rect, truth, title)
+            else:
+                insert_raster_chart(page, chart_rect, truth, title)
+            write_text(page, fitz.Rect(MARGIN, chart_rect.y1 + 16, PAGE_WIDTH - MARGIN, PAGE_HEIGHT - MARGIN), rng, 2)
+        elif page_number == mention_page:
+            # Body text fills the page and the mention is its last line
+            write_text(page, fitz.Rect(MARGIN, MARGIN, PAGE_WIDTH - MARGIN, PAGE_HEIGHT - 110), rng, 6)
+            page.insert_text((MARGIN, PAGE_HEIGHT - 70), mention, fontsize=10)
+        elif page_number == chart_page:
+            chart_rect = fitz.Rect(MARGIN - 18, MARGIN + 10, PAGE_WIDTH - MARGIN + 18, MARGIN + 10 + 330)
+            if chart_style == 'vector':
+                draw_chart(page, chart_rect, truth, title)
+            else:
+                insert_raster_chart(page, chart_rect, truth, title)
+            write_text(page, fitz.Rect(MARGIN, chart_rect.y1 + 20, PAGE_WIDTH - MARGIN, PAGE_HEIGHT - MARGIN), rng, 3)
+        elif rng.random() < 0.35:
+            # Decoy chart: same framing, different title and data
+            decoy_truth = generate_series(rng, report_month, n_years=2)
+            decoy_rect = fitz.Rect(MARGIN - 18, MARGIN + 10, PAGE_WIDTH - MARGIN + 18, MARGIN + 10 + 280)
+            draw_chart(page, decoy_rect, decoy_truth, DECOY_CHART_TITLES[rng.integers(len(DECOY_CHART_TITLES))],
+                       decoy=True)
+            write_text(page, fitz.Rect(MARGIN, decoy_rect.y1 + 20, PAGE_WIDTH - MARGIN, PAGE_HEIGHT - MARGIN), rng, 3)
+        else:
+            write_text(page, text_rect, rng, 6)
+
+    doc.save(os.path.join(output_dir, "pdfs", f"{pdf_name}.pdf"), garbage=3, deflate=True)
+    doc.close()
+
+    truth.to_csv(os.path.join(output_dir, "ground_truth", f"{pdf_name}.csv"), index=False)
+
+    return {
+        'pdf_name': pdf_name,
+        'report_month': str(report_month),
+        'pages': page_count,
+        'chart_page': chart_page + 1,
+        'layout': layout,
+        'chart_style': chart_style,
+        'title': title,
+        'months': len(truth),
+        'chart_x0': round(chart_rect.x0, 1),
+        'chart_y0': round(chart_rect.y0, 1),
+        'chart_x1': round(chart_rect.x1, 1),
+        'chart_y1': round(chart_rect.y1, 1),
+    }
+
+def _generate_batch(numbers, output_dir, seed):
+    return [generate_document(number, output_dir, seed) for number in numbers]
+
+def generate_corpus(count, output_dir=None, seed=0, workers=None, start=1, batch_size=50):
+    """
+    Generate `count` documents numbered from `start` into `output_dir` in parallel.
+    Returns the manifest DataFrame (also written to manifest.csv).
+    """
+    if output_dir is None:
+        output_dir = get_path('data', "synthetic")
+    os.makedirs(os.path.join(output_dir, "pdfs"), exist_ok=True)
+    os.makedirs(os.path.join(output_dir, "ground_truth"), exist_ok=True)
+
+    numbers = list(range(start, start + count))
+    batches = [numbers[i:i + batch_size] for i in range(0, len(numbers), batch_size)]
+
+    start_time = time.time()
+    rows = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for batch_rows in pool.map(_generate_batch, batches, [output_dir] * len(batches), [seed] * len(batches)):
+            rows.extend(batch_rows)
+            print(f"Generated {len(rows)}/{count} documents ({len(rows) / (time.time() - start_time):.0f}/s)")
+
+    manifest = pd.DataFrame(rows, columns=MANIFEST_FIELDS)
+    manifest_path = os.path.join(output_dir, "manifest.csv")
+    # Appending lets a corpus be grown in several runs with different --start values
+    write_header = not os.path.exists(manifest_path)
+    manifest.to_csv(manifest_path, mode='a', header=write_header, index=False, quoting=csv.QUOTE_MINIMAL)
+
+    print(f"\n{count} documents written to {output_dir} in {time.time() - start_time:.1f} s")
+    print(manifest.groupby(['layout', 'chart_style']).size().to_string())
+    return manifest
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic Guidelines-style PDFs with ground truth")
+    parser.add_argument("--count", type=int, default=100, help="Number of documents to generate")
+    parser.add_argument("--output", default=None, help="Output folder (defaults to data/synthetic)")
+    parser.add_argument("--seed", type=int, default=0, help="Corpus seed")
+    parser.add_argument("--start", type=int, default=1, help="Number of the first document")
+    parser.add_argument("--workers", type=int, default=None, help="Parallel processes")
+    args = parser.parse_args()
+
+    generate_corpus(args.count, args.output, seed=args.seed, workers=args.workers, start=args.start)
@@ -0,0 +1,209 @@
+"""
+Background writer for the images produced during extraction.
+
+The extractor hands over save tasks and carries on; a small pool of writer
+threads encodes and saves the images (Pillow releases the GIL while encoding).
+Pending tasks are bounded by the bytes of image data they hold, so a slow disk
+makes the extractor wait instead of piling up captures in memory.
+
+Every image is written to a temporary file and renamed into place, so an
+interrupted run never leaves a truncated image behind. Crops are encoded once and
+can also be appended to the packed image store (scripts/image_store.py).
+
+Encoding can be set with environment variables (or configure()):
+
+    LIFECYCLE_IMAGE_FORMAT=webp          debug images as lossless WebP instead of PNG
+    LIFECYCLE_PNG_COMPRESS_LEVEL=1       zlib level 0-9 for PNGs (Pillow's default is 6)
+    LIFECYCLE_WRITER_THREADS=2           encoder threads per writer
+
+Crops are always saved as PNG, which is what the later pipeline steps read.
+"""
+import os
+import io
+import queue
+import sys
+import threading
+from PIL import Image
+
+# Atomic writes are shared with the packed image store (scripts/image_store.py)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from image_store import save_bytes
+
+# File extension per supported format
+IMAGE_FORMATS = {
+    'png': '.png',
+    'webp': '.webp',
+}
+
+IMAGE_FORMAT = os.environ.get("LIFECYCLE_IMAGE_FORMAT", "png").lower()
+PNG_COMPRESS_LEVEL = int(os.environ.get("LIFECYCLE_PNG_COMPRESS_LEVEL", "6"))
+WRITER_THREADS = int(os.environ.get("LIFECYCLE_WRITER_THREADS", "0") or 0) or min(2, os.cpu_count() or 1)
+
+def configure(image_format=None, compress_level=None, threads=None):
+    """Change the defaults used by new writers (e.g. from command line arguments)"""
+    global IMAGE_FORMAT, PNG_COMPRESS_LEVEL, WRITER_THREADS
+    if image_format is not None:
+        if image_format not in IMAGE_FORMATS:
+            raise ValueError(f"Unsupported image format {image_format!r}, expected one of {', '.join(IMAGE_FORMATS)}")
+        IMAGE_FORMAT = image_format
+    if compress_level is not None:
+        if not 0 <= compress_level <= 9:
+            raise ValueError(f"PNG compression level must be between 0 and 9, got {compress_level}")
+        PNG_COMPRESS_LEVEL = compress_level
+    if threads is not None:
+        WRITER_THREADS = max(1, threads)
+
+def save_options(image_format='png', compress_level=None):
+    """Keyword arguments for Image.save in the given format"""
+    if image_format == 'png':
+        return {'format': 'PNG', 'compress_level': PNG_COMPRESS_LEVEL if compress_level is None else compress_level}
+    if image_format == 'webp':
+        # Lossless with the fastest method: same pixels as the PNG; quicker than zlib on
+        # chart captures, though the files are larger
+        return {'format': 'WEBP', 'lossless': True, 'method': 0, 'quality': 0}
+    raise ValueError(f"Unsupported image format {image_format!r}")
+
+def with_format(path, image_format):
+    """`path` with the extension of `image_format`"""
+    return os.path.splitext(path)[0] + IMAGE_FORMATS[image_format]
+
+def encode_image(image, image_format='png', compress_level=None):
+    """Encode a PIL image (or an RGB array) into bytes"""
+    if not isinstance(image, Image.Image):
+        image = Image.fromarray(image)
+    buffer = io.BytesIO()
+    image.save(buffer, **save_options(image_format, compress_level))
+    return buffer.getvalue()
+
+def save_image(path, image, image_format='png', compress_level=None):
+    """Save a PIL image (or an RGB array) atomically"""
+    save_bytes(path, encode_image(image, image_format, compress_level))
+
+def save_array(path, array, image_format='png', compress_level=None):
+    """Save a height x width x 3 uint8 array as an image (atomically)"""
+    save_image(path, array, image_format, compress_level)
+
+def save_crop(path, image, store=None, key=None, loose=True, compress_level=None):
+    """
+    Encode a crop as PNG once, append it to `store` under `key` (report, variant)
+    and save it as the loose file `path` (always, when it can't go into the store).
+    """
+    data = encode_image(image, 'png', compress_level)
+    if store is not None and key is not None:
+        store.append(*key, data)
+    else:
+        loose = True
+    if loose:
+        save_bytes(path, data)
+
+def draw_box(array, box, color=(255, 0, 0), width=3):
+    """
+    Draw the outline of box (x, y, w, h) into an RGB array in place, with the
+    same pixels as PIL's ImageDraw.rectangle([x, y, x + w, y + h], width=width)
+    """
+    x, y, w, h = box
+    x1, y1 = x + w, y + h
+    array[y:y + width, x:x1 + 1] = color
+    array[max(y1 - width + 1, 0):y1 + 1, x:x1 + 1] = color
+    array[y:y1 + 1, x:x + width] = color
+    array[y:y1 + 1, max(x1 - width + 1, 0):x1 + 1] = color
+
+class ImageWriter:
+    """
+    Run image saving tasks on background threads.
+
+    Tasks may run in any order and in parallel, so each task should only touch
+    the images it was given.
+
+    Parameters:
+        max_pending_bytes (int): submit() blocks while tasks holding this many bytes are waiting
+        threads (int, optional): Number of encoder threads (defaults to WRITER_THREADS)
+        image_format (str, optional): 'png' or 'webp' for debug images (defaults to IMAGE_FORMAT)
+        compress_level (int, optional): zlib level for PNGs (defaults to PNG_COMPRESS_LEVEL)
+        store (ImageStore, optional): Packed image store the crops are appended to
+        loose_crops (bool): Also save every crop as a loose PNG
+
+    Failed tasks don't stop the writer: their (description, error message) is
+    appended to `errors`, which the caller must check after close().
+    """
+
+    def __init__(self, max_pending_bytes=256 * 2 ** 20, threads=None, image_format=None, compress_level=None,
+                 store=None, loose_crops=True):
+        self.max_pending_bytes = max_pending_bytes
+        self.store = store
+        self.loose_crops = loose_crops
+        self.image_format = image_format or IMAGE_FORMAT
+        self.compress_level = PNG_COMPRESS_LEVEL if compress_level is None else compress_level
+        save_options(self.image_format)  # fail early on an unknown format
+        self.pending_bytes = 0
+        self.condition = threading.Condition()
+        self.tasks = queue.Queue()
+        self.errors = []
+        self.threads = [
+            threading.Thread(target=self._run, name=f"image-writer-{number}", daemon=True)
+            for number in range(threads or WRITER_THREADS)
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def debug_path(self, path):
+        """Where a debug image (raw capture, bounding box) meant for `path` is saved in this writer's format"""
+        return with_format(path, self.image_format)
+
+    def write(self, path, array, debug=False):
+        """
+        Save an RGB array now, on the calling thread: crops as PNG, debug images
+        in the writer's format (pass the path from debug_path()).
+        """
+        save_array(path, array, self.image_format if debug else 'png', self.compress_level)
+
+    def write_crop(self, path, array, key=None):
+        """Save a crop now, on the calling thread: into the store under `key` and/or as a loose PNG"""
+        save_crop(path, array, self.store, key, self.loose_crops, self.compress_level)
+
+    def submit(self, task, nbytes, description=""):
+        """
+        Queue `task()` (which saves one or more images) and the `nbytes` of image
+        data it keeps alive until it has run.
+        """
+        with self.condition:
+            # Always let one task through, however large, so a single huge capture can't deadlock
+            while self.pending_bytes and self.pending_bytes + nbytes > self.max_pending_bytes:
+                self.condition.wait()
+            self.pending_bytes += nbytes
+        self.tasks.put((task, nbytes, description))
+
+    def save(self, path, array, debug=False):
+        """Queue saving an RGB array at `path`"""
+        self.submit(lambda: self.write(path, array, debug), array.nbytes, path)
+
+    def _run(self):
+        while True:
+            job = self.tasks.get()
+            if job is None:
+                self.tasks.task_done()
+                return
+            task, nbytes, description = job
+            try:
+                task()
+            except Exception as e:
+                print(f"Failed to save {description}: {str(e)}")
+                self.errors.append((description, str(e)))
+            finally:
+                # Drop the task (and the images it holds) before signalling that its memory is free
+                job = task = None
+                with self.condition:
+                    self.pending_bytes -= nbytes
+                    self.condition.notify_all()
+                self.tasks.task_done()
+
+    def flush(self):
+        """Wait until every submitted task has run"""
+        self.tasks.join()
+
+    def close(self):
+        self.flush()
+        for _ in self.threads:
+            self.tasks.put(None)
+        for thread in self.threads:
+            thread.join()
@@ -1,8 +1,12 @@
 import os
+import sys
 import re
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import get_path
+
 # Directory containing the PDF files
-pdf_directory = r"C:\Users\clint\Desktop\Lifecycle Code\data\raw_pdfs"
+pdf_directory = get_path('raw_pdfs')
 
 # Helper function to convert month name to number
 def month_to_number(month_name):
@@ -0,0 +1,346 @@
+"""
+Disk cache of the regions the extractor renders, so contour detection can be
+re-tuned without re-rendering the PDFs.
+
+Each render is keyed by the PDF's content hash, the page index, the zoom and the
+clip rectangle, and saved as a raw .npy array (with a small .json sidecar saying
+where it came from) in data/render_cache/. The cache is an LRU with a size cap:
+hits refresh an entry's modification time and the least recently used entries
+are deleted once the cap is exceeded.
+
+    python extract_pdf_content.py --render-cache      # fill the cache while extracting
+    python render_cache.py sweep --threshold 220,230,240,250 --min-area 0.01,0.02,0.05
+    python render_cache.py stats
+    python render_cache.py clear
+
+The sweep runs find_plot_bbox with every combination of the given settings over
+every cached capture, in parallel processes, and reports per combination how many
+captures yield a plot, how many boxes are identical to or agree with those of the
+current settings and, for a synthetic corpus (--manifest), the overlap with the
+true chart rectangles. `sweep --detection-scale 1,2,4` checks the downscaled
+detection against the full-resolution contours.
+"""
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import itertools
+import threading
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import get_path
+from document_provider import shared_provider
+
+RENDER_CACHE = os.environ.get("LIFECYCLE_USE_RENDER_CACHE", "") == "1"
+RENDER_CACHE_MB = int(os.environ.get("LIFECYCLE_RENDER_CACHE_MB", "4096") or 4096)
+
+def clip_key(clip):
+    """Clip rectangle as it appears in cache keys ('page' for whole-page renders)"""
+    if clip is None:
+        return "page"
+    return ",".join(f"{value:.2f}" for value in tuple(clip))
+
+class RenderCache:
+    """
+    LRU cache of rendered RGB arrays on disk.
+
+    Parameters:
+        folder (str, optional): Cache folder (defaults to the 'render_cache' location)
+        max_mb (int, optional): Size cap in MB (defaults to RENDER_CACHE_MB)
+    """
+
+    def __init__(self, folder=None, max_mb=None):
+        self.folder = folder or get_path('render_cache')
+        self.max_bytes = (max_mb or RENDER_CACHE_MB) * 2 ** 20
+        self.hashes = {}  # (path, size, mtime) -> content hash
+        self.total_bytes = None  # size of the cached arrays, scanned on first put
+        self.lock = threading.Lock()
+
+    def pdf_hash(self, pdf_path):
+        stat = os.stat(pdf_path)
+        key = (os.path.abspath(pdf_path), stat.st_size, stat.st_mtime_ns)
+        digest = self.hashes.get(key)
+        if digest is None:
+            # Hash the memory map the extraction opens the document from, instead of reading the file again
+            with shared_provider().contents(pdf_path) as data:
+                digest = self.hashes[key] = hashlib.sha256(data).hexdigest()
+        return digest
+
+    def for_pdf(self, pdf_path):
+        """The cached renders of one PDF"""
+        return PdfRenders(self, pdf_path, self.pdf_hash(pdf_path))
+
+    def entry_path(self, pdf_hash, page_index, zoom, clip):
+        key = f"{pdf_hash}|{page_index}|{zoom:.4f}|{clip_key(clip)}"
+        name = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.folder, name[:2], name + ".npy")
+
+    def get(self, pdf_hash, page_index, zoom, clip):
+        """The cached render (a copy-on-write memory map), or None"""
+        path = self.entry_path(pdf_hash, page_index, zoom, clip)
+        try:
+            array = np.load(path, mmap_mode='c')
+        except (OSError, ValueError):
+            return None
+        try:
+            os.utime(path)  # most recently used
+        except OSError:
+            pass
+        return array
+
+    def put(self, pdf_hash, page_index, zoom, clip, array, **info):
+        """Save a render (atomically) with a sidecar describing it, then evict if over the cap"""
+        path = self.entry_path(pdf_hash, page_index, zoom, clip)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.save(f, np.ascontiguousarray(array))
+        os.replace(tmp_path, path)
+        meta = {
+            'pdf_hash': pdf_hash,
+            'page': page_index,
+            'zoom': zoom,
+            'clip': None if clip is None else [round(value, 2) for value in tuple(clip)],
+            'shape': list(array.shape),
+            'created': datetime.now().isoformat(timespec='seconds'),
+            **info,
+        }
+        with open(path[:-len(".npy")] + ".json", 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+
+        with self.lock:
+            if self.total_bytes is None:
+                self.total_bytes = sum(size for _, _, size in self._scan())
+            else:
+                self.total_bytes += os.path.getsize(path)
+            if self.total_bytes > self.max_bytes:
+                self.evict()
+
+    def _scan(self):
+        """(path, last used, size) of every cached array"""
+        files = []
+        if not os.path.isdir(self.folder):
+            return files
+        for folder, _, names in os.walk(self.folder):
+            for name in names:
+                if name.endswith(".npy"):
+                    path = os.path.join(folder, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    files.append((path, stat.st_mtime, stat.st_size))
+        return files
+
+    def evict(self, target_fraction=0.9):
+        """Delete the least recently used renders until the cache is below `target_fraction` of its cap"""
+        files = sorted(self._scan(), key=lambda entry: entry[1])
+        total = sum(size for _, _, size in files)
+        removed = 0
+        for path, _, size in files:
+            if total <= self.max_bytes * target_fraction:
+                break
+            for stale in (path, path[:-len(".npy")] + ".json"):
+                try:
+                    os.remove(stale)
+                except OSError:
+                    pass
+            total -= size
+            removed += 1
+        self.total_bytes = total
+        if removed:
+            print(f"Render cache: evicted {removed} renders, {total / 2 ** 20:.0f} MB left")
+        return removed
+
+    def entries(self):
+        """Metadata of every cached render, with 'path' pointing at its array"""
+        entries = []
+        for path, _, _ in self._scan():
+            try:
+                with open(path[:-len(".npy")] + ".json", 'r', encoding='utf-8') as f:
+                    meta = json.load(f)
+            except (OSError, ValueError):
+                continue
+            meta['path'] = path
+            entries.append(meta)
+        return sorted(entries, key=lambda meta: (meta.get('pdf_name', ''), meta['page'], meta.get('capture', '')))
+
+    def clear(self):
+        return self.evict(target_fraction=0)
+
+class PdfRenders:
+    """Cache lookups for one PDF (its content hash is computed once)"""
+
+    def __init__(self, cache, pdf_path, pdf_hash):
+        self.cache = cache
+        self.pdf_path = pdf_path
+        self.pdf_hash = pdf_hash
+
+    def get(self, page_index, zoom, clip):
+        return self.cache.get(self.pdf_hash, page_index, zoom, clip)
+
+    def put(self, page_index, zoom, clip, array, **info):
+        self.cache.put(self.pdf_hash, page_index, zoom, clip, array,
+                       pdf_path=self.pdf_path,
+                       pdf_name=os.path.splitext(os.path.basename(self.pdf_path))[0], **info)
+
+# One cache object per process, shared by every PDF it extracts
+_shared_cache = None
+
+def shared_cache():
+    global _shared_cache
+    if _shared_cache is None:
+        _shared_cache = RenderCache()
+    return _shared_cache
+
+# --- Crop-parameter sweep ---
+
+def box_iou(a, b):
+    """Intersection over union of two (x, y, w, h) boxes (0 if either is None)"""
+    if a is None or b is None:
+        return 0.0
+    x0, y0 = max(a[0], b[0]), max(a[1], b[1])
+    x1, y1 = min(a[0] + a[2], b[0] + b[2]), min(a[1] + a[3], b[1] + b[3])
+    intersection = max(0, x1 - x0) * max(0, y1 - y0)
+    union = a[2] * a[3] + b[2] * b[3] - intersection
+    return intersection / union if union else 0.0
+
+def truth_box(meta, manifest):
+    """The synthetic chart rectangle of a cached capture in its pixels, if it is on the captured page"""
+    row = manifest.get(meta.get('pdf_name'))
+    if row is None or int(row['chart_page']) != meta['page'] + 1:
+        return None
+    left, top = (meta['clip'][0], meta['clip'][1]) if meta['clip'] else (0, 0)
+    zoom = meta['zoom']
+    x0, y0 = (float(row['chart_x0']) - left) * zoom, (float(row['chart_y0']) - top) * zoom
+    x1, y1 = (float(row['chart_x1']) - left) * zoom, (float(row['chart_y1']) - top) * zoom
+    return (round(x0), round(y0), round(x1 - x0), round(y1 - y0))
+
+def _sweep_capture(meta, grid):
+    """Process-pool worker: the plot box of one cached capture under the current settings and every grid setting"""
+    import cv2
+    import extract_pdf_content
+    rgb = np.load(meta['path'], mmap_mode='r')
+    gray = cv2.cvtColor(np.asarray(rgb), cv2.COLOR_RGB2GRAY)
+    return extract_pdf_content.find_plot_bbox(gray), [extract_pdf_content.find_plot_bbox(gray, params) for params in grid]
+
+def parse_values(text):
+    """'220,230.5' -> [220, 230.5]"""
+    if not text:
+        return None
+    values = [float(value) for value in text.split(",")]
+    return [int(value) if value.is_integer() else value for value in values]
+
+def sweep(grid, cache=None, manifest_path=None, workers=None, output_path=None):
+    """
+    Evaluate crop settings over every cached capture.
+
+    Parameters:
+        grid (list): dicts of find_plot_bbox settings (missing keys use CROP_PARAMS)
+        manifest_path (str, optional): Synthetic corpus manifest with the true chart rectangles
+
+    Returns:
+        list: One result dict per setting, best first
+    """
+    import csv
+    cache = cache or RenderCache()
+    entries = cache.entries()
+    if not entries:
+        print(f"No cached renders in {cache.folder}; run the extraction with --render-cache first")
+        return []
+
+    manifest = {}
+    if manifest_path:
+        with open(manifest_path, 'r', newline='', encoding='utf-8') as f:
+            manifest = {row['pdf_name']: row for row in csv.DictReader(f)}
+    truths = [truth_box(meta, manifest) for meta in entries]
+
+    print(f"Sweeping {len(grid)} settings over {len(entries)} cached captures")
+    start = time.time()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        boxes = list(pool.map(_sweep_capture, entries, [grid] * len(entries), chunksize=4))
+    print(f"Evaluated {len(grid) * len(entries)} detections in {time.time() - start:.1f}s")
+
+    results = []
+    for number, params in enumerate(grid):
+        found = same = agree = 0
+        ious = []
+        for (current, candidates), truth in zip(boxes, truths):
+            box = candidates[number]
+            found += box is not None
+            same += box == current
+            agree += (box is None and current is None) or box_iou(box, current) >= 0.9
+            if truth is not None:
+                ious.append(box_iou(box, truth))
+        results.append({
+            **params,
+            'captures': len(entries),
+            'found': found,
+            'same_as_current': same,
+            'agree_with_current': agree,
+            'truth_captures': len(ious),
+            'mean_truth_iou': round(float(np.mean(ious)), 4) if ious else None,
+        })
+    results.sort(key=lambda row: (row['mean_truth_iou'] or 0, row['found'], row['agree_with_current']), reverse=True)
+
+    if output_path is None:
+        output_path = get_path('metrics', f"crop_sweep_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv")
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    with open(output_path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=list(results[0]))
+        writer.writeheader()
+        writer.writerows(results)
+    print(f"Sweep results saved to {output_path}")
+    return results
+
+def sweep_grid(args):
+    """Every combination of the values given on the command line"""
+    import extract_pdf_content
+    axes = {name: values for name, values in [
+        ('threshold', parse_values(args.threshold)),
+        ('min_area', parse_values(args.min_area)),
+        ('max_area', parse_values(args.max_area)),
+        ('min_aspect', parse_values(args.min_aspect)),
+        ('max_aspect', parse_values(args.max_aspect)),
+        ('detection_scale', parse_values(args.detection_scale)),
+        ('close_kernel', parse_values(args.close_kernel)),
+    ] if values}
+    if not axes:
+        return [dict(extract_pdf_content.CROP_PARAMS)]
+    names = list(axes)
+    return [dict(zip(names, combination)) for combination in itertools.product(*(axes[name] for name in names))]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage the render cache and sweep crop settings over it")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    sweep_parser = subparsers.add_parser("sweep", help="Evaluate contour detection settings over the cached captures")
+    sweep_parser.add_argument("--threshold", help="Comma-separated gray thresholds, e.g. 220,230,240")
+    sweep_parser.add_argument("--min-area", help="Comma-separated minimum areas (fraction of the capture)")
+    sweep_parser.add_argument("--max-area", help="Comma-separated maximum areas (fraction of the capture)")
+    sweep_parser.add_argument("--min-aspect", help="Comma-separated minimum width/height ratios")
+    sweep_parser.add_argument("--max-aspect", help="Comma-separated maximum width/height ratios")
+    sweep_parser.add_argument("--detection-scale", help="Comma-separated downscaling factors of the detection (1 = full resolution)")
+    sweep_parser.add_argument("--close-kernel", help="Comma-separated closing sizes for downscaled detection")
+    sweep_parser.add_argument("--manifest", help="manifest.csv of a synthetic corpus, to score against the true charts")
+    sweep_parser.add_argument("--workers", type=int, default=None, help="Parallel processes")
+    sweep_parser.add_argument("--top", type=int, default=10, help="Number of settings to print")
+    subparsers.add_parser("stats", help="Show the size of the cache")
+    subparsers.add_parser("clear", help="Delete every cached render")
+    args = parser.parse_args()
+
+    cache = RenderCache()
+    if args.command == "stats":
+        files = cache._scan()
+        print(f"{len(files)} renders, {sum(size for _, _, size in files) / 2 ** 20:.0f} MB "
+              f"(cap {cache.max_bytes / 2 ** 20:.0f} MB) in {cache.folder}")
+    elif args.command == "clear":
+        print(f"Deleted {cache.clear()} renders from {cache.folder}")
+    else:
+        results = sweep(sweep_grid(args), cache, args.manifest, args.workers)
+        for row in results[:args.top]:
+            print(", ".join(f"{name}={value}" for name, value in row.items()))
@@ -0,0 +1,110 @@
+"""
+Tiled rendering of captures too large to render in one piece.
+
+A full-page capture of a large-format or high-DPI page can need hundreds of MB
+for a single RGB buffer. Instead, the capture is rendered as fixed-size tiles
+(page.get_pixmap with a clip), and each tile is thresholded and max-pooled into
+one small binary mask of the whole capture before the next tile is rendered.
+Shapes that cross tile seams join up in the mask, so the plot is detected on it
+as on any downscaled capture (find_plot_bbox_downscaled), and only the plot's own
+region is then rendered at full resolution to be cropped.
+
+The mask is capped at MASK_PIXELS (the downscaling factor grows with the capture),
+so apart from the crop itself the memory needed is the same for any page size.
+
+    LIFECYCLE_TILED_RENDER_MB=256    tile captures that would need more than this (0 = never)
+    LIFECYCLE_TILE_SIZE=1024         tile width and height in pixels
+
+MuPDF renders a clipped region with the same pixels as the whole page, so the
+tiles put together match a single render, except that embedded raster images can
+be resampled slightly differently near tile edges.
+"""
+import os
+import math
+import fitz  # PyMuPDF
+import numpy as np
+import cv2
+
+TILED_RENDER_MB = int(os.environ.get("LIFECYCLE_TILED_RENDER_MB", "256") or 0)
+TILE_SIZE = int(os.environ.get("LIFECYCLE_TILE_SIZE", "1024") or 1024)
+# Largest downscaled mask of a tiled capture (bytes, one per pixel)
+MASK_PIXELS = 4 * 2 ** 20
+
+def capture_irect(page, zoom, clip=None):
+    """Pixel rectangle of a capture of `clip` (the whole page if None) at `zoom`, as MuPDF renders it"""
+    return ((clip if clip is not None else page.rect) * fitz.Matrix(zoom, zoom)).irect
+
+def needs_tiling(irect, bytes_per_pixel, memory_budget_mb=0):
+    """
+    Whether a capture should be tiled: it would hold more than TILED_RENDER_MB,
+    or more than half of the process's memory budget.
+    """
+    if not TILED_RENDER_MB:
+        return False
+    needed = irect.width * irect.height * bytes_per_pixel
+    if memory_budget_mb and needed > memory_budget_mb * 2 ** 20 / 2:
+        return True
+    return needed > TILED_RENDER_MB * 2 ** 20
+
+def mask_scale(width, height, scale=1):
+    """Downscaling factor of the mask of a width x height capture: at least `scale` and 2, and enough to fit MASK_PIXELS"""
+    return max(scale, 2, math.ceil(math.sqrt(width * height / MASK_PIXELS)))
+
+def max_pool(binary, scale):
+    """Downscale a binary image by `scale`: a pixel is foreground if any pixel of its scale x scale block is"""
+    # Dilating with the kernel anchored at its corner puts each block's maximum in its top-left pixel
+    pooled = cv2.dilate(binary, np.ones((scale, scale), np.uint8), anchor=(0, 0))
+    return np.ascontiguousarray(pooled[::scale, ::scale])
+
+def render_region(page, zoom, irect, box, clip=None):
+    """
+    Render the part (left, top, right, bottom) of a capture of `clip`, in the
+    capture's pixels (relative to `irect`).
+
+    Returns:
+        tuple: (pixmap, height x width x 3 view of its samples)
+    """
+    left, top, right, bottom = box
+    x0, y0 = irect.x0 + left, irect.y0 + top
+    x1, y1 = irect.x0 + right, irect.y0 + bottom
+    region = fitz.Rect(x0 / zoom, y0 / zoom, x1 / zoom, y1 / zoom)
+    if clip is not None:
+        # The capture's edges may fall inside a pixel, which is then only partly drawn
+        region &= clip
+    pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), clip=region)
+    rgb = np.frombuffer(pix.samples_mv, dtype=np.uint8).reshape(pix.height, pix.width, pix.n)
+    # The clip maps onto whole pixels, but keep to the requested box in case MuPDF rounds outwards
+    if (pix.x, pix.y, pix.width, pix.height) != (x0, y0, x1 - x0, y1 - y0):
+        rgb = np.ascontiguousarray(rgb[y0 - pix.y:y1 - pix.y, x0 - pix.x:x1 - pix.x])
+    return pix, rgb
+
+def render_tiles(page, zoom, irect, clip=None, tile_size=None):
+    """
+    Render a capture of `clip` tile by tile, row by row.
+
+    Yields:
+        tuple: (left, top, RGB view) of each tile, in the capture's pixels; a
+            tile's view is only valid until the next one is rendered
+    """
+    tile_size = tile_size or TILE_SIZE
+    for top in range(0, irect.height, tile_size):
+        for left in range(0, irect.width, tile_size):
+            box = (left, top, min(left + tile_size, irect.width), min(top + tile_size, irect.height))
+            pix, rgb = render_region(page, zoom, irect, box, clip)
+            yield left, top, rgb
+            del pix, rgb
+
+def pooled_mask(page, zoom, irect, clip, threshold, scale, tile_size=None):
+    """
+    The binary mask (foreground 255: gray level at or below `threshold`) of a
+    capture of `clip`, max-pooled by `scale`, built one tile at a time.
+    """
+    # Tiles cover whole pooling blocks, so each tile pools on its own
+    tile_size = max(scale, (tile_size or TILE_SIZE) // scale * scale)
+    mask = np.zeros((-(-irect.height // scale), -(-irect.width // scale)), np.uint8)
+    for left, top, rgb in render_tiles(page, zoom, irect, clip, tile_size):
+        gray = cv2.cvtColor(rgb, cv2.COLOR_RGB2GRAY)
+        _, binary = cv2.threshold(gray, threshold, 255, cv2.THRESH_BINARY_INV)
+        pooled = max_pool(binary, scale)
+        mask[top // scale:top // scale + pooled.shape[0], left // scale:left // scale + pooled.shape[1]] = pooled
+    return mask
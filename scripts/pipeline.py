@@ -0,0 +1,434 @@
+"""
+Run the data pipeline end to end, re-running only the stages whose inputs changed.
+
+Stages (in dependency order):
+    scrape   - Link Scraper scripts (manual: only run when asked for)
+    download - download_pdf_links.py
+    rename   - pdf_renamer.py
+    extract  - extract_pdf_content.py, per PDF
+    digitize - run_graph2table.py, per chart image
+    combine  - combine_graph2table_output.py (incremental)
+
+Every stage is fingerprinted with the content hashes of its input files, of the
+scripts that implement it and of its parameters. The fingerprints of the last
+successful run are kept in data/pipeline_state.json; a stage runs again only when
+its fingerprint changes. Per-item stages fingerprint each PDF/image separately and
+only process the new or changed ones.
+
+Usage:
+    python scripts/pipeline.py                  # run every stale stage
+    python scripts/pipeline.py --status         # only report which stages are stale
+    python scripts/pipeline.py extract combine  # limit the run to some stages
+    python scripts/pipeline.py --with-scrapers  # also re-scrape the PDF links
+"""
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import threading
+import subprocess
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+from config import get_path
+import image_store
+
+STATE_FILENAME = "pipeline_state.json"
+
+class FileHasher:
+    """
+    Content hashes of files, remembered by (size, mtime) so unchanged files are
+    not read again on the next run.
+    """
+
+    def __init__(self, known=None):
+        self.known = dict(known or {})
+        self.lock = threading.Lock()
+
+    def hash(self, path):
+        stat = os.stat(path)
+        key = os.path.abspath(path)
+        with self.lock:
+            entry = self.known.get(key)
+        if entry is not None and entry[0] == stat.st_size and entry[1] == stat.st_mtime_ns:
+            return entry[2]
+
+        sha256 = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                sha256.update(chunk)
+        digest = sha256.hexdigest()
+        with self.lock:
+            self.known[key] = [stat.st_size, stat.st_mtime_ns, digest]
+        return digest
+
+def combine_hashes(parts):
+    """Hash of a JSON-serializable description of everything a result depends on"""
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode('utf-8')).hexdigest()
+
+class Stage:
+    """
+    One step of the pipeline.
+
+    Parameters:
+        name (str): Stage name used on the command line and in the state file
+        deps (list): Names of the stages that must finish first
+        scripts (list): Script paths (relative to scripts/) implementing the stage
+        inputs (callable): root -> list of input files (whole-stage fingerprint)
+        run (callable): (root, workers) -> None, runs the whole stage
+        items (callable): root -> list of item files, for per-item stages
+        run_items (callable): (root, item paths, workers) -> list of item paths that completed
+        params (dict): Parameters that change the stage's output
+        manual (bool): Inputs live outside the repository (websites), so the
+            stage can't be fingerprinted and only runs when requested
+        names_only (bool): Fingerprint the input file names rather than contents,
+            recorded after the run (for stages that rename their own inputs)
+    """
+
+    def __init__(self, name, deps, scripts, inputs=None, run=None, items=None, run_items=None,
+                 params=None, manual=False, names_only=False):
+        self.name = name
+        self.deps = deps
+        self.scripts = scripts
+        self.inputs = inputs
+        self.run = run
+        self.items = items
+        self.run_items = run_items
+        self.params = params or {}
+        self.manual = manual
+        self.names_only = names_only
+
+    @property
+    def per_item(self):
+        return self.items is not None
+
+def list_files(folder, extensions):
+    if not os.path.isdir(folder):
+        return []
+    return sorted(
+        os.path.join(folder, name) for name in os.listdir(folder)
+        if name.lower().endswith(extensions) and os.path.isfile(os.path.join(folder, name))
+    )
+
+def run_script(relative_path):
+    """Run one of the repository scripts as its own process, from its own folder"""
+    script_path = os.path.join(SCRIPTS_DIR, relative_path)
+    print(f"Running {relative_path}")
+    subprocess.run([sys.executable, script_path], cwd=os.path.dirname(script_path), check=True)
+
+def import_from(relative_dir, module_name):
+    """Import a script module from a scripts/ subfolder (some have spaces in their names)"""
+    folder = os.path.join(SCRIPTS_DIR, relative_dir)
+    if folder not in sys.path:
+        sys.path.insert(0, folder)
+    return __import__(module_name)
+
+SCRAPER_SCRIPTS = [
+    os.path.join("pdfs", "Link Scraper", "official_website_scrape_links.py"),
+    os.path.join("pdfs", "Link Scraper", "jdpower_history_scrape_links.py"),
+    os.path.join("pdfs", "Link Scraper", "dorking_scrape_links.py"),
+]
+
+def run_scrapers(root, workers):
+    # The scrapers hit different websites, so they can run side by side
+    with ThreadPoolExecutor(max_workers=min(workers, len(SCRAPER_SCRIPTS))) as pool:
+        for future in [pool.submit(run_script, script) for script in SCRAPER_SCRIPTS]:
+            future.result()
+    print("Links scraped. Review and merge them into data/pdf_links/combined/combined_pdf_links.csv "
+          "before the download stage picks them up.")
+
+def _extract_one(pdf_path, output_dir, error_log_path):
+    """Process-pool worker: extract the charts of one PDF (LIFECYCLE_CHART_TARGETS, retail price by default)"""
+    extract_pdf_content = import_from("pdfs", "extract_pdf_content")
+    charts = extract_pdf_content.extract_charts(pdf_path, output_dir=output_dir, error_log_path=error_log_path)
+    unsaved = [path for results, _ in charts.values() for path, _ in results.get('save_errors', [])]
+    if unsaved:
+        # Leave the PDF stale so the next run extracts it again
+        raise RuntimeError(f"Could not save {', '.join(os.path.basename(path) for path in unsaved)}")
+    return pdf_path
+
+def run_extract(root, pdf_paths, workers):
+    output_dir = get_path('extracted_images')
+    error_log_path = get_path('extraction_logs', "extraction_errors.csv")
+    os.makedirs(os.path.dirname(error_log_path), exist_ok=True)
+
+    done = []
+    # PDFs are independent, so they are extracted in parallel processes
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(_extract_one, path, output_dir, error_log_path): path for path in pdf_paths}
+        for future in futures:
+            try:
+                done.append(future.result())
+            except Exception as e:
+                print(f"ERROR: Failed to process {os.path.basename(futures[future])}: {str(e)}")
+
+    extract_pdf_content = import_from("pdfs", "extract_pdf_content")
+    extract_pdf_content.generate_combined_html_report(output_dir, list_files(get_path('raw_pdfs'), ('.pdf',)))
+    return done
+
+def list_images(root):
+    """The extracted images to digitize, with loose files for the charts that are only packed"""
+    image_store.export_missing(get_path('extracted_images'))
+    return list_files(get_path('extracted_images'), ('.png', '.jpg', '.jpeg', '.gif', '.bmp'))
+
+def run_digitize(root, image_paths, workers):
+    # Graph2Table is driven through one browser and picks up the newest file in
+    # Downloads, so images are always uploaded one at a time
+    run_graph2table = import_from("graph2table AI", "run_graph2table")
+    return run_graph2table.process_all_images(image_paths)
+
+def run_combine(root, workers):
+    combine = import_from("graph2table AI", "combine_graph2table_output")
+    chart_targets = import_from("pdfs", "chart_targets")
+    # One combined file per extracted chart target (combined_data.csv for the retail price chart)
+    for target in chart_targets.select_targets():
+        combine.combine_csv_files_incremental(
+            get_path('graph2table_raw'),
+            get_path('graph2table'),
+            target.name,
+        )
+
+# Every module the extraction's output depends on: a change to any of them re-extracts the PDFs
+EXTRACT_SCRIPTS = [
+    os.path.join("pdfs", "extract_pdf_content.py"),
+    os.path.join("pdfs", "chart_targets.py"),
+    os.path.join("pdfs", "tiled_render.py"),
+    os.path.join("pdfs", "image_writer.py"),
+    os.path.join("pdfs", "render_cache.py"),
+    os.path.join("pdfs", "document_provider.py"),
+    "image_store.py",
+]
+
+# Settings that change the extracted images (same defaults as the extraction modules)
+EXTRACT_PARAMS = {
+    'relaxed_detection': True,
+    'chart_targets': os.environ.get("LIFECYCLE_CHART_TARGETS", "") or "retail_price",
+    'detection_scale': int(os.environ.get("LIFECYCLE_DETECTION_SCALE", "1") or 1),
+    'image_format': os.environ.get("LIFECYCLE_IMAGE_FORMAT", "png").lower(),
+    'debug_images': os.environ.get("LIFECYCLE_DEBUG_IMAGES", "") == "1",
+    'loose_images': os.environ.get("LIFECYCLE_LOOSE_IMAGES", "1") != "0",
+    'tiled_render_mb': int(os.environ.get("LIFECYCLE_TILED_RENDER_MB", "256") or 0),
+}
+
+STAGES = [
+    Stage("scrape", [], SCRAPER_SCRIPTS, run=run_scrapers, manual=True),
+    Stage("download", ["scrape"], [os.path.join("pdfs", "download_pdf_links.py")],
+          inputs=lambda root: [get_path('pdf_links', "combined", "combined_pdf_links.csv")],
+          run=lambda root, workers: run_script(os.path.join("pdfs", "download_pdf_links.py"))),
+    Stage("rename", ["download"], [os.path.join("pdfs", "pdf_renamer.py")],
+          inputs=lambda root: list_files(get_path('raw_pdfs'), ('.pdf',)),
+          run=lambda root, workers: run_script(os.path.join("pdfs", "pdf_renamer.py")),
+          names_only=True),
+    Stage("extract", ["rename"], EXTRACT_SCRIPTS,
+          items=lambda root: list_files(get_path('raw_pdfs'), ('.pdf',)),
+          run_items=run_extract,
+          params=EXTRACT_PARAMS),
+    Stage("digitize", ["extract"],
+          [os.path.join("graph2table AI", "run_graph2table.py"), os.path.join("utils", "image_dedup.py"),
+           os.path.join("pdfs", "chart_targets.py")],
+          items=list_images,
+          run_items=run_digitize),
+    Stage("combine", ["digitize"],
+          [os.path.join("graph2table AI", "combine_graph2table_output.py"), os.path.join("pdfs", "chart_targets.py")],
+          inputs=lambda root: list_files(get_path('graph2table_raw'), ('.csv',)),
+          run=run_combine,
+          params={'chart_targets': EXTRACT_PARAMS['chart_targets']}),
+]
+
+class Pipeline:
+    def __init__(self, root=None, stages=STAGES, workers=None):
+        self.root = root if root is not None else get_path('root')
+        self.stages = {stage.name: stage for stage in stages}
+        self.workers = workers or os.cpu_count() or 1
+        self.state_path = get_path('data', STATE_FILENAME)
+        self.state = self.load_state()
+        self.hasher = FileHasher(self.state.get('file_hashes'))
+        self.lock = threading.Lock()
+
+    def load_state(self):
+        if os.path.exists(self.state_path):
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        return {'stages': {}, 'file_hashes': {}}
+
+    def save_state(self):
+        with self.lock:
+            self.state['file_hashes'] = self.hasher.known
+            tmp_path = self.state_path + ".tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.state, f, indent=2, sort_keys=True)
+            os.replace(tmp_path, self.state_path)
+
+    def relative(self, path):
+        return os.path.relpath(path, self.root).replace(os.sep, '/')
+
+    def code_fingerprint(self, stage):
+        """Hash of the stage's scripts and parameters"""
+        return combine_hashes({
+            'scripts': {script.replace(os.sep, '/'): self.hasher.hash(os.path.join(SCRIPTS_DIR, script))
+                        for script in stage.scripts},
+            'params': stage.params,
+        })
+
+    def stage_fingerprint(self, stage):
+        paths = [path for path in stage.inputs(self.root) if os.path.exists(path)]
+        if stage.names_only:
+            inputs = sorted(self.relative(path) for path in paths)
+        else:
+            inputs = {self.relative(path): self.hasher.hash(path) for path in paths}
+        return combine_hashes({'code': self.code_fingerprint(stage), 'inputs': inputs})
+
+    def item_fingerprints(self, stage):
+        code = self.code_fingerprint(stage)
+        return {self.relative(path): combine_hashes({'code': code, 'input': self.hasher.hash(path)})
+                for path in stage.items(self.root)}
+
+    def stale_items(self, stage, fingerprints):
+        recorded = self.state['stages'].get(stage.name, {}).get('items', {})
+        return [item for item, fingerprint in fingerprints.items() if recorded.get(item) != fingerprint]
+
+    def status(self, stage):
+        """Human readable staleness of a stage"""
+        if stage.manual:
+            last = self.state['stages'].get(stage.name, {}).get('completed')
+            return f"manual (last run {last})" if last else "manual (never run)"
+        if stage.per_item:
+            fingerprints = self.item_fingerprints(stage)
+            stale = self.stale_items(stage, fingerprints)
+            return f"stale ({len(stale)} of {len(fingerprints)} items)" if stale else "up to date"
+        recorded = self.state['stages'].get(stage.name, {}).get('fingerprint')
+        return "up to date" if recorded == self.stage_fingerprint(stage) else "stale"
+
+    def run_stage(self, stage, force=False):
+        """Run one stage if it is stale; returns True when it ran"""
+        start_time = time.time()
+        record = {'completed': datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
+
+        if stage.per_item:
+            fingerprints = self.item_fingerprints(stage)
+            stale = list(fingerprints) if force else self.stale_items(stage, fingerprints)
+            if not stale:
+                print(f"[{stage.name}] up to date ({len(fingerprints)} items)")
+                return False
+            print(f"[{stage.name}] processing {len(stale)} of {len(fingerprints)} items")
+            done = stage.run_items(self.root, [os.path.join(self.root, item) for item in stale], self.workers) or []
+
+            # Keep fingerprints of items that still exist; only completed items get the new one
+            previous = self.state['stages'].get(stage.name, {}).get('items', {})
+            items = {item: previous[item] for item in fingerprints if item in previous}
+            for path in done:
+                item = self.relative(path)
+                if item in fingerprints:
+                    items[item] = fingerprints[item]
+            record['items'] = items
+            if len(done) < len(stale):
+                print(f"[{stage.name}] {len(stale) - len(done)} items did not complete and stay stale")
+        else:
+            fingerprint = None if stage.manual else self.stage_fingerprint(stage)
+            recorded = self.state['stages'].get(stage.name, {}).get('fingerprint')
+            if not force and not stage.manual and fingerprint == recorded:
+                print(f"[{stage.name}] up to date")
+                return False
+            print(f"[{stage.name}] running")
+            stage.run(self.root, self.workers)
+            if stage.names_only:
+                fingerprint = self.stage_fingerprint(stage)
+            record['fingerprint'] = fingerprint
+
+        with self.lock:
+            self.state['stages'][stage.name] = record
+        self.save_state()
+        print(f"[{stage.name}] finished in {time.time() - start_time:.1f} s")
+        return True
+
+    def upstream(self, name):
+        """All stages `name` depends on, directly or through other stages"""
+        found = set()
+        stack = list(self.stages[name].deps)
+        while stack:
+            dep = stack.pop()
+            if dep not in found:
+                found.add(dep)
+                stack.extend(self.stages[dep].deps)
+        return found
+
+    def run(self, selected, force=False):
+        """
+        Run the selected stages in dependency order. Stages whose dependencies are
+        all finished (or not selected) run concurrently; a failed stage skips
+        everything downstream of it.
+        """
+        pending = {name: self.stages[name] for name in selected}
+        finished = set()
+        failed = set()
+
+        with ThreadPoolExecutor(max_workers=len(pending) or 1) as pool:
+            running = {}
+            while pending or running:
+                for name, stage in list(pending.items()):
+                    # Unselected stages in between still order the selected ones
+                    deps = [dep for dep in self.upstream(name) if dep in selected]
+                    if any(dep in failed for dep in deps):
+                        print(f"[{name}] skipped because an upstream stage failed")
+                        failed.add(name)
+                        del pending[name]
+                    elif all(dep in finished for dep in deps):
+                        running[pool.submit(self.run_stage, stage, force)] = name
+                        del pending[name]
+
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        future.result()
+                        finished.add(name)
+                    except Exception as e:
+                        print(f"[{name}] FAILED: {e}")
+                        failed.add(name)
+
+        return finished, failed
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the stale stages of the data pipeline")
+    parser.add_argument("stages", nargs="*", help=f"Stages to consider (default: all but scrape). "
+                                                  f"Choices: {', '.join(stage.name for stage in STAGES)}")
+    parser.add_argument("--root", default=None,
+                        help="Repository root containing data/ (overrides LIFECYCLE_ROOT and lifecycle.ini)")
+    parser.add_argument("--with-scrapers", action="store_true", help="Also run the Link Scraper scripts")
+    parser.add_argument("--status", action="store_true", help="Report which stages are stale without running them")
+    parser.add_argument("--force", action="store_true", help="Run the selected stages even if up to date")
+    parser.add_argument("--workers", type=int, default=None, help="Parallel workers for per-item stages")
+    args = parser.parse_args()
+
+    if args.root:
+        # Exported so the scripts run as subprocesses resolve the same folders
+        os.environ['LIFECYCLE_ROOT'] = os.path.abspath(args.root)
+    pipeline = Pipeline(workers=args.workers)
+
+    unknown = [name for name in args.stages if name not in pipeline.stages]
+    if unknown:
+        parser.error(f"Unknown stages: {', '.join(unknown)}")
+
+    if args.stages:
+        selected = args.stages
+    else:
+        selected = [stage.name for stage in STAGES if not stage.manual or args.with_scrapers]
+
+    if args.status:
+        for name in selected:
+            print(f"{name:10s} {pipeline.status(pipeline.stages[name])}")
+        pipeline.save_state()
+        sys.exit()
+
+    start_time = time.time()
+    finished, failed = pipeline.run(selected, force=args.force)
+    print(f"\nPipeline finished in {(time.time() - start_time) / 60:.1f} minutes")
+    if failed:
+        print(f"Failed stages: {', '.join(sorted(failed))}")
+        sys.exit(1)
@@ -0,0 +1,288 @@
+"""
+Split extraction (or digitization) across machines and merge the results.
+
+Each machine runs one shard; items are assigned to shards by a hash of their
+file name, so every machine computes the same partition without coordination:
+
+    python scripts/shard.py run --shard 1/4                      # extract PDFs of shard 1 of 4
+    python scripts/shard.py run --shard 1/4 --stage digitize     # digitize the charts of shard 1
+    python scripts/shard.py merge                                # fold data/shards/* into data/
+
+Shard outputs go to data/shards/shard_<i>_of_<N>/ (extracted_images/ and
+csv_data/graph2table/); copy those folders from every machine into data/shards/
+before merging. Folders are resolved through scripts/config.py, so each machine
+can point LIFECYCLE_ROOT (or lifecycle.ini) at its own checkout.
+"""
+import os
+import sys
+import csv
+import glob
+import shutil
+import hashlib
+import argparse
+import filecmp
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from config import get_path
+import image_store
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif', '.bmp')
+
+def parse_shard(text):
+    """Parse 'i/N' (1-based) into (i, N)"""
+    try:
+        index, count = (int(part) for part in text.split('/'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Shard must look like i/N, got {text!r}")
+    if count < 1 or not 1 <= index <= count:
+        raise argparse.ArgumentTypeError(f"Shard index must be between 1 and N, got {text!r}")
+    return index, count
+
+def shard_of(filename, count):
+    """1-based shard of a file, from a stable hash of its name (independent of folder and machine)"""
+    digest = hashlib.sha1(os.path.basename(filename).encode('utf-8')).hexdigest()
+    return int(digest, 16) % count + 1
+
+def shard_files(folder, extensions, index, count):
+    names = sorted(name for name in os.listdir(folder)
+                   if name.lower().endswith(extensions) and os.path.isfile(os.path.join(folder, name)))
+    return [os.path.join(folder, name) for name in names if shard_of(name, count) == index]
+
+def shard_dir(index, count):
+    return get_path('shards', f"shard_{index}_of_{count}")
+
+def _extract_one(pdf_path, output_dir, error_log_path):
+    import extract_pdf_content
+    charts = extract_pdf_content.extract_charts(pdf_path, output_dir=output_dir, error_log_path=error_log_path)
+    unsaved = [path for results, _ in charts.values() for path, _ in results.get('save_errors', [])]
+    if unsaved:
+        raise RuntimeError(f"Could not save {', '.join(os.path.basename(path) for path in unsaved)}")
+
+def run_extract_shard(index, count, workers=None):
+    pdf_paths = shard_files(get_path('raw_pdfs'), ('.pdf',), index, count)
+    print(f"Shard {index}/{count}: {len(pdf_paths)} PDFs")
+
+    # Point the image folders at the shard before the extraction code resolves them;
+    # worker processes inherit the environment
+    os.environ['LIFECYCLE_EXTRACTED_IMAGES'] = os.path.join(shard_dir(index, count), "extracted_images")
+    output_dir = get_path('extracted_images')
+    error_log_path = get_path('extraction_logs', "extraction_errors.csv")
+    os.makedirs(os.path.dirname(error_log_path), exist_ok=True)
+
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "pdfs"))
+    failed = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(_extract_one, path, output_dir, error_log_path): path for path in pdf_paths}
+        for future, path in futures.items():
+            try:
+                future.result()
+            except Exception as e:
+                print(f"ERROR: Failed to process {os.path.basename(path)}: {str(e)}")
+                failed.append(path)
+
+    print(f"\nShard {index}/{count} written to {output_dir} ({len(failed)} PDFs failed)")
+
+def run_digitize_shard(index, count):
+    # Charts only in the packed store are given loose files, so they are assigned to shards too
+    image_store.export_missing(get_path('extracted_images'))
+    image_paths = shard_files(get_path('extracted_images'), IMAGE_EXTENSIONS, index, count)
+    print(f"Shard {index}/{count}: {len(image_paths)} images")
+
+    # Keep checking duplicates against the shared Raw and graph2table CSVs, but write new CSVs to the shard
+    main_dir = get_path('graph2table')
+    os.environ['LIFECYCLE_GRAPH2TABLE_RAW'] = get_path('graph2table_raw')
+    os.environ['LIFECYCLE_GRAPH2TABLE'] = os.path.join(shard_dir(index, count), "csv_data", "graph2table")
+    os.makedirs(get_path('graph2table'), exist_ok=True)
+
+    # Imported after the override, so the digitized records are kept in the shard
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "graph2table AI"))
+    import run_graph2table
+    import image_dedup
+
+    # Start from the main record of digitized images (the shard's own entries win),
+    # so charts digitized before aren't uploaded again
+    main_records = image_dedup.load_digitized(os.path.join(main_dir, image_dedup.RECORDS_FILENAME))
+    records = image_dedup.load_digitized(image_dedup.DEFAULT_RECORDS_PATH)
+    same_settings = (main_records['method'], main_records['hash_size']) == (records['method'], records['hash_size'])
+    if main_records['images'] and same_settings:
+        records['images'] = {**main_records['images'], **records['images']}
+        image_dedup.save_digitized(records, image_dedup.DEFAULT_RECORDS_PATH)
+
+    run_graph2table.process_all_images(image_paths, extra_csv_dirs=[main_dir])
+
+def append_csv(source_path, target_path):
+    """Append the rows of one CSV log to another, writing the header only once"""
+    with open(source_path, 'r', newline='', encoding='utf-8') as f:
+        rows = list(csv.reader(f))
+    if not rows:
+        return 0
+    target_exists = os.path.isfile(target_path) and os.path.getsize(target_path) > 0
+    with open(target_path, 'a', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerows(rows[1:] if target_exists else rows)
+    return len(rows) - 1
+
+def unique_path(source_path, target_dir):
+    """
+    Where copy_unique puts a file in target_dir, and whether an identical file
+    is already there.
+    """
+    name = os.path.basename(source_path)
+    base_name, extension = os.path.splitext(name)
+    target_path = os.path.join(target_dir, name)
+    counter = 1
+    while os.path.exists(target_path):
+        if filecmp.cmp(source_path, target_path, shallow=False):
+            return target_path, True
+        counter += 1
+        target_path = os.path.join(target_dir, f"{base_name}_{counter}{extension}")
+    return target_path, False
+
+def copy_unique(source_path, target_dir):
+    """
+    Copy a file into target_dir. An identical file already there is left alone;
+    a different file with the same name gets a _2, _3, ... suffix.
+    """
+    target_path, exists = unique_path(source_path, target_dir)
+    if exists:
+        return None
+    shutil.copy2(source_path, target_path)
+    return target_path
+
+def merge_digitized(source_dir, target_dir):
+    """
+    Merge the CSVs of the images a shard digitized and fold its record of
+    digitized images into the main one, following any CSV renamed on the way.
+    A CSV that replaces the one already recorded for the same image overwrites it.
+    Returns the number of CSVs copied and the names of the files handled.
+    """
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "utils"))
+    import image_dedup
+
+    source_records_path = os.path.join(source_dir, image_dedup.RECORDS_FILENAME)
+    if not os.path.exists(source_records_path):
+        return 0, set()
+    target_records_path = os.path.join(target_dir, image_dedup.RECORDS_FILENAME)
+    source = image_dedup.load_digitized(source_records_path)
+    target = image_dedup.load_digitized(target_records_path)
+    if (source['method'], source['hash_size']) != (target['method'], target['hash_size']):
+        print(f"Digitized records in {target_records_path} use other hash settings; starting a new record")
+        target = {'method': source['method'], 'hash_size': source['hash_size'], 'images': {}}
+
+    os.makedirs(target_dir, exist_ok=True)
+    copied = 0
+    placed = {}  # CSV name in the shard -> name in target_dir
+    for image_name, entry in sorted(source['images'].items()):
+        csv_path = os.path.join(source_dir, entry['csv'])
+        current = target['images'].get(image_name)
+        if current == entry or not os.path.isfile(csv_path):
+            # Recorded in the main folder before the shard ran
+            continue
+        if entry['csv'] not in placed:
+            if current is not None and current['csv'] == entry['csv']:
+                # Digitized again in the shard: the new CSV replaces the old one
+                target_path = os.path.join(target_dir, entry['csv'])
+                exists = os.path.exists(target_path) and filecmp.cmp(csv_path, target_path, shallow=False)
+            else:
+                target_path, exists = unique_path(csv_path, target_dir)
+            if not exists:
+                shutil.copy2(csv_path, target_path)
+                copied += 1
+            placed[entry['csv']] = os.path.basename(target_path)
+        target['images'][image_name] = dict(entry, csv=placed[entry['csv']])
+
+    image_dedup.save_digitized(target, target_records_path)
+    return copied, set(placed) | {image_dedup.RECORDS_FILENAME}
+
+def merge_folder(source_dir, target_dir, shard_name, log_names, extensions=None, skip=()):
+    """
+    Merge one shard folder (top level only): CSV logs are appended, other files
+    copied. With `extensions`, only files with those extensions are merged;
+    names in `skip` are left out.
+    """
+    if not os.path.isdir(source_dir):
+        return 0, 0
+    os.makedirs(target_dir, exist_ok=True)
+    copied = appended = 0
+    for name in sorted(os.listdir(source_dir)):
+        source_path = os.path.join(source_dir, name)
+        if not os.path.isfile(source_path):
+            continue
+        if extensions is not None and not name.lower().endswith(extensions):
+            continue
+        if name in skip:
+            continue
+        if name in log_names:
+            appended += append_csv(source_path, os.path.join(target_dir, name))
+        elif name.endswith('.txt'):
+            # Per-run summaries have the same name in every shard
+            shutil.copy2(source_path, os.path.join(target_dir, f"{shard_name}_{name}"))
+            copied += 1
+        elif copy_unique(source_path, target_dir) is not None:
+            copied += 1
+    return copied, appended
+
+def merge_shards(shards_root=None):
+    """
+    Fold every shard's images, logs and CSVs into the main data folders.
+    Identical files are skipped, but error logs are appended, so merge each set of shards once.
+    """
+    if shards_root is None:
+        shards_root = get_path('shards')
+    shard_dirs = sorted(path for path in glob.glob(os.path.join(shards_root, "shard_*")) if os.path.isdir(path))
+    if not shard_dirs:
+        print(f"No shard folders found in {shards_root}")
+        return
+
+    store = image_store.ImageStore()
+    for path in shard_dirs:
+        shard_name = os.path.basename(path)
+        images = merge_folder(os.path.join(path, "extracted_images"), get_path('extracted_images'),
+                              shard_name, set(), IMAGE_EXTENSIONS)
+        # Charts in the shard's packed image store are appended to the main one
+        pack_path = os.path.join(path, "extracted_images", image_store.PACK_FILENAME)
+        packed = store.merge(pack_path) if os.path.exists(pack_path) else 0
+        logs = merge_folder(os.path.join(path, "extracted_images", "logs"), get_path('extraction_logs'),
+                            shard_name, {"extraction_errors.csv"})
+        # CSVs of recorded images first, so the record follows any renamed CSV
+        digitized, handled = merge_digitized(os.path.join(path, "csv_data", "graph2table"), get_path('graph2table'))
+        csvs = merge_folder(os.path.join(path, "csv_data", "graph2table"), get_path('graph2table'),
+                            shard_name, {"processing_errors.csv"}, skip=handled)
+        print(f"{shard_name}: {images[0]} images ({packed} packed), {logs[0]} log files (+{logs[1]} error rows), "
+              f"{digitized + csvs[0]} CSVs (+{csvs[1]} error rows)")
+    store.close()
+
+    # Rebuild the combined chart report over everything that is now in extracted_images
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "pdfs"))
+    import extract_pdf_content
+    pdf_paths = sorted(glob.glob(os.path.join(get_path('raw_pdfs'), "*.pdf")))
+    extract_pdf_content.generate_combined_html_report(get_path('extracted_images'), pdf_paths)
+    print(f"Merged {len(shard_dirs)} shards into {get_path('data')}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run one shard of the extraction, or merge finished shards")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="Process the PDFs or images belonging to one shard")
+    run_parser.add_argument("--shard", type=parse_shard, required=True, help="Shard to run, as i/N (1-based)")
+    run_parser.add_argument("--stage", choices=['extract', 'digitize'], default='extract')
+    run_parser.add_argument("--workers", type=int, default=None, help="Parallel extraction processes")
+    run_parser.add_argument("--list", action="store_true", help="Only list the files in this shard")
+
+    merge_parser = subparsers.add_parser("merge", help="Merge data/shards/shard_* into the main data folders")
+    merge_parser.add_argument("--shards-dir", default=None, help="Folder holding the shard_* folders")
+    args = parser.parse_args()
+
+    if args.command == "merge":
+        merge_shards(args.shards_dir)
+    elif args.list:
+        index, count = args.shard
+        folder, extensions = ((get_path('raw_pdfs'), ('.pdf',)) if args.stage == 'extract'
+                              else (get_path('extracted_images'), IMAGE_EXTENSIONS))
+        for path in shard_files(folder, extensions, index, count):
+            print(os.path.basename(path))
+    elif args.stage == 'extract':
+        run_extract_shard(*args.shard, workers=args.workers)
+    else:
+        run_digitize_shard(*args.shard)
@@ -0,0 +1,374 @@
+import os
+import sys
+import re
+import json
+import argparse
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import get_path
+
+DEFAULT_IMAGE_DIR = get_path('extracted_images')
+DEFAULT_CSV_DIR = get_path('graph2table_raw')
+
+# Record of which CSV holds each digitized image's data, kept beside the CSVs Graph2Table produces
+RECORDS_FILENAME = "digitized_images.json"
+DEFAULT_RECORDS_PATH = get_path('graph2table', RECORDS_FILENAME)
+
+# Hash index file kept inside the image folder
+HASH_INDEX_FILENAME = "image_hashes.json"
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif', '.bmp')
+
+# 16x16 hashes (256 bits): charts that only differ by one newly added month must
+# still be told apart, which the common 8x8 hash is too coarse for. On the current
+# crops, a re-published chart (04_2020 vs 05_2020, cropped at different sizes) is
+# 2 bits apart with phash while distinct months are 12 or more apart.
+DEFAULT_METHOD = 'phash'
+DEFAULT_HASH_SIZE = 16
+DEFAULT_MAX_DISTANCE = 6
+
+def _grayscale(img_path, width, height):
+    with Image.open(img_path) as img:
+        return np.asarray(img.convert('L').resize((width, height), Image.LANCZOS), dtype=np.float64)
+
+def _bits_to_int(bits):
+    return int(''.join('1' if bit else '0' for bit in bits.ravel()), 2)
+
+def dhash(img_path, hash_size=DEFAULT_HASH_SIZE):
+    """Difference hash: sign of the horizontal gradient of a (hash_size+1) x hash_size thumbnail"""
+    pixels = _grayscale(img_path, hash_size + 1, hash_size)
+    return _bits_to_int(pixels[:, 1:] > pixels[:, :-1])
+
+def _dct_matrix(n):
+    k = np.arange(n)
+    matrix = np.cos(np.pi * (2 * k[np.newaxis, :] + 1) * k[:, np.newaxis] / (2 * n))
+    matrix[0] /= np.sqrt(2)
+    return matrix * np.sqrt(2 / n)
+
+def phash(img_path, hash_size=DEFAULT_HASH_SIZE):
+    """DCT hash: low-frequency DCT coefficients of a 4x oversampled thumbnail compared with their median"""
+    size = hash_size * 4
+    pixels = _grayscale(img_path, size, size)
+    dct = _dct_matrix(size)
+    low = (dct @ pixels @ dct.T)[:hash_size, :hash_size]
+    return _bits_to_int(low > np.median(low))
+
+HASH_FUNCTIONS = {
+    'dhash': dhash,
+    'phash': phash,
+}
+
+def hamming(a, b):
+    """Number of differing bits between two hashes"""
+    return bin(a ^ b).count('1')
+
+class BKTree:
+    """
+    Burkhard-Keller tree over Hamming distance. A query for all hashes within
+    `max_distance` only descends into children whose edge distance lies in
+    [d - max_distance, d + max_distance], so most of the tree is never visited.
+    """
+
+    def __init__(self):
+        self.root = None  # (hash, items, {distance: child node})
+
+    def add(self, hash_value, item):
+        if self.root is None:
+            self.root = (hash_value, [item], {})
+            return
+        node = self.root
+        while True:
+            distance = hamming(hash_value, node[0])
+            if distance == 0:
+                node[1].append(item)
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = (hash_value, [item], {})
+                return
+            node = child
+
+    def search(self, hash_value, max_distance):
+        """Return (distance, item) for every stored item within `max_distance`, closest first"""
+        matches = []
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            node_hash, items, children = stack.pop()
+            distance = hamming(hash_value, node_hash)
+            if distance <= max_distance:
+                matches.extend((distance, item) for item in items)
+            for edge, child in children.items():
+                if distance - max_distance <= edge <= distance + max_distance:
+                    stack.append(child)
+        return sorted(matches)
+
+def list_images(image_dir):
+    """Image files directly inside `image_dir` (not its log/cache subfolders)"""
+    return sorted(
+        name for name in os.listdir(image_dir)
+        if name.lower().endswith(IMAGE_EXTENSIONS) and os.path.isfile(os.path.join(image_dir, name))
+    )
+
+def build_hash_index(image_dir=None, method=DEFAULT_METHOD, hash_size=DEFAULT_HASH_SIZE, index_path=None):
+    """
+    Hash every image in `image_dir`, reusing hashes from the saved index for files
+    whose size and modification time are unchanged.
+
+    Returns:
+        dict: {filename: hash as int}
+    """
+    if image_dir is None:
+        image_dir = DEFAULT_IMAGE_DIR
+    if index_path is None:
+        index_path = os.path.join(image_dir, HASH_INDEX_FILENAME)
+
+    saved = {}
+    if os.path.exists(index_path):
+        with open(index_path, 'r', encoding='utf-8') as f:
+            stored = json.load(f)
+        # Hashes made with other settings are not comparable
+        if stored.get('method') == method and stored.get('hash_size') == hash_size:
+            saved = stored.get('images', {})
+
+    hash_function = HASH_FUNCTIONS[method]
+    entries = {}
+    hashed = 0
+    for name in list_images(image_dir):
+        stat = os.stat(os.path.join(image_dir, name))
+        entry = saved.get(name)
+        if entry is None or entry['size'] != stat.st_size or entry['mtime'] != stat.st_mtime:
+            try:
+                value = hash_function(os.path.join(image_dir, name), hash_size)
+            except Exception as e:
+                print(f"Could not hash {name}: {e}")
+                continue
+            entry = {'size': stat.st_size, 'mtime': stat.st_mtime, 'hash': format(value, 'x')}
+            hashed += 1
+        entries[name] = entry
+
+    if hashed or len(entries) != len(saved):
+        tmp_path = index_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'method': method, 'hash_size': hash_size, 'images': entries}, f, indent=2)
+        os.replace(tmp_path, index_path)
+
+    print(f"Hash index: {len(entries)} images ({hashed} newly hashed)")
+    return {name: int(entry['hash'], 16) for name, entry in entries.items()}
+
+def group_duplicates(hashes, max_distance=DEFAULT_MAX_DISTANCE):
+    """
+    Group images whose hashes are within `max_distance` bits of each other
+    (transitively). Only groups with more than one image are returned.
+    """
+    tree = BKTree()
+    for name, value in hashes.items():
+        tree.add(value, name)
+
+    # Union-find over near-duplicate pairs
+    parent = {name: name for name in hashes}
+
+    def find(name):
+        while parent[name] != name:
+            parent[name] = parent[parent[name]]
+            name = parent[name]
+        return name
+
+    for name, value in hashes.items():
+        for _, other in tree.search(value, max_distance):
+            root_a, root_b = find(name), find(other)
+            if root_a != root_b:
+                parent[max(root_a, root_b)] = min(root_a, root_b)
+
+    groups = {}
+    for name in hashes:
+        groups.setdefault(find(name), []).append(name)
+    return sorted(sorted(group) for group in groups.values() if len(group) > 1)
+
+def csv_name_for(image_name):
+    """CSV name Graph2Table output is saved under for an image (the XX_YYYY part of its name)"""
+    match = re.search(r'(\d+_\d+)', os.path.basename(image_name))
+    if match:
+        return f"{match.group(1)}.csv"
+    return os.path.splitext(os.path.basename(image_name))[0] + ".csv"
+
+def chart_variant(image_name):
+    """
+    Which chart of a report an image is: its name without the XX_YYYY report
+    prefix, e.g. 'retail_price_plot_next_page_cropped' for '04_2020_retail_price_plot_next_page_cropped.png'
+    """
+    stem = os.path.splitext(os.path.basename(image_name))[0]
+    return re.sub(r'^\d+_\d+_?', '', stem)
+
+def load_digitized(records_path=None):
+    """
+    Load the record of digitized images: {image name: {'csv': CSV file name, 'hash': hex hash}},
+    with the hash method and size the hashes were made with.
+    """
+    if records_path is None:
+        records_path = DEFAULT_RECORDS_PATH
+    if not os.path.exists(records_path):
+        return {'method': DEFAULT_METHOD, 'hash_size': DEFAULT_HASH_SIZE, 'images': {}}
+    with open(records_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def digitized_csv_name(image_path, records_path=None):
+    """Name of the CSV recorded for an image, or None if it was never digitized"""
+    entry = load_digitized(records_path)['images'].get(os.path.basename(image_path))
+    return entry['csv'] if entry is not None else None
+
+def record_digitized(image_path, csv_path, records_path=None):
+    """
+    Record that `csv_path` holds the data of `image_path` as it is now (its hash),
+    so the image is only skipped later while its pixels are unchanged.
+    """
+    if records_path is None:
+        records_path = DEFAULT_RECORDS_PATH
+    records = load_digitized(records_path)
+    if records.get('method') != DEFAULT_METHOD or records.get('hash_size') != DEFAULT_HASH_SIZE:
+        print(f"Digitized records in {records_path} use other hash settings; starting a new record")
+        records = {'method': DEFAULT_METHOD, 'hash_size': DEFAULT_HASH_SIZE, 'images': {}}
+    value = HASH_FUNCTIONS[DEFAULT_METHOD](image_path, DEFAULT_HASH_SIZE)
+    records['images'][os.path.basename(image_path)] = {
+        'csv': os.path.basename(csv_path),
+        'hash': format(value, 'x'),
+    }
+    save_digitized(records, records_path)
+
+def save_digitized(records, records_path):
+    """Write the record of digitized images atomically"""
+    os.makedirs(os.path.dirname(os.path.abspath(records_path)), exist_ok=True)
+    tmp_path = records_path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(records, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, records_path)
+
+class DuplicateChecker:
+    """
+    Answers "has this chart, or an identical one, already been digitized?" for
+    the Graph2Table runner or any other digitizer.
+
+    Only images recorded with record_digitized count as digitized: an image
+    matches itself while its hash is the one recorded with its CSV, and other
+    images only match within the same chart variant (a report's retail chart
+    never stands in for its auction chart or its next-page capture).
+    """
+
+    def __init__(self, image_dir=None, csv_dir=None, method=DEFAULT_METHOD, hash_size=DEFAULT_HASH_SIZE,
+                 max_distance=DEFAULT_MAX_DISTANCE, records_path=None):
+        if csv_dir is None:
+            csv_dir = DEFAULT_CSV_DIR
+        self.image_dir = image_dir if image_dir is not None else DEFAULT_IMAGE_DIR
+        # One folder or a list of folders to look for existing CSVs in
+        self.csv_dirs = [csv_dir] if isinstance(csv_dir, str) else list(csv_dir)
+        self.method = method
+        self.hash_size = hash_size
+        self.max_distance = max_distance
+
+        self.hashes = build_hash_index(self.image_dir, method, hash_size)
+
+        # Hashes of the images as they were when they were digitized
+        records = load_digitized(records_path)
+        self.digitized = {}
+        if records.get('method') == method and records.get('hash_size') == hash_size:
+            self.digitized = records.get('images', {})
+        elif records.get('images'):
+            print(f"Digitized records use {records.get('method')} / {records.get('hash_size')}; ignoring them")
+        self.tree = BKTree()
+        for name, entry in self.digitized.items():
+            self.tree.add(int(entry['hash'], 16), name)
+
+    def hash_of(self, image_path):
+        name = os.path.basename(image_path)
+        if name in self.hashes:
+            return self.hashes[name]
+        return HASH_FUNCTIONS[self.method](image_path, self.hash_size)
+
+    def find_digitized_duplicate(self, image_path):
+        """
+        Return (image name, CSV path, distance) of the closest digitized image
+        matching `image_path` whose CSV still exists, or None. The image itself
+        only matches (at distance 0) while its hash is unchanged since its CSV
+        was recorded; other images must be of the same chart variant.
+        """
+        name = os.path.basename(image_path)
+        value = self.hash_of(image_path)
+        own = self.digitized.get(name)
+        if own is not None and int(own['hash'], 16) == value:
+            csv_path = self.csv_for(name)
+            if csv_path is not None:
+                return name, csv_path, 0
+
+        variant = chart_variant(name)
+        for distance, other in self.tree.search(value, self.max_distance):
+            if other == name or chart_variant(other) != variant:
+                continue
+            csv_path = self.csv_for(other)
+            if csv_path is not None:
+                return other, csv_path, distance
+        return None
+
+    def csv_for(self, image_name):
+        """Existing CSV recorded for a digitized image in any of the CSV folders, or None"""
+        entry = self.digitized.get(os.path.basename(image_name))
+        if entry is None:
+            return None
+        for csv_dir in self.csv_dirs:
+            csv_path = os.path.join(csv_dir, entry['csv'])
+            if os.path.exists(csv_path):
+                return csv_path
+        return None
+
+    def should_skip(self, image_path):
+        """Whether the image is already digitized or an exact duplicate of a digitized image"""
+        duplicate = self.find_digitized_duplicate(image_path)
+        return duplicate is not None and duplicate[2] == 0
+
+def record_existing(checker, variant, records_path=None):
+    """
+    Record the CSVs made before digitized images were recorded: each image of
+    `variant` without a record whose report's XX_YYYY.csv exists is recorded
+    with that CSV. Returns the number of images recorded.
+    """
+    recorded = 0
+    for name in checker.hashes:
+        if name in checker.digitized or chart_variant(name) != variant:
+            continue
+        for csv_dir in checker.csv_dirs:
+            csv_path = os.path.join(csv_dir, csv_name_for(name))
+            if os.path.exists(csv_path):
+                record_digitized(os.path.join(checker.image_dir, name), csv_path, records_path)
+                recorded += 1
+                break
+    return recorded
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Find near-duplicate chart images by perceptual hash")
+    parser.add_argument("--images", default=None, help="Image folder (defaults to data/extracted_images)")
+    parser.add_argument("--csv-dir", default=None, help="Folder of digitized CSVs (defaults to graph2table/Raw)")
+    parser.add_argument("--method", choices=list(HASH_FUNCTIONS), default=DEFAULT_METHOD)
+    parser.add_argument("--max-distance", type=int, default=DEFAULT_MAX_DISTANCE,
+                        help="Maximum Hamming distance for two images to count as duplicates")
+    parser.add_argument("--record-existing", nargs="?", const="retail_price_plot_cropped", default=None,
+                        metavar="VARIANT",
+                        help="Record the existing XX_YYYY.csv files as the data of this chart variant's images "
+                             "(default: retail_price_plot_cropped, the charts digitized before records were kept)")
+    args = parser.parse_args()
+
+    checker = DuplicateChecker(args.images, args.csv_dir, args.method, max_distance=args.max_distance)
+    if args.record_existing:
+        recorded = record_existing(checker, args.record_existing)
+        print(f"Recorded {recorded} existing CSVs of {args.record_existing} images")
+        checker = DuplicateChecker(args.images, args.csv_dir, args.method, max_distance=args.max_distance)
+    groups = group_duplicates(checker.hashes, args.max_distance)
+
+    print(f"\nFound {len(groups)} groups of near-duplicate images")
+    for group in groups:
+        print("\n  " + "\n  ".join(group))
+
+    matches = {name: checker.find_digitized_duplicate(os.path.join(checker.image_dir, name)) for name in checker.hashes}
+    undigitized = [name for name, match in matches.items() if match is None or match[0] != name]
+    skippable = [name for name in undigitized if matches[name] is not None and matches[name][2] == 0]
+    print(f"\n{len(undigitized)} images not digitized as they are, "
+          f"{len(skippable)} of them exact duplicates of a digitized chart")
@@ -1,37 +1,280 @@
 import os
+import sys
 import re
+import bisect
+import hashlib
+import queue
+import threading
+from collections import OrderedDict
 import tkinter as tk
 from tkinter import Button, Label, Entry, Frame, Scrollbar
 from PIL import Image, ImageTk
 
-def extract_date(filename):
-    # Extract month and year from filename pattern
-    match = re.search(r'(\d+)_(\d{4})', filename)
-    if match:
-        month, year = match.groups()
-        # Ensure month is two digits for proper sorting
-        month = month.zfill(2)
-        return f"{year}_{month}"
-    return filename
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import get_path
+import image_store
+
+# Size of the grid thumbnails (fits 4 columns)
+THUMBNAIL_SIZE = (350, 350)
+
+# Hidden folder (inside the image folder) holding the persistent thumbnail cache
+THUMBNAIL_CACHE_DIRNAME = ".thumbnails"
+
+def open_chart(img_path, store=None):
+    """Open a chart from the packed image store when it is in there, otherwise from disk"""
+    key = store.find(img_path) if store is not None else None
+    if key is not None:
+        return store.open_image(*key)
+    return Image.open(img_path)
+
+def thumbnail_cache_path(cache_dir, img_path, store=None):
+    """
+    Path of the cached thumbnail for an image, keyed by its path, size and modification
+    time (or by its record in the packed image store)
+    """
+    key = store.find(img_path) if store is not None else None
+    if key is not None:
+        source = store.record_id(*key)
+    else:
+        stat = os.stat(img_path)
+        source = f"{os.path.abspath(img_path)}|{stat.st_size}|{stat.st_mtime_ns}"
+    key = f"{source}|{THUMBNAIL_SIZE}"
+    return os.path.join(cache_dir, hashlib.sha1(key.encode('utf-8')).hexdigest() + ".png")
+
+def load_thumbnail(img_path, cache_dir, store=None):
+    """
+    Return a decoded thumbnail for an image, reading it from the on-disk cache when
+    possible and creating the cache entry otherwise.
+    """
+    cache_path = thumbnail_cache_path(cache_dir, img_path, store)
+    if os.path.exists(cache_path):
+        try:
+            img = Image.open(cache_path)
+            img.load()
+            return img
+        except Exception:
+            # Corrupt cache entry - fall through and rebuild it
+            pass
+    
+    img = open_chart(img_path, store)
+    img.draft('RGB', THUMBNAIL_SIZE)  # Lets JPEG decoding skip straight to a smaller scale
+    img.thumbnail(THUMBNAIL_SIZE)
+    
+    # Write to a temporary name first so a concurrent reader never sees a partial file
+    tmp_path = f"{cache_path}.{threading.get_ident()}.tmp"
+    try:
+        img.save(tmp_path, format="PNG", compress_level=1)
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        print(f"Could not cache thumbnail for {img_path}: {e}")
+    return img
+
+class ThumbnailLoader:
+    """
+    Bounded LRU of decoded thumbnails with a background thread that prefetches
+    the images of neighbouring pages.
+
+    The worker only produces PIL images; the Tk PhotoImage is created on the main
+    thread, which is all that is left to do when a page is shown.
+    """
+    
+    def __init__(self, cache_dir, capacity=64, store=None):
+        self.cache_dir = cache_dir
+        self.store = store
+        os.makedirs(cache_dir, exist_ok=True)
+        self.capacity = capacity
+        self._images = OrderedDict()
+        self._lock = threading.Lock()
+        self._requests = queue.Queue()
+        self._worker = threading.Thread(target=self._run, daemon=True)
+        self._worker.start()
+    
+    def _remember(self, img_path, img):
+        with self._lock:
+            self._images[img_path] = img
+            self._images.move_to_end(img_path)
+            while len(self._images) > self.capacity:
+                self._images.popitem(last=False)
+    
+    def get(self, img_path):
+        """Return the thumbnail for an image, decoding it now if it hasn't been prefetched"""
+        with self._lock:
+            img = self._images.get(img_path)
+            if img is not None:
+                self._images.move_to_end(img_path)
+                return img
+        
+        img = load_thumbnail(img_path, self.cache_dir, self.store)
+        self._remember(img_path, img)
+        return img
+    
+    def prefetch(self, img_paths):
+        """Queue images to be decoded in the background"""
+        # Drop stale requests so the worker always follows the latest page flip
+        try:
+            while True:
+                self._requests.get_nowait()
+        except queue.Empty:
+            pass
+        
+        for img_path in img_paths:
+            self._requests.put(img_path)
+    
+    def _run(self):
+        while True:
+            img_path = self._requests.get()
+            with self._lock:
+                if img_path in self._images:
+                    continue
+            try:
+                self._remember(img_path, load_thumbnail(img_path, self.cache_dir, self.store))
+            except Exception as e:
+                print(f"Could not prefetch {img_path}: {e}")
+
+# Month and year at the start of a chart name, e.g. "1_2024" or "01_2019" (but not the "1_2024" inside "11_2024")
+DATE_PATTERN = re.compile(r'(?<!\d)(\d{1,2})_(\d{4})(?!\d)')
+
+def parse_image_key(filename):
+    """
+    Parse a chart file name into (year, month, variant).
+
+    The variant is whatever follows the date, e.g. "retail_price_plot_next_page_cropped".
+    Names without a date sort after all dated ones.
+    """
+    stem = os.path.splitext(filename)[0]
+    match = DATE_PATTERN.search(stem)
+    if not match:
+        return (9999, 99, stem)
+    month, year = match.groups()
+    variant = (stem[:match.start()] + stem[match.end():]).strip('_ ')
+    return (int(year), int(month), variant)
+
+def variant_tokens(variant):
+    return [token for token in re.split(r'[_\s]+', variant.lower()) if token]
+
+class ImageIndex:
+    """
+    Chronologically sorted index of chart files, built once.
+
+    Date lookups use binary search on the sorted (year, month) keys, and variant
+    filters use an inverted index from name tokens to sorted positions, so jumps
+    and filters stay O(log n) (plus the size of the result).
+    """
+    
+    def __init__(self, filenames):
+        entries = sorted((parse_image_key(f) + (f,)) for f in filenames)
+        self.filenames = [entry[3] for entry in entries]
+        self.keys = [(entry[0], entry[1]) for entry in entries]
+        self.variants = [entry[2] for entry in entries]
+        
+        self.postings = {}
+        for position, variant in enumerate(self.variants):
+            for token in set(variant_tokens(variant)):
+                self.postings.setdefault(token, []).append(position)
+    
+    def __len__(self):
+        return len(self.filenames)
+    
+    def find(self, year, month=None):
+        """
+        Position of the first image for (year, month), or for the year if month is None.
+        When there is no exact match, the position of the nearest dated image is returned.
+
+        Returns:
+            int: Position in the index (None if the index is empty)
+            bool: Whether the match was exact
+        """
+        if not self.keys:
+            return None, False
+        
+        target = (year, month if month is not None else 0)
+        pos = bisect.bisect_left(self.keys, target)
+        if pos < len(self.keys):
+            found_year, found_month = self.keys[pos]
+            if found_year == year and (month is None or found_month == month):
+                return pos, True
+        
+        # Nearest neighbour in months on either side of the insertion point
+        def distance(key):
+            return abs((key[0] * 12 + key[1]) - (year * 12 + (month or 1)))
+        
+        candidates = [p for p in (pos - 1, pos) if 0 <= p < len(self.keys)]
+        nearest = min(candidates, key=lambda p: distance(self.keys[p]))
+        # Step back to the first image of that month
+        nearest = bisect.bisect_left(self.keys, self.keys[nearest])
+        return nearest, False
+    
+    def positions(self, year_from=None, year_to=None, variant_query=""):
+        """
+        Sorted positions of images within [year_from, year_to] whose variant matches
+        every term of `variant_query` (e.g. "next_page" or "4YO").
+        """
+        lo = 0 if year_from is None else bisect.bisect_left(self.keys, (year_from, 0))
+        hi = len(self.keys) if year_to is None else bisect.bisect_right(self.keys, (year_to, 99))
+        
+        selected = None
+        for term in variant_tokens(variant_query):
+            posting = self.postings.get(term)
+            if posting is not None:
+                # Narrow the posting list to the date range by binary search
+                matches = posting[bisect.bisect_left(posting, lo):bisect.bisect_left(posting, hi)]
+            else:
+                # Not a whole token - fall back to a substring test within the range
+                matches = [p for p in (selected if selected is not None else range(lo, hi))
+                           if term in self.variants[p].lower()]
+            selected = matches if selected is None else sorted(set(selected) & set(matches))
+        
+        return list(range(lo, hi)) if selected is None else selected
+    
+    def subset(self, positions):
+        return ImageIndex([self.filenames[p] for p in positions])
+
+def parse_year_range(text):
+    """Parse "2019", "2019-2021" or "" into (year_from, year_to)"""
+    text = text.strip()
+    if not text:
+        return None, None
+    parts = [part.strip() for part in text.split('-')]
+    if len(parts) == 1:
+        return int(parts[0]), int(parts[0])
+    return (int(parts[0]) if parts[0] else None), (int(parts[1]) if parts[1] else None)
 
 def view_images():
-    folder_path = r"C:\Users\clint\Desktop\Lifecycle Code\data\extracted_images"
+    folder_path = get_path('extracted_images')
+    
+    # Charts come from the packed image store when there is one (no folder scan),
+    # otherwise from the image files in the folder
+    store = None
+    if os.path.exists(image_store.default_pack_path()):
+        store = image_store.ImageStore()
+    if store is not None and len(store):
+        filenames = store.filenames()
+    else:
+        filenames = [f for f in os.listdir(folder_path) if f.lower().endswith(('.png', '.jpg', '.jpeg'))]
     
-    # Get all image files and sort them chronologically
-    image_files = [f for f in os.listdir(folder_path) if f.lower().endswith(('.png', '.jpg', '.jpeg'))]
-    image_files.sort(key=extract_date)
+    # Index the images chronologically
+    full_index = ImageIndex(filenames)
     
-    if not image_files:
+    if not len(full_index):
         print("No images found in the folder.")
         return
     
+    # The index currently being browsed (the full index or a filtered subset of it)
+    view = [full_index]
+    image_files = list(full_index.filenames)
+    
     # Grid dimensions
     grid_rows, grid_cols = 2, 4
     grid_size = grid_rows * grid_cols
     
     # Page control
     current_page = [0]  # Using list to make it mutable in nested functions
-    total_pages = (len(image_files) + grid_size - 1) // grid_size  # Ceiling division
+    
+    def total_pages():
+        return max(1, (len(image_files) + grid_size - 1) // grid_size)  # Ceiling division
+    
+    # Decoded thumbnails for the current and neighbouring pages (plus a little history)
+    loader = ThumbnailLoader(os.path.join(folder_path, THUMBNAIL_CACHE_DIRNAME), capacity=grid_size * 6, store=store)
     
     root = tk.Tk()
     root.title("Chronological Image Grid Viewer")
@@ -78,21 +321,63 @@ def view_images():
         year = year_entry.get().strip()
         month = month_entry.get().strip()
         
-        if not year and not month:
+        if not year:
             return
         
-        # Find matching index
-        for i, filename in enumerate(image_files):
-            search_pattern = f"{month}_" if month else ""
-            search_pattern += f"{year}" if year else ""
-            
-            if search_pattern in filename:
-                page = i // grid_size
-                show_page(page)
-                break
+        try:
+            pos, exact = view[0].find(int(year), int(month) if month else None)
+        except ValueError:
+            status_label.config(text="Year and month must be numbers")
+            return
+        
+        if pos is None:
+            return
+        
+        year_found, month_found = view[0].keys[pos]
+        if exact:
+            status_label.config(text="")
+        else:
+            status_label.config(text=f"No exact match - showing nearest ({month_found:02d}/{year_found})")
+        show_page(pos // grid_size)
     
     Button(search_frame, text="Search", command=search_by_date).pack(side=tk.LEFT, padx=10)
     
+    # Range / variant filter, e.g. years "2019-2021" and variant "next_page"
+    Label(search_frame, text="Years:").pack(side=tk.LEFT, padx=5)
+    years_entry = Entry(search_frame, width=10)
+    years_entry.pack(side=tk.LEFT, padx=5)
+    
+    Label(search_frame, text="Variant:").pack(side=tk.LEFT, padx=5)
+    variant_entry = Entry(search_frame, width=16)
+    variant_entry.pack(side=tk.LEFT, padx=5)
+    
+    def apply_filter():
+        try:
+            year_from, year_to = parse_year_range(years_entry.get())
+        except ValueError:
+            status_label.config(text="Years must look like 2019 or 2019-2021")
+            return
+        
+        positions = full_index.positions(year_from, year_to, variant_entry.get())
+        view[0] = full_index.subset(positions)
+        image_files[:] = view[0].filenames
+        status_label.config(text=f"{len(image_files)} of {len(full_index)} images match the filter")
+        show_page(0)
+    
+    def clear_filter():
+        years_entry.delete(0, tk.END)
+        variant_entry.delete(0, tk.END)
+        view[0] = full_index
+        image_files[:] = full_index.filenames
+        status_label.config(text="")
+        show_page(0)
+    
+    Button(search_frame, text="Filter", command=apply_filter).pack(side=tk.LEFT, padx=5)
+    Button(search_frame, text="Clear", command=clear_filter).pack(side=tk.LEFT, padx=5)
+    
+    status_label = Label(search_frame, text="")
+    status_label.pack(side=tk.LEFT, padx=10)
+    
     # Image grid frames (2x4)
     image_frames = []
     image_labels = []
@@ -126,7 +411,7 @@ def view_images():
     page_label = Label(nav_frame, text="")
     
     def show_page(page_num):
-        if 0 <= page_num < total_pages:
+        if 0 <= page_num < total_pages():
             current_page[0] = page_num
             
             # Calculate start and end indices for the current page
@@ -147,10 +432,8 @@ def view_images():
                 img_path = os.path.join(folder_path, image_files[i])
                 
                 try:
-                    # Display the image
-                    img = Image.open(img_path)
-                    # Adjusted thumbnail size for 2x4 grid
-                    img.thumbnail((350, 350))  # Slightly smaller to fit 4 columns
+                    # Display the image (already decoded if it was prefetched)
+                    img = loader.get(img_path)
                     
                     photo = ImageTk.PhotoImage(img)
                     image_labels[grid_idx].config(image=photo)
@@ -162,7 +445,15 @@ def view_images():
                     filename_labels[grid_idx].config(text=f"Error: {e}")
             
             # Update page label
-            page_label.config(text=f"Page {page_num + 1} of {total_pages}")
+            page_label.config(text=f"Page {page_num + 1} of {total_pages()}")
+            
+            # Decode the next and previous pages in the background
+            neighbours = []
+            for neighbour in (page_num + 1, page_num - 1):
+                if 0 <= neighbour < total_pages():
+                    start = neighbour * grid_size
+                    neighbours.extend(image_files[start:start + grid_size])
+            loader.prefetch([os.path.join(folder_path, f) for f in neighbours])
     
     def next_page():
         show_page(current_page[0] + 1)
@@ -182,9 +473,16 @@ def view_images():
     # Full image preview functionality
     preview_window = None
     
+    # Recently opened previews, already resized to the screen
+    preview_cache = OrderedDict()
+    preview_cache_size = 4
+    
     def show_full_image(idx):
         nonlocal preview_window
         
+        if idx >= len(image_files):
+            return
+        
         if preview_window is not None:
             preview_window.destroy()
         
@@ -194,20 +492,28 @@ def view_images():
         preview_window = tk.Toplevel(root)
         preview_window.title(image_files[idx])
         
-        # Display full image
-        img = Image.open(img_path)
-        
-        # Resize if needed while maintaining aspect ratio
-        screen_width = root.winfo_screenwidth() * 0.8
-        screen_height = root.winfo_screenheight() * 0.8
-        
-        img_width, img_height = img.size
-        scale = min(screen_width/img_width, screen_height/img_height)
-        
-        if scale < 1:  # Only resize if the image is larger than the screen
-            new_width = int(img_width * scale)
-            new_height = int(img_height * scale)
-            img = img.resize((new_width, new_height), Image.LANCZOS)
+        img = preview_cache.get(img_path)
+        if img is None:
+            # Display full image
+            img = open_chart(img_path, store)
+            
+            # Resize if needed while maintaining aspect ratio
+            screen_width = root.winfo_screenwidth() * 0.8
+            screen_height = root.winfo_screenheight() * 0.8
+            
+            img_width, img_height = img.size
+            scale = min(screen_width/img_width, screen_height/img_height)
+            
+            if scale < 1:  # Only resize if the image is larger than the screen
+                new_width = int(img_width * scale)
+                new_height = int(img_height * scale)
+                img = img.resize((new_width, new_height), Image.LANCZOS)
+            
+            preview_cache[img_path] = img
+            while len(preview_cache) > preview_cache_size:
+                preview_cache.popitem(last=False)
+        else:
+            preview_cache.move_to_end(img_path)
         
         photo = ImageTk.PhotoImage(img)
         
@@ -1,13 +1,146 @@
 import os
+import sys
 import cv2
+import json
+import hashlib
+import argparse
 import numpy as np
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 from tkinter import Tk, messagebox
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import get_path
+
+# Colour and thickness of the selection rectangle
+RECT_COLOR = (0, 255, 0)
+RECT_THICKNESS = 2
+
+# Name of the ROI spec written next to the cropped images
+CROP_SPEC_FILENAME = "crop_spec.json"
+
+def file_sha256(file_path):
+    """SHA-256 of a file's contents"""
+    sha256 = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+def load_crop_spec(spec_path):
+    """Load a crop spec, returning an empty one if it doesn't exist yet"""
+    if not os.path.isfile(spec_path):
+        return {'version': 1, 'images': {}}
+    with open(spec_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def save_crop_spec(spec, spec_path):
+    """Write the crop spec atomically"""
+    tmp_path = spec_path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(spec, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, spec_path)
+
+def normalize_roi(roi, width, height):
+    """Convert a pixel ROI (x1, y1, x2, y2) into fractions of the image size"""
+    x1, y1, x2, y2 = roi
+    return [x1 / width, y1 / height, x2 / width, y2 / height]
+
+def denormalize_roi(roi, width, height):
+    """
+    Convert a normalized ROI back into pixels for an image of the given size.
+    Because the ROI is stored as fractions, this also covers re-renders at a different zoom.
+    """
+    x1, y1, x2, y2 = roi
+    x1, x2 = int(round(x1 * width)), int(round(x2 * width))
+    y1, y2 = int(round(y1 * height)), int(round(y2 * height))
+    return max(x1, 0), max(y1, 0), min(x2, width), min(y2, height)
+
+def _apply_crop(job):
+    """Crop one image according to its spec entry (runs in a worker process)"""
+    image_path, output_path, roi = job
+    image = cv2.imread(image_path)
+    if image is None:
+        return image_path, False, "could not read image"
+    
+    height, width = image.shape[:2]
+    x1, y1, x2, y2 = denormalize_roi(roi, width, height)
+    if x2 <= x1 or y2 <= y1:
+        return image_path, False, "empty crop region"
+    
+    if not cv2.imwrite(output_path, image[y1:y2, x1:x2]):
+        return image_path, False, "could not write crop"
+    return image_path, True, ""
+
+def apply_crop_spec(spec_path, input_folder, output_folder, workers=None):
+    """
+    Re-apply a recorded crop spec to every matching image in `input_folder`, in parallel.
+
+    Images are matched to spec entries by file name, falling back to the content
+    hash for renamed files. A re-rendered image keeps its name but not its hash,
+    so name matches with a different hash are applied and reported.
+
+    Returns:
+        int: Number of images cropped
+        list: (image name, reason) for every image that could not be cropped
+    """
+    spec = load_crop_spec(spec_path)
+    entries = spec['images']
+    if not entries:
+        print(f"No crops recorded in {spec_path}")
+        return 0, []
+    
+    by_hash = {entry['sha256']: name for name, entry in entries.items()}
+    os.makedirs(output_folder, exist_ok=True)
+    
+    valid_extensions = ['.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.gif']
+    jobs = []
+    rerendered = 0
+    unmatched = []
+    for filename in sorted(os.listdir(input_folder)):
+        if os.path.splitext(filename)[1].lower() not in valid_extensions:
+            continue
+        image_path = os.path.join(input_folder, filename)
+        
+        entry = entries.get(filename)
+        if entry is None:
+            # Renamed file - look it up by content
+            spec_name = by_hash.get(file_sha256(image_path))
+            if spec_name is None:
+                unmatched.append(filename)
+                continue
+            entry = entries[spec_name]
+        elif file_sha256(image_path) != entry['sha256']:
+            rerendered += 1
+        
+        stem, ext = os.path.splitext(filename)
+        output_path = os.path.join(output_folder, f"{stem}_cropped{ext}")
+        jobs.append((image_path, output_path, entry['roi']))
+    
+    print(f"Applying {len(jobs)} recorded crops ({rerendered} re-rendered since recording, "
+          f"{len(unmatched)} images without a recorded crop)")
+    
+    cropped = 0
+    failures = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for image_path, ok, reason in executor.map(_apply_crop, jobs, chunksize=8):
+            if ok:
+                cropped += 1
+            else:
+                failures.append((os.path.basename(image_path), reason))
+                print(f"Failed to crop {os.path.basename(image_path)}: {reason}")
+    
+    print(f"Cropped {cropped} images into {output_folder}")
+    return cropped, failures
+
 class ImageCropper:
-    def __init__(self, folder_path):
+    def __init__(self, folder_path, prefetch_count=3):
         self.folder_path = folder_path
         self.output_folder = os.path.join(os.path.dirname(os.path.dirname(folder_path)), "cropped_sorted")
         self._ensure_output_folder_exists()
+        # Every crop is recorded as a normalized ROI so it can be re-applied headlessly
+        self.spec_path = os.path.join(self.output_folder, CROP_SPEC_FILENAME)
+        self.crop_spec = load_crop_spec(self.spec_path)
         self.image_files = self._get_image_files()
         self.current_index = 0
         self.current_image = None
@@ -18,6 +151,12 @@ class ImageCropper:
         self.x_end, self.y_end = -1, -1
         self.crop_roi = None
         self.scale_factor = 1.0
+        # Rectangle currently drawn on current_image, in display coordinates
+        self.drawn_rect = None
+        # Background loading of the next few images (decode + display resize)
+        self.prefetch_count = prefetch_count
+        self._loader = ThreadPoolExecutor(max_workers=2)
+        self._pending = {}
         self.window_name = "Image Cropping Tool"
         cv2.namedWindow(self.window_name, cv2.WINDOW_NORMAL)
         cv2.setMouseCallback(self.window_name, self._mouse_callback)
@@ -40,7 +179,12 @@ class ImageCropper:
                 if os.path.splitext(f)[1].lower() in valid_extensions]
     
     def _resize_image_for_display(self, image, max_width=1280, max_height=720):
-        """Resize image to fit screen while maintaining aspect ratio."""
+        """
+        Resize image to fit screen while maintaining aspect ratio.
+
+        Returns the display image and the scale factor that was applied. This runs
+        on the background loader, so it doesn't touch any state of the cropper.
+        """
         height, width = image.shape[:2]
         
         # Calculate scale factor to fit within max dimensions
@@ -48,20 +192,86 @@ class ImageCropper:
         height_scale = max_height / height if height > max_height else 1.0
         
         # Use the smaller scale to ensure image fits within bounds
-        self.scale_factor = min(width_scale, height_scale)
+        scale_factor = min(width_scale, height_scale)
         
-        if self.scale_factor < 1.0:
+        if scale_factor < 1.0:
             # Only resize if necessary
-            new_width = int(width * self.scale_factor)
-            new_height = int(height * self.scale_factor)
+            new_width = int(width * scale_factor)
+            new_height = int(height * scale_factor)
             resized = cv2.resize(image, (new_width, new_height), interpolation=cv2.INTER_AREA)
-            return resized
+            return resized, scale_factor
         
-        self.scale_factor = 1.0
-        return image.copy()
+        return image, 1.0
+    
+    def _load_image(self, index):
+        """Read and pre-scale one image; returns (original, display, scale) or None"""
+        image_path = os.path.join(self.folder_path, self.image_files[index])
+        original = cv2.imread(image_path)
+        if original is None:
+            return None
+        display, scale = self._resize_image_for_display(original)
+        return original, display, scale
+    
+    def _get_image(self, index):
+        """
+        Return the loaded image at `index`, waiting for its prefetch if one is running,
+        and queue the next few images in the background.
+        """
+        future = self._pending.pop(index, None)
+        if future is None:
+            future = self._loader.submit(self._load_image, index)
+        
+        # Forget prefetches we've moved past and queue the ones ahead
+        for stale in [i for i in self._pending if i < index]:
+            self._pending.pop(stale).cancel()
+        for ahead in range(index + 1, min(index + 1 + self.prefetch_count, len(self.image_files))):
+            if ahead not in self._pending:
+                self._pending[ahead] = self._loader.submit(self._load_image, ahead)
+        
+        return future.result()
+    
+    def _rect_from_points(self, x1, y1, x2, y2):
+        """Order a rectangle's corners and clamp it to the display image"""
+        height, width = self.display_image.shape[:2]
+        x1, x2 = sorted((min(max(x1, 0), width - 1), min(max(x2, 0), width - 1)))
+        y1, y2 = sorted((min(max(y1, 0), height - 1), min(max(y2, 0), height - 1)))
+        return x1, y1, x2, y2
+    
+    def _erase_rect(self):
+        """Restore the pixels under the drawn rectangle's border from the clean display image"""
+        if self.drawn_rect is None:
+            return
+        x1, y1, x2, y2 = self.drawn_rect
+        pad = RECT_THICKNESS
+        height, width = self.display_image.shape[:2]
+        left, right = max(x1 - pad, 0), min(x2 + pad + 1, width)
+        top, bottom = max(y1 - pad, 0), min(y2 + pad + 1, height)
+        # Only the four thin border strips are copied, not the whole frame
+        for ys, xs in (
+            (slice(top, min(y1 + pad + 1, bottom)), slice(left, right)),
+            (slice(max(y2 - pad, top), bottom), slice(left, right)),
+            (slice(top, bottom), slice(left, min(x1 + pad + 1, right))),
+            (slice(top, bottom), slice(max(x2 - pad, left), right)),
+        ):
+            self.current_image[ys, xs] = self.display_image[ys, xs]
+        self.drawn_rect = None
+    
+    def _draw_rect(self, x1, y1, x2, y2):
+        """Move the selection overlay to a new rectangle and refresh the window"""
+        self._erase_rect()
+        self.drawn_rect = self._rect_from_points(x1, y1, x2, y2)
+        rx1, ry1, rx2, ry2 = self.drawn_rect
+        cv2.rectangle(self.current_image, (rx1, ry1), (rx2, ry2), RECT_COLOR, RECT_THICKNESS)
+        self._redraw()
+    
+    def _redraw(self):
+        cv2.imshow(self.window_name, self.current_image)
     
     def _mouse_callback(self, event, x, y, flags, param):
         """Handle mouse events for cropping."""
+        if self.display_image is None:
+            return
+        
         if event == cv2.EVENT_LBUTTONDOWN:
             self.cropping = True
             self.x_start, self.y_start = x, y
@@ -70,10 +280,7 @@ class ImageCropper:
         elif event == cv2.EVENT_MOUSEMOVE:
             if self.cropping:
                 self.x_end, self.y_end = x, y
-                # Create a copy of the display image to draw on
-                self.current_image = self.display_image.copy()
-                cv2.rectangle(self.current_image, (self.x_start, self.y_start), 
-                              (self.x_end, self.y_end), (0, 255, 0), 2)
+                self._draw_rect(self.x_start, self.y_start, self.x_end, self.y_end)
                 
         elif event == cv2.EVENT_LBUTTONUP:
             self.cropping = False
@@ -94,8 +301,19 @@ class ImageCropper:
                 self.crop_roi = (x1, y1, x2, y2)
             
             # Draw final rectangle
-            self.current_image = self.display_image.copy()
-            cv2.rectangle(self.current_image, (x1, y1), (x2, y2), (0, 255, 0), 2)
+            self._draw_rect(x1, y1, x2, y2)
+    
+    def _record_crop(self, image_path, roi):
+        """Store the crop of an image in the ROI spec"""
+        height, width = self.original_image.shape[:2]
+        self.crop_spec['images'][os.path.basename(image_path)] = {
+            'sha256': file_sha256(image_path),
+            'width': width,
+            'height': height,
+            'roi': normalize_roi(roi, width, height),
+            'recorded_at': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        save_crop_spec(self.crop_spec, self.spec_path)
     
     def _print_instructions(self):
         """Print command instructions to the console"""
@@ -119,16 +337,17 @@ class ImageCropper:
             image_path = os.path.join(self.folder_path, self.image_files[self.current_index])
             print(f"\nProcessing: {image_path} ({self.current_index + 1}/{len(self.image_files)})")
             
-            # Load the image
-            self.original_image = cv2.imread(image_path)
-            if self.original_image is None:
+            # Load the image (usually already decoded and resized by the prefetcher)
+            loaded = self._get_image(self.current_index)
+            if loaded is None:
                 print(f"Error loading image: {image_path}")
                 self.current_index += 1
                 continue
             
-            # Resize for display
-            self.display_image = self._resize_image_for_display(self.original_image)
+            self.original_image, self.display_image, self.scale_factor = loaded
+            # One working copy per image; the selection overlay is patched onto it in place
             self.current_image = self.display_image.copy()
+            self.drawn_rect = None
             self.crop_roi = None
             
             # Print information about the image and scaling
@@ -143,12 +362,13 @@ class ImageCropper:
             # Resize window to fit the image
             cv2.resizeWindow(self.window_name, disp_w, disp_h)
             
+            # Display the image without any overlays; after this the window is only
+            # redrawn when the selection changes (from the mouse callback)
+            self._redraw()
+            
             while True:
-                # Display the image without any overlays
-                cv2.imshow(self.window_name, self.current_image)
-                
-                # Wait for key press
-                key = cv2.waitKey(1) & 0xFF
+                # Block until a key is pressed - mouse events are still handled meanwhile
+                key = cv2.waitKey(0) & 0xFF
                 
                 # 'n' - Next image without cropping
                 if key == ord('n'):
@@ -169,14 +389,17 @@ class ImageCropper:
                     cv2.imwrite(output_path, cropped_img)
                     print(f"Saved cropped image to: {output_path}")
                     
+                    self._record_crop(image_path, self.crop_roi)
+                    
                     self.current_index += 1
                     break
                 
                 # 'r' - Reset cropping for current image
                 elif key == ord('r'):
                     print("Resetting crop selection")
-                    self.current_image = self.display_image.copy()
+                    self._erase_rect()
                     self.crop_roi = None
+                    self._redraw()
                 
                 # 'i' - Show instructions again
                 elif key == ord('i'):
@@ -185,14 +408,29 @@ class ImageCropper:
                 # 'q' - Quit the application
                 elif key == ord('q'):
                     print("Quitting application")
+                    self._loader.shutdown(wait=False, cancel_futures=True)
                     return
         
         print("Finished processing all images.")
+        self._loader.shutdown(wait=False, cancel_futures=True)
         cv2.destroyAllWindows()
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Crop chart images interactively, or re-apply recorded crops")
+    subparsers = parser.add_subparsers(dest="command")
+    apply_parser = subparsers.add_parser("apply", help="Re-apply a recorded crop spec headlessly")
+    apply_parser.add_argument("--spec", required=True, help=f"Path to {CROP_SPEC_FILENAME}")
+    apply_parser.add_argument("--input", required=True, help="Folder with the (re-rendered) images")
+    apply_parser.add_argument("--output", required=True, help="Folder for the cropped images")
+    apply_parser.add_argument("--workers", type=int, default=None, help="Number of worker processes")
+    args = parser.parse_args()
+    
+    if args.command == "apply":
+        apply_crop_spec(args.spec, args.input, args.output, workers=args.workers)
+        raise SystemExit(0)
+    
     # Path to the folder containing images
-    image_folder = r"C:\Users\clint\Desktop\Lifecycle_RA\Data\Processed\Sorted_Images"
+    image_folder = get_path('cropper_images')
     
     # Check if the folder exists
     if not os.path.exists(image_folder):
@@ -1,17 +1,47 @@
 import os
+import sys
+import json
+import queue
 import shutil
+import argparse
+import threading
 import tkinter as tk
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 from tkinter import messagebox
 from PIL import Image, ImageTk
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import get_path
+import image_store
+
 # Define source and destination directories
-source_dir = r"C:\Users\clint\Desktop\Lifecycle_RA\Images"
-dest_dir = r"C:\Users\clint\Desktop\Lifecycle_RA\Sorted_Images"
+source_dir = get_path('sorter_source')
+dest_dir = get_path('sorter_dest')
+
+# How kept images reach dest_dir: "copy", "hardlink" or "reflink" (the last two
+# fall back to a copy when source and destination are on different filesystems).
+# Default for --transfer-mode
+TRANSFER_MODES = ("copy", "hardlink", "reflink")
+transfer_mode = "copy"
+
+# Number of upcoming images decoded and resized ahead of time
+prefetch_count = 4
+
+# Log of every keep/discard/undo decision, replayable with --replay
+log_path = os.path.join(dest_dir, "sort_log.jsonl")
+
+# Maximum size of the displayed image
+max_width = 800
+max_height = 600
 
 # Create destination directory if it doesn't exist
 if not os.path.exists(dest_dir):
     os.makedirs(dest_dir)
 
+# Charts extracted with --no-loose-images are only in the packed store: write them out to sort them
+image_store.export_missing(source_dir)
+
 # Get list of image files
 image_extensions = ['.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff']
 image_files = []
@@ -24,13 +54,152 @@ if not image_files:
     print("No image files found in the source directory.")
     exit()
 
+def reflink_file(source_path, dest_path):
+    """Copy-on-write clone of a file (Linux FICLONE); raises OSError where unsupported"""
+    import fcntl
+    FICLONE = 0x40049409
+    with open(source_path, 'rb') as src, open(dest_path, 'wb') as dst:
+        fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+    shutil.copystat(source_path, dest_path)
+
+def transfer_file(source_path, dest_path, mode="copy"):
+    """Place a kept image in the destination folder using the configured transfer mode"""
+    if os.path.exists(dest_path):
+        os.remove(dest_path)
+    
+    if mode == "hardlink":
+        try:
+            os.link(source_path, dest_path)
+            return
+        except OSError:
+            pass  # Different filesystem - fall back to a copy
+    elif mode == "reflink":
+        try:
+            reflink_file(source_path, dest_path)
+            return
+        except (OSError, ImportError):
+            if os.path.exists(dest_path):
+                os.remove(dest_path)
+    
+    shutil.copy2(source_path, dest_path)
+
+class FileTransferWorker:
+    """
+    Background thread that performs file operations in the order they were queued,
+    so the UI never waits on disk I/O. Errors are collected for the UI thread to show.
+    """
+    
+    def __init__(self, mode):
+        self.mode = mode
+        self.jobs = queue.Queue()
+        self.errors = queue.Queue()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+    
+    def keep(self, source_path, dest_path):
+        self.jobs.put(("keep", source_path, dest_path))
+    
+    def remove(self, dest_path):
+        self.jobs.put(("remove", None, dest_path))
+    
+    def _run(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                self.jobs.task_done()
+                break
+            action, source_path, dest_path = job
+            try:
+                if action == "keep":
+                    transfer_file(source_path, dest_path, self.mode)
+                    print(f"Kept: {os.path.basename(dest_path)}")
+                elif os.path.exists(dest_path):
+                    os.remove(dest_path)
+                    print(f"Undid keep: {os.path.basename(dest_path)}")
+            except Exception as e:
+                self.errors.put(f"Could not {action} {os.path.basename(dest_path)}: {str(e)}")
+            finally:
+                self.jobs.task_done()
+    
+    def close(self):
+        """Finish all queued operations"""
+        self.jobs.put(None)
+        self.thread.join()
+
+def load_display_image(img_path):
+    """Decode an image and resize it to fit the display area (runs on the prefetch pool)"""
+    img = Image.open(img_path)
+    img.draft('RGB', (max_width, max_height))
+    
+    # Resize while maintaining aspect ratio
+    width, height = img.size
+    
+    # Calculate new dimensions
+    if width > max_width or height > max_height:
+        ratio = min(max_width / width, max_height / height)
+        new_width = int(width * ratio)
+        new_height = int(height * ratio)
+        img = img.resize((new_width, new_height), Image.LANCZOS)
+    else:
+        img.load()
+    return img
+
+def append_log(entry):
+    """Append one decision to the sort log"""
+    entry['time'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    with open(log_path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(entry) + "\n")
+
+def read_log_decisions(path):
+    """
+    Replay the sort log into the list of decisions still in effect
+    (each "undo" cancels the most recent remaining decision).
+    """
+    decisions = []
+    if not os.path.isfile(path):
+        return decisions
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            entry = json.loads(line)
+            if entry['action'] == "undo":
+                if decisions:
+                    decisions.pop()
+            else:
+                decisions.append(entry)
+    return decisions
+
+def replay_log(path, source_folder, dest_folder, mode="copy"):
+    """Rebuild the sorted folder from a sort log, e.g. on another machine or after a crash"""
+    os.makedirs(dest_folder, exist_ok=True)
+    kept = [entry['file'] for entry in read_log_decisions(path) if entry['action'] == "keep"]
+    missing = 0
+    for filename in kept:
+        source_path = os.path.join(source_folder, filename)
+        if not os.path.exists(source_path):
+            missing += 1
+            print(f"Missing source image: {filename}")
+            continue
+        transfer_file(source_path, os.path.join(dest_folder, filename), mode)
+    print(f"Replayed {len(kept) - missing} kept images into {dest_folder} ({missing} missing)")
+
 # Create GUI
 class ImageSorterApp:
-    def __init__(self, root, image_files):
+    def __init__(self, root, image_files, mode="copy"):
         self.root = root
         self.root.title("Image Sorter")
         self.image_files = image_files
         self.current_index = 0
+        self.mode = mode
+        
+        # File copies/links happen on a background worker; decoding happens ahead of time
+        self.transfers = FileTransferWorker(mode)
+        self.prefetcher = ThreadPoolExecutor(max_workers=2)
+        self.prepared = {}
+        # Decisions made in this session, newest last, for undo
+        self.history = []
         
         # Set up the GUI components
         self.frame = tk.Frame(root)
@@ -45,9 +214,12 @@ class ImageSorterApp:
         self.keep_button = tk.Button(self.button_frame, text="Keep (Y)", command=self.keep_image)
         self.keep_button.pack(side=tk.LEFT, padx=5)
         
-        self.discard_button = tk.Button(self.button_frame, text="Discard (N)", command=self.next_image)
+        self.discard_button = tk.Button(self.button_frame, text="Discard (N)", command=self.discard_image)
         self.discard_button.pack(side=tk.LEFT, padx=5)
         
+        self.undo_button = tk.Button(self.button_frame, text="Undo (U)", command=self.undo)
+        self.undo_button.pack(side=tk.LEFT, padx=5)
+        
         self.filename_label = tk.Label(self.frame, text="")
         self.filename_label.pack(pady=2)
         
@@ -56,37 +228,57 @@ class ImageSorterApp:
         
         # Bind keyboard shortcuts
         self.root.bind('<y>', lambda e: self.keep_image())
-        self.root.bind('<n>', lambda e: self.next_image())
+        self.root.bind('<n>', lambda e: self.discard_image())
+        self.root.bind('<u>', lambda e: self.undo())
+        self.root.bind('<Control-z>', lambda e: self.undo())
         self.root.bind('<Right>', lambda e: self.next_image())
         self.root.bind('<Left>', lambda e: self.prev_image())
         
         # Set window size
         self.root.geometry("900x700")
         
+        # Surface errors from the transfer worker on the UI thread
+        self.root.after(200, self.check_transfer_errors)
+        # Closing the window early still completes the copies already queued
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        
         # Display the first image
         self.display_current_image()
     
+    def get_display_image(self, index):
+        """Return the decoded image at `index` and queue the next few for decoding"""
+        future = self.prepared.pop(index, None)
+        if future is None:
+            future = self.prefetcher.submit(load_display_image, os.path.join(source_dir, self.image_files[index]))
+        
+        # Keep one image behind (for Left/undo) and prefetch_count ahead
+        for stale in [i for i in self.prepared if i < index - 1 or i > index + prefetch_count]:
+            self.prepared.pop(stale).cancel()
+        for ahead in range(index + 1, min(index + 1 + prefetch_count, len(self.image_files))):
+            if ahead not in self.prepared:
+                self.prepared[ahead] = self.prefetcher.submit(
+                    load_display_image, os.path.join(source_dir, self.image_files[ahead]))
+        
+        img = future.result()
+        # Remember the current image too, in case we come straight back to it
+        self.prepared[index] = future
+        return img
+    
+    def check_transfer_errors(self):
+        try:
+            while True:
+                messagebox.showerror("Error", self.transfers.errors.get_nowait())
+        except queue.Empty:
+            pass
+        self.root.after(200, self.check_transfer_errors)
+    
     def display_current_image(self):
         if 0 <= self.current_index < len(self.image_files):
-            # Get current image file
-            img_path = os.path.join(source_dir, self.image_files[self.current_index])
             self.filename_label.config(text=self.image_files[self.current_index])
             
             try:
-                # Open and resize image to fit the canvas
-                img = Image.open(img_path)
-                
-                # Resize while maintaining aspect ratio
-                max_width = 800
-                max_height = 600
-                width, height = img.size
-                
-                # Calculate new dimensions
-                if width > max_width or height > max_height:
-                    ratio = min(max_width / width, max_height / height)
-                    new_width = int(width * ratio)
-                    new_height = int(height * ratio)
-                    img = img.resize((new_width, new_height), Image.LANCZOS)
+                # Decoded and resized ahead of time by the prefetch pool
+                img = self.get_display_image(self.current_index)
                 
                 # Update canvas size
                 self.canvas.config(width=img.width, height=img.height)
@@ -105,20 +297,43 @@ class ImageSorterApp:
     
     def keep_image(self):
         if 0 <= self.current_index < len(self.image_files):
+            filename = self.image_files[self.current_index]
             # Get source and destination paths
-            source_path = os.path.join(source_dir, self.image_files[self.current_index])
-            dest_path = os.path.join(dest_dir, self.image_files[self.current_index])
+            source_path = os.path.join(source_dir, filename)
+            dest_path = os.path.join(dest_dir, filename)
             
-            # Copy file to destination directory
-            try:
-                shutil.copy2(source_path, dest_path)
-                print(f"Kept: {self.image_files[self.current_index]}")
-            except Exception as e:
-                messagebox.showerror("Error", f"Could not copy file: {str(e)}")
+            # Queue the copy/link; the worker does the disk I/O
+            self.transfers.keep(source_path, dest_path)
+            self.record("keep", filename, dest_path)
             
             # Move to next image
             self.next_image()
     
+    def discard_image(self):
+        if 0 <= self.current_index < len(self.image_files):
+            self.record("discard", self.image_files[self.current_index], None)
+            self.next_image()
+    
+    def record(self, action, filename, dest_path):
+        entry = {'action': action, 'file': filename, 'index': self.current_index,
+                 'dest': dest_path, 'mode': self.mode}
+        self.history.append(entry)
+        append_log(dict(entry))
+    
+    def undo(self):
+        """Revert the most recent keep/discard and go back to that image"""
+        if not self.history:
+            return
+        entry = self.history.pop()
+        if entry['action'] == "keep":
+            # Queued behind the keep itself, so it always removes the finished copy
+            self.transfers.remove(entry['dest'])
+        append_log({'action': "undo", 'file': entry['file']})
+        print(f"Undo {entry['action']}: {entry['file']}")
+        
+        self.current_index = entry['index']
+        self.display_current_image()
+    
     def next_image(self):
         self.current_index += 1
         if self.current_index < len(self.image_files):
@@ -131,12 +346,32 @@ class ImageSorterApp:
             self.current_index -= 1
             self.display_current_image()
     
+    def on_close(self):
+        self.transfers.close()
+        self.prefetcher.shutdown(wait=False, cancel_futures=True)
+        self.root.destroy()
+    
     def show_completion(self):
+        # Let the queued copies finish before reporting completion
+        self.transfers.close()
+        self.prefetcher.shutdown(wait=False, cancel_futures=True)
         messagebox.showinfo("Sorting Complete", "All images have been processed!")
         self.root.destroy()
 
 # Run the application
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sort images into keep/discard")
+    parser.add_argument("--replay", action="store_true",
+                        help=f"Rebuild {dest_dir} from the sort log instead of sorting")
+    parser.add_argument("--transfer-mode", choices=TRANSFER_MODES, default=transfer_mode,
+                        help="How kept images reach the sorted folder (hardlink and reflink fall back to a copy "
+                             "across filesystems)")
+    args = parser.parse_args()
+    
+    if args.replay:
+        replay_log(log_path, source_dir, dest_dir, args.transfer_mode)
+        sys.exit()
+    
     root = tk.Tk()
-    app = ImageSorterApp(root, image_files)
+    app = ImageSorterApp(root, image_files, args.transfer_mode)
     root.mainloop()
\ No newline at end of file
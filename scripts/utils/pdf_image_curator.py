@@ -1,10 +1,42 @@
 import os
+import sys
+import json
+import atexit
 import pandas as pd
 import glob
 import time
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import get_path
+
 # Define the CSV file path
-csv_file_path = r"C:\Users\clint\Desktop\Scraping Task\df_6.csv"
+csv_file_path = get_path('curator', "df_6.csv")
+
+new_csv_file_path = get_path('curator', "df_7.csv")
+
+# Note updates are appended here and folded into df_7.csv every
+# COMPACT_EVERY updates and at exit, instead of rewriting the CSV per note
+journal_path = os.path.splitext(new_csv_file_path)[0] + ".journal.jsonl"
+COMPACT_EVERY = 25
+pending_journal_entries = 0
+
+# A compaction writes df_7.csv to a temporary file, then sets the journal aside
+# and replaces df_7.csv with the temporary file. A journal left set aside means
+# the temporary file already holds its notes: finish replacing df_7.csv if that
+# didn't happen, and never replay those notes again
+temp_csv_path = new_csv_file_path + ".tmp"
+compacting_path = journal_path + ".compacting"
+if os.path.exists(compacting_path):
+    if os.path.exists(temp_csv_path):
+        os.replace(temp_csv_path, new_csv_file_path)
+    os.remove(compacting_path)
+    print(f"Finished an interrupted save of {new_csv_file_path}")
+
+# A journal left by an interrupted session only holds the notes since its last
+# compaction; the earlier ones are in df_7.csv, so resume from that
+if os.path.exists(journal_path) and os.path.exists(new_csv_file_path):
+    print(f"Resuming interrupted session from {new_csv_file_path}")
+    csv_file_path = new_csv_file_path
 
 # Load the dataframe
 data = pd.read_csv(csv_file_path)
@@ -16,15 +48,61 @@ data['date'] = pd.to_datetime(data['date'])
 data = data.sort_values(by='date')
 
 # Define directories
-pdf_directory = r"C:\Users\clint\Desktop\Scraping Task\pdfs"
-image_directory = r"C:\Users\clint\Desktop\Scraping Task\pdfs\Images"
+pdf_directory = get_path('curator', "pdfs")
+image_directory = get_path('curator', "pdfs", "Images")
 
-# Function to save dataframe to CSV
+# Function to save dataframe to CSV, setting the journal it holds aside before df_7.csv is replaced
 def save_dataframe():
-    new_csv_file_path = r"C:\Users\clint\Desktop\Scraping Task\df_7.csv"
-    data.to_csv(new_csv_file_path, index=False)
+    # Write to a temporary file first so an interrupted save never truncates df_7.csv
+    data.to_csv(temp_csv_path, index=False)
+    if os.path.exists(journal_path):
+        os.replace(journal_path, compacting_path)
+    os.replace(temp_csv_path, new_csv_file_path)
     print(f"CSV file updated at: {new_csv_file_path}")
 
+# Function to fold the journal into the CSV and start a new journal
+def compact_journal():
+    global pending_journal_entries
+    save_dataframe()
+    if os.path.exists(compacting_path):
+        os.remove(compacting_path)
+    pending_journal_entries = 0
+
+# Function to compact at exit only if notes were journaled since the last compaction
+def compact_pending():
+    if pending_journal_entries > 0:
+        compact_journal()
+
+# Function to apply a note to the dataframe in memory
+def apply_note(index, message):
+    if pd.isna(data.loc[index, 'note']):
+        data.loc[index, 'note'] = message
+    else:
+        data.loc[index, 'note'] = f"{data.loc[index, 'note']}; {message}"
+    return data.loc[index, 'note']
+
+# Function to re-apply notes left in the journal by an interrupted session
+def replay_journal():
+    if not os.path.exists(journal_path):
+        return
+    replayed = 0
+    with open(journal_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                # A partially written last line from a crash
+                continue
+            matches = data.index[data['pdf_filename'] == entry['pdf_filename']]
+            if len(matches) > 0:
+                apply_note(matches[0], entry['message'])
+                replayed += 1
+    print(f"Replayed {replayed} note updates from {journal_path}")
+    compact_journal()
+
 # Function to open a file with default Windows application
 def open_file(file_path):
     if os.path.exists(file_path):
@@ -39,16 +117,67 @@ def open_file(file_path):
 
 # Function to update note column preserving existing content
 def update_note(index, message):
-    if pd.isna(data.loc[index, 'note']):
-        data.loc[index, 'note'] = message
-    else:
-        data.loc[index, 'note'] = f"{data.loc[index, 'note']}; {message}"
+    global pending_journal_entries
+    note = apply_note(index, message)
     
-    # Save the changes immediately to CSV
-    save_dataframe()
+    # Record the change durably with a single small append
+    with open(journal_path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps({'pdf_filename': data.loc[index, 'pdf_filename'], 'message': message}) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    pending_journal_entries += 1
     
-    return data.loc[index, 'note']
+    if pending_journal_entries >= COMPACT_EVERY:
+        compact_journal()
+    
+    return note
+
+# Function to normalize names so "01-2018" and "01_2018" index the same way
+def normalize_name(name):
+    return name.lower().replace('-', '_')
+
+# Function to index every image once by the name prefixes it could belong to
+def build_image_index(image_dir):
+    """
+    Map each normalized prefix of an image name that ends at an underscore
+    (plus the full stem) to the images sharing it, so "01_2018_p3_1.png" is
+    found under "01", "01_2018", "01_2018_p3" and "01_2018_p3_1".
+    """
+    all_images = sorted(glob.glob(os.path.join(image_dir, "*.png")))
+    index = {}
+    for img_path in all_images:
+        stem = normalize_name(os.path.splitext(os.path.basename(img_path))[0])
+        prefixes = {stem[:pos] for pos, char in enumerate(stem) if char == '_'}
+        prefixes.add(stem)
+        for prefix in prefixes:
+            index.setdefault(prefix, []).append(img_path)
+    return index, all_images
 
+# Function to find the images of one PDF from the index
+def find_images(basename):
+    matching = image_index.get(normalize_name(basename), [])
+    if matching:
+        return list(matching)
+    
+    # Lenient fallback (any image containing the basename) over the cached listing
+    needle = basename.lower()
+    return [img for img in all_image_files if needle in os.path.basename(img).lower()]
+
+# Function to drop a deleted image from the index
+def forget_image(img_path):
+    all_image_files.remove(img_path)
+    for paths in image_index.values():
+        if img_path in paths:
+            paths.remove(img_path)
+
+
+# Recover notes from an interrupted session, and compact whatever is pending at exit
+replay_journal()
+atexit.register(compact_pending)
+
+# List the image directory once instead of globbing it per PDF
+image_index, all_image_files = build_image_index(image_directory)
+print(f"Indexed {len(all_image_files)} images")
 
 # Iterate through each row in the dataframe (sorted by date)
 for index, row in data.iterrows():
@@ -61,35 +190,20 @@ for index, row in data.iterrows():
     
     # Build the full path to the PDF
     pdf_path = os.path.join(pdf_directory, pdf_filename)
+    skip_to_next_pdf = False
     
     # Open the PDF
     if open_file(pdf_path):
         input(f"Opened {pdf_filename}. Press Enter to continue to associated images...")
         
-        # Try multiple patterns to find associated images
-        # Pattern 1: Exact prefix match (e.g., "01_2018_*.png")
-        image_pattern = os.path.join(image_directory, f"{pdf_basename}_*.png")
-        matching_images = glob.glob(image_pattern)
-        
-        # Pattern 2: Try with dashes instead of underscores in case of naming inconsistency
-        if not matching_images:
-            alt_basename = pdf_basename.replace('_', '-')
-            image_pattern = os.path.join(image_directory, f"{alt_basename}*.png")
-            matching_images.extend(glob.glob(image_pattern))
-        
-        # Pattern 3: Try more lenient matching (any file containing the basename)
-        if not matching_images:
-            # Get all image files
-            all_image_files = glob.glob(os.path.join(image_directory, "*.png"))
-            # Filter those containing the basename
-            matching_images = [img for img in all_image_files if pdf_basename.lower() in os.path.basename(img).lower()]
+        # Prefix match on the normalized name covers both "01_2018_*.png" and
+        # "01-2018*.png", with a lenient substring match as the fallback
+        matching_images = find_images(pdf_basename)
         
         # Debug info
-        print(f"Using pattern: {image_pattern}")
         print(f"Found {len(matching_images)} matching images")
         
         delete_count = 0
-        skip_to_next_pdf = False
         
         if matching_images:
             print(f"Found {len(matching_images)} images associated with {pdf_filename}")
@@ -110,6 +224,7 @@ for index, row in data.iterrows():
                         if decision == 'd' or decision == 'delete':
                             try:
                                 os.remove(img_path)
+                                forget_image(img_path)
                                 delete_count += 1
                                 print(f"Deleted: {img_filename}")
                                 break
@@ -132,7 +247,7 @@ for index, row in data.iterrows():
                 if skip_to_next_pdf:
                     deletion_message += " before skipping"
                 
-                # Update note preserving existing content and save immediately
+                # Update note preserving existing content (journaled immediately)
                 updated_note = update_note(index, deletion_message)
                 print(f"Updated note for {pdf_filename}: {updated_note}")
         else:
@@ -143,5 +258,6 @@ for index, row in data.iterrows():
         input(f"Finished processing {pdf_filename}. Press Enter to continue to next PDF...")
 
 # Final save of the dataframe as a safeguard
-save_dataframe()
-print("Process complete. All changes have been saved.")d
+compact_journal()
+print("Process complete. All changes have been saved.")
+